@@ -0,0 +1,88 @@
+#!/usr/bin/env bash
+# ===============================
+# Gateway load test
+# ===============================
+# Same endpoints straight to the services vs. through nginx, plus response
+# sizes with / without gzip. Run it on the previous nginx.conf and on this one
+# (same DURATION / CONCURRENCY) to see what keepalive, gzip and the
+# micro-cache change; raw `hey` output is kept under $RESULTS_DIR.
+#
+# Usage (stack running: docker-compose up -d):
+#   ./api-gateway-server/loadtest.sh [duration] [concurrency]
+#
+# Env: LOADTEST_USER / LOADTEST_PASSWORD (seeded user), GATEWAY_URL (from the
+# host), HEY_IMAGE, RESULTS_DIR
+set -euo pipefail
+
+DURATION=${1:-20s}
+CONCURRENCY=${2:-50}
+NETWORK=cloud-net
+HEY_IMAGE=${HEY_IMAGE:-williamyeh/hey}
+GATEWAY_URL=${GATEWAY_URL:-http://localhost}
+USERNAME=${LOADTEST_USER:-herta}
+PASSWORD=${LOADTEST_PASSWORD:-123456}
+RESULTS_DIR=${RESULTS_DIR:-$(dirname "$0")/loadtest-results/$(date +%Y%m%d-%H%M%S)}
+
+mkdir -p "$RESULTS_DIR"
+
+TOKEN=$(curl -sf -X POST "$GATEWAY_URL/api/auth/login" \
+    -H 'Content-Type: application/json' \
+    -d "{\"username\":\"$USERNAME\",\"password\":\"$PASSWORD\"}" \
+    | sed -E 's/.*"access_token":"([^"]+)".*/\1/')
+if [ -z "$TOKEN" ]; then
+    echo "Login failed for $USERNAME" >&2
+    exit 1
+fi
+
+# name | url (as seen from the cloud-net network) | auth (yes/no)
+SCENARIOS=(
+    "post-list.direct|http://post-service:8083/get-post?scope=all&limit=20|yes"
+    "post-list.gateway|http://api-gateway-server/api/post/get-post?scope=all&limit=20|yes"
+    "post-search.direct|http://post-service:8083/search?limit=20|yes"
+    "post-search.gateway|http://api-gateway-server/api/post/search?limit=20|yes"
+    "health.direct|http://post-service:8083/health|no"
+    "health.gateway|http://api-gateway-server/api/post/health|no"
+)
+
+run_hey() {
+    local name=$1 url=$2 auth=$3
+    local args=(-z "$DURATION" -c "$CONCURRENCY")
+    if [ "$auth" = "yes" ]; then
+        args+=(-H "Authorization: Bearer $TOKEN")
+    fi
+    docker run --rm --network "$NETWORK" "$HEY_IMAGE" "${args[@]}" "$url" > "$RESULTS_DIR/$name.txt"
+}
+
+summary() {
+    local file=$1
+    local rps p50 p95 p99 errors
+    rps=$(awk '/Requests\/sec/ {print $2}' "$file")
+    p50=$(awk '/ 50% in/ {print $3}' "$file")
+    p95=$(awk '/ 95% in/ {print $3}' "$file")
+    p99=$(awk '/ 99% in/ {print $3}' "$file")
+    errors=$(awk '/^ *\[[0-9]+\]/ && !/\[200\]/ {n += $2} END {print n + 0}' "$file")
+    printf "%-22s %10s %10s %10s %10s %8s\n" "$(basename "$file" .txt)" "$rps" "$p50" "$p95" "$p99" "$errors"
+}
+
+echo "duration=$DURATION concurrency=$CONCURRENCY results=$RESULTS_DIR"
+for scenario in "${SCENARIOS[@]}"; do
+    IFS='|' read -r name url auth <<< "$scenario"
+    echo "running $name ..."
+    run_hey "$name" "$url" "$auth"
+done
+
+echo
+printf "%-22s %10s %10s %10s %10s %8s\n" "scenario" "req/s" "p50(s)" "p95(s)" "p99(s)" "non-200"
+for scenario in "${SCENARIOS[@]}"; do
+    IFS='|' read -r name _ _ <<< "$scenario"
+    summary "$RESULTS_DIR/$name.txt"
+done | tee "$RESULTS_DIR/summary.txt"
+
+echo
+echo "response size of /api/post/get-post?scope=all&limit=100 (bytes on the wire):"
+for encoding in identity gzip; do
+    size=$(curl -s -o /dev/null -w '%{size_download}' \
+        -H "Authorization: Bearer $TOKEN" -H "Accept-Encoding: $encoding" \
+        "$GATEWAY_URL/api/post/get-post?scope=all&limit=100")
+    printf "  %-9s %s\n" "$encoding" "$size"
+done | tee -a "$RESULTS_DIR/summary.txt"
@@ -1,14 +1,20 @@
 from typing import List, Optional, Literal
-from fastapi import FastAPI, HTTPException, Security, status, Query, Body, status
+from fastapi import FastAPI, HTTPException, Security, status, Query, Body, Response
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 
 from shared.database import applications_collection, users_collection, posts_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.idempotency import IdempotencyMiddleware
+from shared.pagination import fetch_page, set_next_cursor
 from models import ApplicationModel, GetApplicationModel, AddApplicationModel, DeleteApplicationModel, UpdateApplicationModel
 from jwt_utils import get_current_user
-import requests
-from shared.config import EMAIL_SERVICE_URL
+from shared.outbox import enqueue_email, BOOKING_EMAIL
+from shared.logger import get_logger
 
 # ==========================
 # FASTAPI APP
@@ -20,8 +26,27 @@ app = FastAPI(
     root_path="/api/application"
 )
 
+# Retried writes with the same Idempotency-Key replay the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/add-application"})
+
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "application-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "application-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+logger = get_logger("application-service")
+
 VN_TZ = timezone(timedelta(hours=7))
 
 # ==========================
@@ -36,11 +61,13 @@ VN_TZ = timezone(timedelta(hours=7))
     tags=["Application"]
 )
 async def get_me_applications(
+    response: Response,
     # Header Request
     token: str = Security(oauth2_scheme),
     # Query Param
     skip: int = Query(0, ge=0, description="Bỏ qua số lượng bản ghi (dùng cho phân trang). Mặc định = 0."),
     limit: int = Query(20, ge=1, description="Số lượng bản ghi muốn lấy. Mặc định = 20."),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page (thay cho skip)."),
 ):
     # Xác thực user
     current_user = await get_current_user(token, users_collection)
@@ -48,9 +75,9 @@ async def get_me_applications(
     # Query MongoDB: chỉ lấy applications của user hiện tại
     query = {"tutor_id": ObjectId( current_user.id )}
 
-    # Lấy dữ liệu + phân trang
-    cursor = applications_collection.find(query).skip(skip).limit(limit)
-    applications_list = list(cursor)
+    # Lấy dữ liệu + phân trang (keyset theo _id)
+    applications_list, next_cursor = await fetch_page(applications_collection, query, limit, cursor=cursor, skip=skip)
+    set_next_cursor(response, next_cursor)
 
     if not applications_list:
         raise HTTPException(status_code=404, detail="No applications found")
@@ -75,6 +102,7 @@ async def get_me_applications(
     tags=["Application"]
 )
 async def get_applications_of_post(
+    response: Response,
     # Header Request
     token: str = Security(oauth2_scheme),
     # Body Request
@@ -82,6 +110,7 @@ async def get_applications_of_post(
     # Query Param
     skip: int = Query(0, ge=0, description="Bỏ qua số lượng bản ghi (dùng cho phân trang). Mặc định = 0."),
     limit: int = Query(20, ge=1, description="Số lượng bản ghi muốn lấy. Mặc định = 20."),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page (thay cho skip)."),
     # Lọc theo trạng thái nếu muốn
     application_status: Optional[List[str]] = Query(
         None,
@@ -101,9 +130,9 @@ async def get_applications_of_post(
     if application_status:
         query["application_status"] = {"$in": application_status}
 
-    # Lấy dữ liệu + phân trang
-    cursor = applications_collection.find(query).skip(skip).limit(limit)
-    application_list = list(cursor)
+    # Lấy dữ liệu + phân trang (keyset theo _id)
+    application_list, next_cursor = await fetch_page(applications_collection, query, limit, cursor=cursor, skip=skip)
+    set_next_cursor(response, next_cursor)
 
     if not application_list:
         raise HTTPException(
@@ -147,15 +176,15 @@ async def add_application(
     _dict_input_data["applied_at"] = datetime.now(VN_TZ)
 
     # Lưu vào DB
-    inserted_id = applications_collection.insert_one({
+    inserted_id = (await applications_collection.insert_one({
         "post_id": ObjectId( _dict_input_data["post_id"] ),
         "tutor_id": ObjectId( _dict_input_data["tutor_id"] ),
         "application_status": _dict_input_data["application_status"],
         "applied_at": _dict_input_data["applied_at"]
-    }).inserted_id
+    })).inserted_id
 
     # Lấy lại bản ghi vừa tạo
-    saved = applications_collection.find_one({"_id": inserted_id})
+    saved = await applications_collection.find_one({"_id": inserted_id})
 
     # Convert ObjectId → string cho response model
     saved["id"] = str(saved["_id"])
@@ -182,7 +211,7 @@ async def delete_application(
 
     app_id = input_data.id
 
-    application = applications_collection.find_one({"_id": ObjectId(app_id)})
+    application = await applications_collection.find_one({"_id": ObjectId(app_id)})
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
 
@@ -191,7 +220,7 @@ async def delete_application(
         raise HTTPException(status_code=403, detail="Not allowed to delete this application")
 
     # Xóa application
-    result = applications_collection.delete_one({"_id": ObjectId(app_id)})
+    result = await applications_collection.delete_one({"_id": ObjectId(app_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete application")
 
@@ -215,24 +244,17 @@ async def update_application_status(
     app_id = input_data.id
 
     # Lấy application từ DB
-    application = applications_collection.find_one({"_id": ObjectId(app_id)})
+    application = await applications_collection.find_one({"_id": ObjectId(app_id)})
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
 
     # Lấy post liên quan
-    post = posts_collection.find_one({"_id": ObjectId(application["post_id"])})
+    post = await posts_collection.find_one({"_id": ObjectId(application["post_id"])})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Chỉ owner của post mới được update, nhưng admin cũng được phép
-    try:
-        db_user = users_collection.find_one({"_id": ObjectId(user_id)})
-    except Exception:
-        db_user = None
-
-    is_admin = False
-    if db_user:
-        is_admin = db_user.get("role") == "admin"
+    # Chỉ owner của post mới được update, nhưng admin cũng được phép (role từ token)
+    is_admin = current_user.role == "admin"
 
     if str(post["creator_id"]) != user_id and not is_admin:
         raise HTTPException(status_code=403, detail="Not allowed to update this application")
@@ -243,13 +265,13 @@ async def update_application_status(
         new_status = "rejected"
 
     # Cập nhật trạng thái application
-    applications_collection.update_one(
+    await applications_collection.update_one(
         {"_id": ObjectId(app_id)},
         {"$set": {"application_status": new_status, "updated_at": datetime.now(VN_TZ)}}
     )
 
     # Lấy lại application sau khi cập nhật
-    updated_app = applications_collection.find_one({"_id": ObjectId(app_id)})
+    updated_app = await applications_collection.find_one({"_id": ObjectId(app_id)})
 
     # Convert ObjectId → str
     updated_app["id"] = str(updated_app["_id"])
@@ -257,39 +279,36 @@ async def update_application_status(
     updated_app["tutor_id"] = str(updated_app["tutor_id"])
     updated_app.pop("_id", None)
 
-    # If admin accepted the application, notify the tutor by email
-    try:
-        if new_status == "accepted":
-            tutor = users_collection.find_one({"_id": ObjectId(updated_app["tutor_id"])})
-            post = posts_collection.find_one({"_id": ObjectId(updated_app["post_id"])})
-            tutor_email = tutor.get("email") if tutor else None
-            post_title = post.get("title") if post else ""
-
-            if tutor_email:
-                # Call email service to notify tutor (using booking email template)
-                try:
-                    parent = users_collection.find_one({"_id": ObjectId(user_id)})
-                    parent_name = parent.get("display_name") if parent else ""
-                    resp = requests.post(
-                        f"{EMAIL_SERVICE_URL}/send-email",
-                        json={
-                            "applicant_email": tutor_email,
-                            "applicant_name": tutor.get("display_name"),
-                            "parent_name": parent_name,
-                            "post_title": post_title,
-                            "poster_email": parent.get("email") if parent else "",
-                            "poster_phone": parent.get("phone") if parent else "",
-                            "content": "Your application has been approved.",
-                        },
-                        timeout=5,
-                    )
-                    if resp.status_code != 200:
-                        print("Email service returned non-200 when notifying tutor:", resp.status_code, resp.text)
-                except Exception as e:
-                    # swallow email errors but log to stdout
-                    print("Failed to send tutor notification email", str(e))
-    except Exception:
-        pass
+    # If the application was accepted, notify the tutor by email (booking email
+    # template, delivered from the outbox by email-service with retries).
+    # The intent must not be lost: if it cannot be queued the request fails and
+    # the client retries (same status again, dedupe key -> queued once).
+    if new_status == "accepted":
+        tutor = await users_collection.find_one({"_id": ObjectId(updated_app["tutor_id"])})
+        tutor_email = tutor.get("email") if tutor else None
+
+        if tutor_email:
+            try:
+                parent = await users_collection.find_one({"_id": ObjectId(user_id)})
+                await enqueue_email(
+                    BOOKING_EMAIL,
+                    {
+                        "applicant_email": tutor_email,
+                        "applicant_name": tutor.get("display_name"),
+                        "parent_name": parent.get("display_name") if parent else "",
+                        "post_title": post.get("title") or "",
+                        "poster_email": parent.get("email") if parent else "",
+                        "poster_phone": parent.get("phone") if parent else "",
+                        "content": "Your application has been approved.",
+                    },
+                    dedupe_key=f"application-accepted:{app_id}",
+                )
+            except Exception:
+                logger.exception("Failed to queue tutor notification email for application %s", app_id)
+                raise HTTPException(
+                    status_code=503,
+                    detail="Application updated but the tutor notification could not be queued, please retry",
+                )
     return ApplicationModel(**updated_app)
 
 
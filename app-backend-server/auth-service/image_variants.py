@@ -0,0 +1,80 @@
+# image_variants.py
+"""
+Thumbnail / preview transcoding for proof images.
+
+`transcode()` is a pure function (bytes in, bytes out) so it can run in a
+ProcessPoolExecutor: decoding and resizing are CPU-bound and would otherwise
+block the event loop or hold the GIL.
+"""
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+from PIL import Image, ImageOps, features
+
+# name -> (max width, max height, crop to exact size)
+VARIANTS = {
+    "thumb": (256, 256, True),
+    "preview": (1280, 1280, False),
+}
+ORIGINAL = "original"
+
+# guard against decompression bombs (~50 megapixels)
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+
+def output_format(preferred: str) -> str:
+    if preferred == "webp" and features.check("webp"):
+        return "webp"
+    return "jpeg"
+
+
+def transcode(data: bytes, fmt: str = "webp", quality: int = 80) -> Dict[str, dict]:
+    """Return {variant: {"data", "content_type", "width", "height"}}."""
+    fmt = output_format(fmt)
+    with Image.open(io.BytesIO(data)) as src:
+        # honour camera orientation before resizing
+        image = ImageOps.exif_transpose(src)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "P") else "RGB")
+        if fmt == "jpeg" and image.mode == "RGBA":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+
+        out = {}
+        for name, (width, height, crop) in VARIANTS.items():
+            if crop:
+                resized = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail((width, height), Image.LANCZOS)
+
+            buf = io.BytesIO()
+            if fmt == "webp":
+                resized.save(buf, format="WEBP", quality=quality, method=4)
+            else:
+                resized.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+            out[name] = {
+                "data": buf.getvalue(),
+                "content_type": f"image/{fmt}",
+                "width": resized.width,
+                "height": resized.height,
+            }
+        return out
+
+
+class ImageVariantPool:
+    """Process pool for transcode(); created at startup, shut down with the app."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def transcode(self, data: bytes, fmt: str, quality: int) -> Dict[str, dict]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, transcode, data, fmt, quality)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,22 @@
 # init_db.py
+"""
+Demo data for tutor_db. Not run by the services: seed once with
+
+    python -m init_db seed            # no-op when the seed marker is present
+    python -m init_db seed --force    # re-check every collection anyway
+    python -m init_db status
+
+(from auth-service/, next to `shared/`; docker-compose runs it as auth-seed).
+A marker in `schema_versions` records the applied SEED_VERSION, so checking
+an initialized database costs a single find_one.
+
+Benchmark-sized data on top of it (synthetic_data.py):
+
+    python -m init_db generate --users 50000 --posts 1000000
+"""
+import argparse
+import asyncio
+
 from shared.database import (
     users_collection,
     certificates_collection,
@@ -9,7 +27,12 @@ from shared.database import (
     # ratings will be added if present
     
 )
-from shared.database import ratings_collection
+from shared.database import ratings_collection, db
+from shared.locks import mongo_lock
+from shared.logger import get_logger
+from shared.rating_stats import reconcile_rating_summaries
+from shared.post_search import build_search_fields
+from synthetic_data import GenerateOptions, generate, generated_runs
 from utilities import hash_password
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
@@ -17,17 +40,26 @@ from bson import ObjectId
 # Việt Nam timezone (UTC+7)
 VN_TZ = timezone(timedelta(hours=7))
 
-def init_db():
+logger = get_logger("init_db")
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+SEED_VERSION_DOC_ID = "seed"
+# Bump when init_db() gains data that existing databases should get.
+SEED_VERSION = 1
+
+async def init_db():
     # ==========================
     # INIT USERS
     # ==========================
-    if users_collection.count_documents({}) == 0:
+    if await users_collection.count_documents({}) == 0:
+        # every seed user has password 123456: bcrypt (cost 12) once, not per user
+        seed_password_hash = hash_password("123456")
         users_data = [
             {
                 "username": "herta",
                 "email": "tranvinhquitdtu@gmail.com",
                 "phone": "0901000001",
-                "password_hash": hash_password("123456"),
+                "password_hash": seed_password_hash,
                 "display_name": "The Herta",
                 "subjects": ["Nghiên cứu AI", "Khoa học dữ liệu"],
                 "levels": ["Tất cả"],
@@ -42,7 +74,7 @@ def init_db():
                 "username": "bronya",
                 "email": "tranvinhquitdtu@gmail.com",
                 "phone": "0902000002",
-                "password_hash": hash_password("123456"),
+                "password_hash": seed_password_hash,
                 "display_name": "Bronya",
                 "subjects": [],
                 "levels": [],
@@ -57,7 +89,7 @@ def init_db():
                 "username": "jingyuan",
                 "email": "tranvinhquitdtu@gmail.com",
                 "phone": "0903000003",
-                "password_hash": hash_password("123456"),
+                "password_hash": seed_password_hash,
                 "display_name": "Jing Yuan",
                 "subjects": ["Toán", "Vật Lý"],
                 "levels": ["6","7","8","9","10","11","12"],
@@ -72,7 +104,7 @@ def init_db():
                 "username": "qui",
                 "email": "tranvinhquitdtu@gmail.com",
                 "phone": "0901000001",
-                "password_hash": hash_password("123456"),
+                "password_hash": seed_password_hash,
                 "display_name": "qui",
                 "subjects": ["Nghiên cứu AI", "Khoa học dữ liệu"],
                 "levels": ["Tất cả"],
@@ -84,18 +116,18 @@ def init_db():
                 "status": "verified"
             },
         ]
-        insert_result = users_collection.insert_many(users_data)
+        insert_result = await users_collection.insert_many(users_data)
         user_ids = insert_result.inserted_ids
         print("Users inserted:", user_ids)
     else:
-        users = list(users_collection.find({}))
+        users = await users_collection.find({}).to_list(length=None)
         user_ids = [u["_id"] for u in users]
         print("Users already exist.")
 
     # ==========================
     # INIT CERTIFICATES
     # ==========================
-    if certificates_collection.count_documents({}) == 0:
+    if await certificates_collection.count_documents({}) == 0:
         certificates_data = [
             {
                 "user_id": user_ids[0],
@@ -125,7 +157,7 @@ def init_db():
                 "status": "unverified",
             },
         ]
-        certificates_collection.insert_many(certificates_data)
+        await certificates_collection.insert_many(certificates_data)
         print("Certificates inserted!")
     else:
         print("Certificates already exist.")
@@ -133,7 +165,7 @@ def init_db():
     # ==========================
     # INIT POSTS
     # ==========================
-    if posts_collection.count_documents({}) == 0:
+    if await posts_collection.count_documents({}) == 0:
         if len(user_ids) < 2:
             print("Not enough users for posts. Please initialize users first.")
             return
@@ -345,18 +377,20 @@ def init_db():
             },
 
         ]
-        result = posts_collection.insert_many(posts_data)
+        for post in posts_data:
+            post["search"] = build_search_fields(post)
+        result = await posts_collection.insert_many(posts_data)
         print("Posts inserted:", result.inserted_ids)
     else:
         print("Posts already exist.")
 
     # Lấy posts hiện có để dùng các bước sau
-    posts = list(posts_collection.find({}))
+    posts = await posts_collection.find({}).to_list(length=None)
 
     # ==========================
     # INIT APPLICATIONS
     # ==========================
-    if applications_collection.count_documents({}) == 0:
+    if await applications_collection.count_documents({}) == 0:
         if len(user_ids) < 3:
             print("Not enough users for applications.")
             return
@@ -387,7 +421,7 @@ def init_db():
                 "applied_at": datetime.now(VN_TZ), 
             }
         ]
-        applications_collection.insert_many(applications_data)
+        await applications_collection.insert_many(applications_data)
         print("Applications inserted!")
     else:
         print("Applications already exist.")
@@ -395,7 +429,7 @@ def init_db():
     # ==========================
     # INIT BOOKINGS
     # ==========================
-    if bookings_collection.count_documents({}) == 0:
+    if await bookings_collection.count_documents({}) == 0:
         if len(user_ids) < 3 or len(posts) < 2:
             print("Not enough users or posts for bookings.")
         else:
@@ -421,7 +455,7 @@ def init_db():
                     "updated_at": datetime.now(VN_TZ),
                 },
             ]
-            bookings_collection.insert_many(bookings_data)
+            await bookings_collection.insert_many(bookings_data)
             print("Bookings inserted!")
     else:
         print("Bookings already exist.")
@@ -429,7 +463,7 @@ def init_db():
     # ==========================
     # INIT TRANSACTIONS
     # ==========================
-    if transactions_collection.count_documents({}) == 0:
+    if await transactions_collection.count_documents({}) == 0:
         if len(posts) < 2:
             print("Not enough posts for transactions.")
             return
@@ -450,7 +484,7 @@ def init_db():
                 "created_at": datetime.now(VN_TZ),
             },
         ]
-        transactions_collection.insert_many(transactions_data)
+        await transactions_collection.insert_many(transactions_data)
         print("Transactions inserted!")
     else:
         print("Transactions already exist.")
@@ -459,7 +493,7 @@ def init_db():
     # INIT RATINGS
     # ==========================
     try:
-        has_ratings = ratings_collection.count_documents({}) > 0
+        has_ratings = await ratings_collection.count_documents({}) > 0
     except Exception:
         has_ratings = False
 
@@ -509,7 +543,8 @@ def init_db():
                 }
             ]
             try:
-                ratings_collection.insert_many(ratings_data)
+                await ratings_collection.insert_many(ratings_data)
+                await reconcile_rating_summaries()
                 print("Ratings inserted!")
             except Exception:
                 print("Failed to insert ratings (DB may not support it).")
@@ -517,3 +552,72 @@ def init_db():
             print("Not enough users to create sample ratings.")
     else:
         print("Ratings already exist.")
+
+
+# ==========================
+# SEED COMMAND
+# ==========================
+async def seeded_version() -> int:
+    marker = await db[SCHEMA_VERSIONS_COLLECTION].find_one({"_id": SEED_VERSION_DOC_ID})
+    return marker.get("version", 0) if marker else 0
+
+
+async def seed(force: bool = False) -> bool:
+    """Run init_db() unless the marker says it is done; True when it ran."""
+    if not force and await seeded_version() >= SEED_VERSION:
+        return False
+
+    # several seeders at once would each see empty collections
+    async with mongo_lock("init_db", ttl_seconds=600, wait_seconds=600):
+        if not force and await seeded_version() >= SEED_VERSION:
+            return False
+        await init_db()
+        await db[SCHEMA_VERSIONS_COLLECTION].update_one(
+            {"_id": SEED_VERSION_DOC_ID},
+            {"$max": {"version": SEED_VERSION}},
+            upsert=True,
+        )
+    logger.info("Database seeded (version %s)", SEED_VERSION)
+    return True
+
+
+async def status():
+    print(f"seed version {await seeded_version()} (current {SEED_VERSION})")
+    for run in await generated_runs():
+        print(f"synthetic data {run['at']:%Y-%m-%d %H:%M} ({run['seconds']}s): {run['counts']}")
+
+
+def main():
+    defaults = GenerateOptions()
+    parser = argparse.ArgumentParser(description="Seed tutor_db with demo data")
+    parser.add_argument("command", choices=["seed", "status", "generate"])
+    parser.add_argument("--force", action="store_true", help="ignore the seed marker")
+    # generate
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--posts", type=int, default=defaults.posts)
+    parser.add_argument("--applications-per-post", type=float, default=defaults.applications_per_post, help="mean fan-out")
+    parser.add_argument("--post-fee-ratio", type=float, default=defaults.post_fee_ratio, help="posts with a paid post fee (stay inactive)")
+    parser.add_argument("--hire-ratio", type=float, default=defaults.hire_ratio, help="posts with a paid application + booking")
+    parser.add_argument("--completed-ratio", type=float, default=defaults.completed_ratio)
+    parser.add_argument("--rating-ratio", type=float, default=defaults.rating_ratio)
+    parser.add_argument("--days", type=int, default=defaults.days, help="created_at spread over the last N days")
+    parser.add_argument("--prefix", dest="username_prefix", default=defaults.username_prefix, help="usernames <prefix>0000000...")
+    parser.add_argument("--password", default=defaults.password)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument("--max-in-flight", type=int, default=defaults.max_in_flight, help="concurrent insert_many per collection")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        ran = asyncio.run(seed(force=args.force))
+        print("seeded" if ran else f"already initialized (version {SEED_VERSION})")
+    elif args.command == "generate":
+        options = {name: getattr(args, name) for name in GenerateOptions.__dataclass_fields__}
+        counts = asyncio.run(generate(GenerateOptions(**options)))
+        print("generated", counts)
+    else:
+        asyncio.run(status())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, HTTPException, Depends, Form, Request, Security, status, Header, Body
+import asyncio
+from fastapi import FastAPI, HTTPException, Depends, Form, Request, Security, status, Header, Body, Response, File, UploadFile, Query, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
-from typing import List
+from typing import List, Dict, Optional
 
 from models import TokenModel, UserModel, LoginModel, CertificateModel, UpdateProfileModel, AddCertificateModel, DelCertificateModel, GetProfileByUserIDModel, GetCertificateByUserIDModel, ProfileModel, ProofImageModel, AddProofImageModel, DelProofImageModel
-from shared.database import users_collection, certificates_collection, ratings_collection, proof_images_collection
+from shared.database import users_collection, certificates_collection, proof_images_collection, applications_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler, top_slow_queries, SORT_FIELDS as SLOW_QUERY_SORT_FIELDS
+from shared.pagination import fetch_page, set_next_cursor
 from datetime import datetime
-from utilities import verify_password, get_user_from_db
-from init_db import init_db
+from utilities import verify_password, get_user_from_db, get_user_by_id
+from init_db import seeded_version, SEED_VERSION
 from jwt_utils import create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from models import UpdateProfileStatusModel, UpdateCertificateStatusModel
-
-# INIT DB
-init_db()
+from shared.auth import principal_claims, get_cached_user, invalidate_user
+from shared.rating_stats import get_rating_stats, get_rating_stats_many
+from shared.config import PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING, PROFILE_BATCH_MAX_IDS, PROOF_IMAGE_MAX_BYTES, IMAGE_POOL_WORKERS, CACHE_TTL_USER_CERTIFICATES
+from shared.response_cache import response_cache, cached_response, invalidate_tags, user_certificates_tag
+from shared.blob_store import get_blob_store, BlobTooLarge, BlobNotFound, CHUNK_SIZE
+from shared.locks import mongo_lock
+from shared.logger import get_logger
+from proof_images import (
+    BLOB_PREFIX,
+    ALLOWED_CONTENT_TYPES,
+    to_proof_image_model,
+    decode_data_url,
+    parse_range,
+    verify_signature,
+    blob_for_variant,
+    generate_variants,
+    variant_blob_keys,
+    blob_lock_name,
+    VARIANT_NAMES,
+)
+from image_variants import ImageVariantPool, ORIGINAL
+from password_pool import PasswordHashPool, PasswordPoolSaturated
+from models import UpdateProfileStatusModel, UpdateCertificateStatusModel, GetProfilesByUserIDsModel
+from models import DashboardModel, DashboardCertificateModel, DashboardApplicationModel
+from models import SlowQueryModel
 
 # ==========================
 # FASTAPI APP
@@ -24,6 +52,58 @@ app = FastAPI(
     root_path="/api/auth"
 )
 
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "auth-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "auth-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+# bcrypt off the event loop, bounded (fast 503 instead of an unbounded queue)
+password_pool = PasswordHashPool(PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING)
+
+@app.on_event("shutdown")
+async def shutdown_password_pool():
+    password_pool.shutdown()
+
+# BLOB STORE (proof images): create local root / S3 bucket if missing
+@app.on_event("startup")
+async def startup_blob_store():
+    await get_blob_store().startup()
+
+# RESPONSE CACHE (Redis invalidation listener when RESPONSE_CACHE_REDIS_URL is set)
+@app.on_event("startup")
+async def startup_response_cache():
+    await response_cache.startup()
+
+@app.on_event("shutdown")
+async def shutdown_response_cache():
+    await response_cache.shutdown()
+
+# Thumbnail / preview transcoding, CPU-bound -> process pool off the request path
+image_pool = ImageVariantPool(IMAGE_POOL_WORKERS)
+
+@app.on_event("shutdown")
+async def shutdown_image_pool():
+    image_pool.shutdown()
+
+# SEED DATA: not at startup (`python -m init_db seed`, auth-seed in docker-compose);
+# a worker only reads the seed marker, which also checks the DB is reachable
+logger = get_logger("auth-service")
+
+@app.on_event("startup")
+async def startup_check_seed():
+    version = await seeded_version()
+    if version < SEED_VERSION:
+        logger.warning("Database seed version %s < %s: run `python -m init_db seed`", version, SEED_VERSION)
+
 # ==========================
 # OAUTH2 (hiển thị nút Authorize)
 # ==========================
@@ -55,11 +135,23 @@ async def get_login_data(request: Request):
     status_code=status.HTTP_200_OK
 )
 async def login(data: LoginModel = Depends(get_login_data)):
-    user = get_user_from_db(data.username, users_collection)
-    if not user or not verify_password(data.password, user.password_hash):
+    user = await get_user_from_db(data.username, users_collection)
+    if not user:
         raise HTTPException(status_code=401, detail="Sai username hoặc password")
 
-    access_token = create_access_token({"sub": user.username})
+    try:
+        password_ok = await password_pool.run(verify_password, data.password, user.password_hash)
+    except PasswordPoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hệ thống đang bận, vui lòng thử lại",
+            headers={"Retry-After": "1"}
+        )
+    if not password_ok:
+        raise HTTPException(status_code=401, detail="Sai username hoặc password")
+
+    # id/role/status are signed into the token so other services skip the users lookup
+    access_token = create_access_token(principal_claims(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 # /api/auth/me/get-profile
@@ -75,29 +167,91 @@ async def me(token: str = Security(oauth2_scheme)):
         users_collection=users_collection
     )
 
-    # Fetch fresh user doc to attach rating stats
-    user = users_collection.find_one({"_id": ObjectId(current_user.id)})
+    # User doc from the per-process cache (invalidated on profile/status writes)
+    user = await get_cached_user(
+        current_user.id,
+        lambda uid: get_user_by_id(uid, users_collection)
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    user_id = str(user.get("_id"))
+    # rating stats: materialized summary maintained by rating-service
+    rating_stats = await get_rating_stats(user.id)
 
-    # compute rating stats
-    stats = list(ratings_collection.aggregate([
-        {"$match": {"tutor_id": ObjectId(user_id)}},
-        {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}}
-    ]))
+    return user.model_copy(update=rating_stats)
 
-    if stats:
-        user["avg_rating"] = round(float(stats[0].get("avg", 0.0)), 2)
-        user["rating_count"] = int(stats[0].get("count", 0))
-    else:
-        user["avg_rating"] = None
-        user["rating_count"] = 0
+# /api/auth/me/dashboard
+@app.get(
+    "/me/dashboard",
+    response_model=DashboardModel,
+    tags=["Profile"],
+    status_code=status.HTTP_200_OK
+)
+async def me_dashboard(
+    token: str = Security(oauth2_scheme),
+    applications_limit: int = Query(20, ge=0, le=100, description="Số application gần nhất"),
+    variant: str = Query("thumb", description="Proof image variant: original | thumb | preview")
+):
+    """Profile page in one round trip: profile + rating stats, certificates with
+    their proof images, profile proof images and recent applications. The
+    queries are independent and run concurrently."""
+    current_user = await get_current_user(token=token, users_collection=users_collection)
+    if variant not in VARIANT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Invalid variant; must be one of {list(VARIANT_NAMES)}")
+    user_oid = ObjectId(current_user.id)
+
+    async def recent_applications():
+        if applications_limit == 0:
+            return []
+        return await applications_collection.find({"tutor_id": user_oid}) \
+            .sort("_id", -1).limit(applications_limit).to_list(length=None)
+
+    user, rating_stats, certificates, proofs, applications = await asyncio.gather(
+        get_cached_user(current_user.id, lambda uid: get_user_by_id(uid, users_collection)),
+        get_rating_stats(current_user.id),
+        certificates_collection.find({"user_id": user_oid}).to_list(length=None),
+        # every proof image of the user (profile + certificates) in one query
+        proof_images_collection.find({"user_id": user_oid}, {"image": 0}).to_list(length=None),
+        recent_applications(),
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    user["id"] = str(user["_id"])
-    user.pop("_id", None)
-    return UserModel(**user)
+    proofs_by_target: Dict[tuple, list] = {}
+    for im in proofs:
+        proofs_by_target.setdefault((im.get("type"), str(im.get("type_id"))), []).append(
+            to_proof_image_model(im, app.root_path, variant)
+        )
+
+    profile = ProfileModel(**user.model_dump(exclude={"password_hash"}))
+    return DashboardModel(
+        profile=profile.model_copy(update=rating_stats),
+        profile_proof_images=proofs_by_target.get(("profile", current_user.id), []),
+        certificates=[
+            DashboardCertificateModel(
+                id=str(c.get("_id")),
+                user_id=str(c.get("user_id")),
+                certificate_type=c.get("certificate_type"),
+                description=c.get("description"),
+                url=c.get("url"),
+                filename=c.get("filename"),
+                uploaded_at=c.get("uploaded_at"),
+                status=c.get("status"),
+                proof_images=proofs_by_target.get(("certificate", str(c.get("_id"))), []),
+            )
+            for c in certificates
+        ],
+        applications=[
+            DashboardApplicationModel(
+                id=str(a["_id"]),
+                post_id=str(a["post_id"]),
+                tutor_id=str(a["tutor_id"]),
+                application_status=a.get("application_status"),
+                applied_at=a.get("applied_at"),
+            )
+            for a in applications
+        ],
+    )
 
 # /api/auth/get-profile-by-user-id
 @app.post(
@@ -118,7 +272,7 @@ async def get_profile_by_user_id(
     target_user_id = str(input_data.user_id)
 
     # Tìm user trong DB
-    user = users_collection.find_one({"_id": ObjectId(target_user_id)})
+    user = await users_collection.find_one({"_id": ObjectId(target_user_id)})
 
     if not user:
         raise HTTPException(
@@ -133,22 +287,57 @@ async def get_profile_by_user_id(
     user.pop("password_hash", None)
     user.pop("username", None)
 
-    # compute rating stats for the requested user
-    stats = list(ratings_collection.aggregate([
-        {"$match": {"tutor_id": ObjectId(target_user_id)}},
-        {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}}
-    ]))
-
-    if stats:
-        user["avg_rating"] = round(float(stats[0].get("avg", 0.0)), 2)
-        user["rating_count"] = int(stats[0].get("count", 0))
-    else:
-        user["avg_rating"] = None
-        user["rating_count"] = 0
+    # rating stats for the requested user (materialized summary)
+    user.update(await get_rating_stats(target_user_id))
 
     # Trả về ProfileModel (tự động chỉ lấy field hợp lệ)
     return ProfileModel(**user)
 
+# /api/auth/get-profiles-by-user-ids
+@app.post(
+    "/get-profiles-by-user-ids",
+    status_code=status.HTTP_200_OK,
+    response_model=Dict[str, ProfileModel],
+    tags=["Profile"]
+)
+async def get_profiles_by_user_ids(
+    token: str = Security(oauth2_scheme),
+    input_data: GetProfilesByUserIDsModel = Body(...)
+):
+    """Request body: { "user_ids": ["<id>", ...] } (tối đa PROFILE_BATCH_MAX_IDS)
+    Returns { "<id>": ProfileModel } for the ids that exist; unknown ids are omitted.
+    """
+    # Chỉ check token
+    _ = await get_current_user(token, users_collection)
+
+    if len(input_data.user_ids) > PROFILE_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many user_ids (max {PROFILE_BATCH_MAX_IDS})"
+        )
+    try:
+        user_oids = [ObjectId(uid) for uid in input_data.user_ids]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid user id")
+
+    if not user_oids:
+        return {}
+
+    # 1 query cho users + 1 query cho rating stats
+    users = await users_collection.find(
+        {"_id": {"$in": user_oids}},
+        {"password_hash": 0, "username": 0}
+    ).to_list(length=None)
+    stats_by_user = await get_rating_stats_many(user_oids)
+
+    result = {}
+    for u in users:
+        u["id"] = str(u.pop("_id"))
+        u.update(stats_by_user[u["id"]])
+        result[u["id"]] = ProfileModel(**u)
+
+    return result
+
 
 # Admin: update profile status (unverified|pending|rejected|accepted)
 @app.post(
@@ -166,11 +355,12 @@ async def admin_update_profile_status(
 
     target_id = input_data.user_id
     try:
-        users_collection.update_one({"_id": ObjectId(target_id)}, {"$set": {"status": input_data.status}})
+        await users_collection.update_one({"_id": ObjectId(target_id)}, {"$set": {"status": input_data.status}})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user id")
+    await invalidate_user(target_id)
 
-    user = users_collection.find_one({"_id": ObjectId(target_id)})
+    user = await users_collection.find_one({"_id": ObjectId(target_id)})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -195,18 +385,43 @@ async def admin_update_certificate_status(
 
     cert_id = input_data.certificate_id
     try:
-        certificates_collection.update_one({"_id": ObjectId(cert_id)}, {"$set": {"status": input_data.status}})
+        await certificates_collection.update_one({"_id": ObjectId(cert_id)}, {"$set": {"status": input_data.status}})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid certificate id")
 
-    cert = certificates_collection.find_one({"_id": ObjectId(cert_id)})
+    cert = await certificates_collection.find_one({"_id": ObjectId(cert_id)})
     if not cert:
         raise HTTPException(status_code=404, detail="Certificate not found")
+    await invalidate_tags(user_certificates_tag(cert.get("user_id")))
 
     cert["id"] = str(cert["_id"]) if cert.get("_id") else cert_id
     cert["user_id"] = str(cert["user_id"]) if cert.get("user_id") else None
     return CertificateModel(**cert)
 
+
+# Admin: top-N Mongo query shapes of every service (shared/query_profiler.py)
+@app.get(
+    "/admin/slow-queries",
+    response_model=List[SlowQueryModel],
+    status_code=status.HTTP_200_OK,
+    tags=["Admin"]
+)
+async def admin_slow_queries(
+    token: str = Security(oauth2_scheme),
+    limit: int = Query(20, ge=1, le=200, description="Số shape trả về"),
+    sort: str = Query("max_ms", description="max_ms | total_ms | avg_ms | slow_count | count"),
+    service: Optional[str] = Query(None, description="Ví dụ post-service, bỏ trống để lấy tất cả"),
+    hours: float = Query(24, gt=0, le=24 * 30, description="Cửa sổ thời gian (giờ)"),
+):
+    current_user = await get_current_user(token, users_collection)
+    if not getattr(current_user, 'role', None) == 'admin':
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    if sort not in SLOW_QUERY_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SLOW_QUERY_SORT_FIELDS)}")
+
+    rows = await top_slow_queries(limit=limit, sort=sort, service=service, hours=hours)
+    return [SlowQueryModel(**row) for row in rows]
+
 # /api/auth/me/get-certificate
 @app.get(
     "/me/get-certificate",
@@ -220,7 +435,7 @@ async def get_certificate(token: str = Security(oauth2_scheme)):
         users_collection=users_collection
     )
 
-    certificates = list(certificates_collection.find({"user_id": ObjectId(current_user.id)}))
+    certificates = await certificates_collection.find({"user_id": ObjectId(current_user.id)}).to_list(length=None)
 
     if not certificates:
         raise HTTPException(status_code=404, detail="Không tìm thấy chứng chỉ")
@@ -240,7 +455,84 @@ async def get_certificate(token: str = Security(oauth2_scheme)):
     ]
 
 
-# api/auth/me/add-proof-image
+def validate_proof_target(type_: str, type_id: str) -> ObjectId:
+    # validate type
+    if type_ not in ["profile", "certificate"]:
+        raise HTTPException(status_code=400, detail="Invalid type; must be 'profile' or 'certificate'")
+
+    # validate type_id
+    try:
+        return ObjectId(type_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid type_id")
+
+
+def validate_image_content_type(content_type: str) -> str:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported image type; allowed: {sorted(ALLOWED_CONTENT_TYPES)}")
+    return content_type
+
+
+async def insert_proof_image(user_id: str, type_: str, type_obj_id: ObjectId, chunks, content_type: str, background_tasks: BackgroundTasks, filename: str = None) -> ProofImageModel:
+    try:
+        async with get_blob_store().staged(
+            chunks, content_type=content_type, prefix=BLOB_PREFIX, max_bytes=PROOF_IMAGE_MAX_BYTES
+        ) as blob:
+            # bytes + document under the key's lock: delete_proof_image cannot
+            # drop a shared blob between "already stored" and the insert
+            async with mongo_lock(blob_lock_name(blob.info.key)):
+                info = await blob.store()
+                doc = {
+                    "type": type_,
+                    "type_id": type_obj_id,
+                    "blob_key": info.key,
+                    "content_type": info.content_type,
+                    "size": info.size,
+                    "sha256": info.sha256,
+                    "filename": filename,
+                    "created_at": datetime.utcnow(),
+                    "user_id": ObjectId(user_id)
+                }
+                res = await proof_images_collection.insert_one(doc)
+    except BlobTooLarge:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {PROOF_IMAGE_MAX_BYTES} bytes")
+    doc["_id"] = res.inserted_id
+
+    # thumbnails/previews after the response is sent
+    background_tasks.add_task(generate_variants, res.inserted_id, image_pool.transcode)
+    return to_proof_image_model(doc, app.root_path)
+
+
+# api/auth/me/upload-proof-image (multipart/form-data, streamed to the blob store)
+@app.post(
+    "/me/upload-proof-image",
+    response_model=ProofImageModel,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Profile", "Certificate"]
+)
+async def upload_proof_image(
+    background_tasks: BackgroundTasks,
+    token: str = Security(oauth2_scheme),
+    type: str = Form(...),
+    type_id: str = Form(...),
+    file: UploadFile = File(...)
+):
+    current_user = await get_current_user(token, users_collection)
+    type_obj_id = validate_proof_target((type or "").strip().lower(), type_id)
+    content_type = validate_image_content_type(file.content_type)
+
+    async def chunks():
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    return await insert_proof_image(current_user.id, (type or "").strip().lower(), type_obj_id, chunks(), content_type, background_tasks, file.filename)
+
+
+# api/auth/me/add-proof-image (JSON base64, kept for older clients; bytes go to the blob store)
 @app.post(
     "/me/add-proof-image",
     response_model=ProofImageModel,
@@ -248,36 +540,87 @@ async def get_certificate(token: str = Security(oauth2_scheme)):
     tags=["Profile", "Certificate"]
 )
 async def add_proof_image(
+    background_tasks: BackgroundTasks,
     token: str = Security(oauth2_scheme),
     input_data: AddProofImageModel = Body(...)
 ):
     current_user = await get_current_user(token, users_collection)
+    type_obj_id = validate_proof_target(input_data.type, input_data.type_id)
 
-    # validate type
-    if input_data.type not in ["profile", "certificate"]:
-        raise HTTPException(status_code=400, detail="Invalid type; must be 'profile' or 'certificate'")
+    data, content_type = decode_data_url(input_data.image)
+    content_type = validate_image_content_type(content_type)
+    if len(data) > PROOF_IMAGE_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {PROOF_IMAGE_MAX_BYTES} bytes")
+
+    async def chunks():
+        yield data
+
+    return await insert_proof_image(current_user.id, input_data.type, type_obj_id, chunks(), content_type, background_tasks)
+
+
+# api/auth/proof-images/{image_id}/content (signed URL, no Authorization header needed)
+@app.get(
+    "/proof-images/{image_id}/content",
+    tags=["Profile", "Certificate"],
+    responses={200: {"content": {"image/*": {}}}, 206: {"description": "Partial content"}, 304: {"description": "Not modified"}}
+)
+async def get_proof_image_content(
+    image_id: str,
+    request: Request,
+    exp: int = Query(...),
+    sig: str = Query(...),
+    variant: str = Query(ORIGINAL, description="original | thumb | preview (falls back to original until generated)")
+):
+    if not verify_signature(image_id, exp, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired image URL")
+    if variant not in VARIANT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Invalid variant; must be one of {list(VARIANT_NAMES)}")
 
-    # validate type_id
     try:
-        type_obj_id = ObjectId(input_data.type_id)
+        img = await proof_images_collection.find_one({"_id": ObjectId(image_id)})
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid type_id")
+        img = None
+    if not img:
+        raise HTTPException(status_code=404, detail="Proof image not found")
 
-    doc = {
-        "type": input_data.type,
-        "type_id": type_obj_id,
-        "image": input_data.image,
-        "created_at": datetime.utcnow(),
-        "user_id": ObjectId(current_user.id)
+    # Legacy document: inline base64, not migrated yet
+    if not img.get("blob_key"):
+        data, content_type = decode_data_url(img.get("image", ""))
+        return Response(content=data, media_type=content_type, headers={"Cache-Control": "private, max-age=3600"})
+
+    served, blob = blob_for_variant(img, variant)
+
+    # content-addressed -> the bytes behind a key never change; a variant that
+    # is still pending is served as the original, which must not be cached long
+    etag = f'"{blob.get("sha256")}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, max-age=31536000, immutable" if served == variant else "private, no-cache",
+        "Accept-Ranges": "bytes",
     }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    res = proof_images_collection.insert_one(doc)
-    new = proof_images_collection.find_one({"_id": res.inserted_id})
-    new["id"] = str(new["_id"])
-    new["type_id"] = str(new["type_id"]) if new.get("type_id") else None
-    new["user_id"] = str(new.get("user_id")) if new.get("user_id") else None
+    store = get_blob_store()
+    try:
+        size = await store.size(blob["key"])
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Proof image content missing")
 
-    return ProofImageModel(**new)
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        (start, end), status_code = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        store.iter_range(blob["key"], start, end),
+        status_code=status_code,
+        media_type=blob.get("content_type") or "application/octet-stream",
+        headers=headers,
+    )
 
 
 # api/auth/me/delete-proof-image
@@ -293,7 +636,7 @@ async def delete_proof_image(
     current_user = await get_current_user(token, users_collection)
 
     try:
-        img = proof_images_collection.find_one({"_id": ObjectId(input_data.id)})
+        img = await proof_images_collection.find_one({"_id": ObjectId(input_data.id)})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid id")
 
@@ -305,7 +648,17 @@ async def delete_proof_image(
     if owner_id != current_user.id and getattr(current_user, 'role', None) != 'admin':
         raise HTTPException(status_code=403, detail="Not allowed to delete this proof image")
 
-    proof_images_collection.delete_one({"_id": ObjectId(input_data.id)})
+    await proof_images_collection.delete_one({"_id": ObjectId(input_data.id)})
+
+    # content-addressed blobs can be shared: drop the bytes with the last reference
+    # (variants are derived from the original, so they go with it). The check
+    # and the delete hold the key's lock, like an upload of the same bytes.
+    blob_key = img.get("blob_key")
+    if blob_key:
+        async with mongo_lock(blob_lock_name(blob_key)):
+            if not await proof_images_collection.find_one({"blob_key": blob_key}, {"_id": 1}):
+                for key in [blob_key] + variant_blob_keys(img):
+                    await get_blob_store().delete(key)
     return {"detail": "deleted"}
 
 
@@ -320,8 +673,9 @@ async def request_profile_verification(
 ):
     current_user = await get_current_user(token, users_collection)
     user_id = current_user.id
-    users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"status": "pending"}})
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    await users_collection.update_one({"_id": ObjectId(user_id)}, {"$set": {"status": "pending"}})
+    await invalidate_user(user_id)
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
     user["id"] = str(user.get("_id"))
     user.pop("_id", None)
     return ProfileModel(**user)
@@ -347,12 +701,13 @@ async def request_certificate_verification(
         raise HTTPException(status_code=400, detail="Invalid certificate_id")
 
     # ensure certificate belongs to current user
-    cert = certificates_collection.find_one({"_id": oid, "user_id": ObjectId(current_user.id)})
+    cert = await certificates_collection.find_one({"_id": oid, "user_id": ObjectId(current_user.id)})
     if not cert:
         raise HTTPException(status_code=404, detail="Certificate not found or not owned by user")
 
-    certificates_collection.update_one({"_id": oid}, {"$set": {"status": "pending"}})
-    cert = certificates_collection.find_one({"_id": oid})
+    await certificates_collection.update_one({"_id": oid}, {"$set": {"status": "pending"}})
+    await invalidate_tags(user_certificates_tag(current_user.id))
+    cert = await certificates_collection.find_one({"_id": oid})
     cert["id"] = str(cert.get("_id"))
     cert["user_id"] = str(cert.get("user_id"))
     return CertificateModel(**cert)
@@ -369,8 +724,8 @@ async def get_proof_images_by_type(
     token: str = Security(oauth2_scheme),
     input_data: dict = Body(...)
 ):
-    """Request body: { "type": "profile"|"certificate", "type_id": "<id>" }
-    Returns list of proof images for that type/type_id.
+    """Request body: { "type": "profile"|"certificate", "type_id": "<id>", "variant": "original"|"thumb"|"preview" }
+    Returns metadata + signed content urls of the proof images for that type/type_id.
     """
     # validate token
     _ = await get_current_user(token, users_collection)
@@ -384,15 +739,13 @@ async def get_proof_images_by_type(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid type_id")
 
-    imgs = list(proof_images_collection.find({"type": t, "type_id": oid}))
-    result = []
-    for im in imgs:
-        im["id"] = str(im.get("_id"))
-        im["type_id"] = str(im.get("type_id")) if im.get("type_id") else None
-        im["user_id"] = str(im.get("user_id")) if im.get("user_id") else None
-        result.append(ProofImageModel(**im))
+    variant = input_data.get("variant") or ORIGINAL
+    if variant not in VARIANT_NAMES:
+        raise HTTPException(status_code=400, detail=f"Invalid variant; must be one of {list(VARIANT_NAMES)}")
 
-    return result
+    # metadata only: bytes are fetched separately from the signed url
+    imgs = await proof_images_collection.find({"type": t, "type_id": oid}, {"image": 0}).to_list(length=None)
+    return [to_proof_image_model(im, app.root_path, variant) for im in imgs]
 
 # /api/auth/get-certificate-by-user-id
 @app.post(
@@ -402,6 +755,8 @@ async def get_proof_images_by_type(
     status_code=status.HTTP_200_OK
 )
 async def get_certificate_by_user_id(
+    request: Request,
+    response: Response,
     token: str = Security(oauth2_scheme),
     input_data: GetCertificateByUserIDModel = Body(...)
 ):
@@ -410,10 +765,22 @@ async def get_certificate_by_user_id(
 
     target_user_id = str(input_data.user_id)
 
+    # POST read: tham số nằm trong body -> key cache theo user_id
+    return await cached_response(
+        request,
+        response,
+        lambda: load_certificates_of_user(target_user_id),
+        ttl=CACHE_TTL_USER_CERTIFICATES,
+        tags=[user_certificates_tag(target_user_id)],
+        key=f"{request.url.path}?user_id={target_user_id}",
+    )
+
+
+async def load_certificates_of_user(target_user_id: str) -> List[CertificateModel]:
     # Lấy danh sách chứng chỉ của user khác
-    certificates = list(certificates_collection.find({
+    certificates = await certificates_collection.find({
         "user_id": ObjectId(target_user_id)
-    }))
+    }).to_list(length=None)
 
     # Return empty list if no certificates found (not an error)
     if not certificates:
@@ -442,11 +809,13 @@ async def get_certificate_by_user_id(
     tags=["Admin"]
 )
 async def get_profiles_by_status(
+    response: Response,
     token: str = Security(oauth2_scheme),
     input_data: dict = Body(...)
 ):
-    """Request body: { "status": "unverified|pending|rejected|accepted", "skip": 0, "limit": 50 }
+    """Request body: { "status": "unverified|pending|rejected|accepted", "skip": 0, "limit": 50, "cursor": null }
     Returns list of ProfileModel for users matching status. Admin only.
+    Next page token (if any) is in the X-Next-Cursor header.
     """
     current_user = await get_current_user(token, users_collection)
     if getattr(current_user, 'role', None) != 'admin':
@@ -462,24 +831,18 @@ async def get_profiles_by_status(
     except Exception:
         raise HTTPException(status_code=400, detail="skip and limit must be integers")
 
-    users = list(users_collection.find({"status": status_filter}).skip(skip).limit(limit))
+    users, next_cursor = await fetch_page(
+        users_collection, {"status": status_filter}, limit,
+        cursor=input_data.get('cursor'), skip=skip
+    )
+    set_next_cursor(response, next_cursor)
+    # rating stats for the whole page in one query
+    stats_by_user = await get_rating_stats_many(u["_id"] for u in users)
+
     result = []
     for u in users:
-        # compute rating stats
-        uid = str(u.get("_id"))
-        stats = list(ratings_collection.aggregate([
-            {"$match": {"tutor_id": ObjectId(uid)}},
-            {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}}
-        ]))
-
-        if stats:
-            u["avg_rating"] = round(float(stats[0].get("avg", 0.0)), 2)
-            u["rating_count"] = int(stats[0].get("count", 0))
-        else:
-            u["avg_rating"] = None
-            u["rating_count"] = 0
-
         u["id"] = str(u.get("_id"))
+        u.update(stats_by_user[u["id"]])
         # remove sensitive
         u.pop("password_hash", None)
         u.pop("username", None)
@@ -497,11 +860,13 @@ async def get_profiles_by_status(
     tags=["Admin"]
 )
 async def get_certificates_by_status(
+    response: Response,
     token: str = Security(oauth2_scheme),
     input_data: dict = Body(...)
 ):
-    """Request body: { "status": "unverified|pending|rejected|accepted", "skip": 0, "limit": 50 }
+    """Request body: { "status": "unverified|pending|rejected|accepted", "skip": 0, "limit": 50, "cursor": null }
     Returns list of CertificateModel filtered by status. Admin only.
+    Next page token (if any) is in the X-Next-Cursor header.
     """
     current_user = await get_current_user(token, users_collection)
     if getattr(current_user, 'role', None) != 'admin':
@@ -517,7 +882,11 @@ async def get_certificates_by_status(
     except Exception:
         raise HTTPException(status_code=400, detail="skip and limit must be integers")
 
-    certs = list(certificates_collection.find({"status": status_filter}).skip(skip).limit(limit))
+    certs, next_cursor = await fetch_page(
+        certificates_collection, {"status": status_filter}, limit,
+        cursor=input_data.get('cursor'), skip=skip
+    )
+    set_next_cursor(response, next_cursor)
     out = []
     for c in certs:
         c["id"] = str(c.get("_id"))
@@ -560,7 +929,7 @@ async def update_profile(
             detail="No valid fields to update."
         )
 
-    result = users_collection.update_one(
+    result = await users_collection.update_one(
         {"_id": ObjectId(user_id)},
         {"$set": update_data}
     )
@@ -570,23 +939,14 @@ async def update_profile(
             status_code=404,
             detail="User not found."
         )
+    await invalidate_user(user_id)
 
     # Lấy user mới nhất sau khi update
-    user = users_collection.find_one({"_id": ObjectId(user_id)})
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
 
     # Convert MongoDB object → UserModel
-    # attach rating stats
-    stats = list(ratings_collection.aggregate([
-        {"$match": {"tutor_id": ObjectId(user_id)}},
-        {"$group": {"_id": None, "avg": {"$avg": "$rating"}, "count": {"$sum": 1}}}
-    ]))
-
-    if stats:
-        user["avg_rating"] = round(float(stats[0].get("avg", 0.0)), 2)
-        user["rating_count"] = int(stats[0].get("count", 0))
-    else:
-        user["avg_rating"] = None
-        user["rating_count"] = 0
+    # attach rating stats (materialized summary)
+    user.update(await get_rating_stats(user_id))
 
     user["id"] = str(user["_id"])
     user.pop("_id", None)
@@ -622,16 +982,17 @@ async def update_certificate(
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update.")
 
-    result = certificates_collection.update_one(
+    result = await certificates_collection.update_one(
         {"_id": ObjectId(cert_id), "user_id": ObjectId(user_id)},
         {"$set": update_data}
     )
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Certificate not found or not owned by user.")
+    await invalidate_tags(user_certificates_tag(user_id))
 
     # Lấy lại certificate sau update
-    certificate = certificates_collection.find_one({"_id": ObjectId(cert_id)})
+    certificate = await certificates_collection.find_one({"_id": ObjectId(cert_id)})
 
     certificate["id"] = str(certificate["_id"])
     certificate["user_id"] = str(certificate["user_id"])
@@ -657,10 +1018,11 @@ async def add_certificate(
     cert_data = input_data.dict(exclude={"id", "user_id"})  # loại bỏ id và user_id nếu có
     cert_data["user_id"] = ObjectId(user_id)
 
-    result = certificates_collection.insert_one(cert_data)
+    result = await certificates_collection.insert_one(cert_data)
+    await invalidate_tags(user_certificates_tag(user_id))
 
     # Lấy certificate vừa insert
-    certificate = certificates_collection.find_one({"_id": result.inserted_id})
+    certificate = await certificates_collection.find_one({"_id": result.inserted_id})
 
     certificate["id"] = str(certificate["_id"])
     certificate["user_id"] = str(certificate["user_id"])
@@ -684,7 +1046,7 @@ async def delete_certificate(
     certificate_id = str( input_data.id )
 
     # Kiểm tra certificate có tồn tại và thuộc về user không
-    cert = certificates_collection.find_one({
+    cert = await certificates_collection.find_one({
         "_id": ObjectId(certificate_id),
         "user_id": ObjectId(user_id)
     })
@@ -696,7 +1058,8 @@ async def delete_certificate(
         )
 
     # Xóa certificate
-    certificates_collection.delete_one({"_id": ObjectId(certificate_id)})
+    await certificates_collection.delete_one({"_id": ObjectId(certificate_id)})
+    await invalidate_tags(user_certificates_tag(user_id))
 
     return {"detail": "Certificate deleted successfully"}
 
@@ -708,3 +1071,12 @@ async def delete_certificate(
 )
 async def health_check():
     return {"status": "ok"}
+
+# /api/auth/health/password-pool
+@app.get(
+    "/health/password-pool",
+    tags=["System"],
+    status_code=status.HTTP_200_OK
+)
+async def password_pool_stats():
+    return password_pool.stats()
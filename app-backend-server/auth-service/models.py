@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -160,6 +160,15 @@ class GetProfileByUserIDModel(BaseModel):
         return normalize_value(v)
 
 
+class GetProfilesByUserIDsModel(BaseModel):
+    user_ids: List[str]
+
+    @validator("user_ids", pre=True)
+    def normalize_user_ids(cls, v):
+        # bỏ giá trị rỗng + trùng lặp, giữ thứ tự
+        return list(dict.fromkeys(i for i in (v or []) if normalize_value(i)))
+
+
 class GetCertificateByUserIDModel(BaseModel):
     user_id: str
 
@@ -190,7 +199,13 @@ class ProofImageModel(BaseModel):
     id: str
     type: str  # 'profile' or 'certificate'
     type_id: str
-    image: str
+    url: str   # signed URL of the image bytes (GET /proof-images/{id}/content)
+    image: Optional[str] = None  # deprecated: same as url (used to be inline base64)
+    variant: str = "original"    # variant actually served by url (original until thumbnails exist)
+    variant_urls: Dict[str, str] = {}
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
     created_at: Optional[datetime] = None
 
     class Config:
@@ -212,4 +227,54 @@ class DelProofImageModel(BaseModel):
 
     @validator('id', pre=True)
     def normalize_id(cls, v):
-        return normalize_value(v)
\ No newline at end of file
+        return normalize_value(v)
+
+# ===============================
+#  DASHBOARD (GET /me/dashboard)
+# ===============================
+
+class DashboardCertificateModel(CertificateModel):
+    proof_images: List[ProofImageModel] = []
+
+
+class DashboardApplicationModel(BaseModel):
+    id: str
+    post_id: str
+    tutor_id: str
+    application_status: Optional[str] = None
+    applied_at: Optional[datetime] = None
+
+
+class DashboardModel(BaseModel):
+    profile: ProfileModel
+    profile_proof_images: List[ProofImageModel] = []
+    certificates: List[DashboardCertificateModel] = []
+    applications: List[DashboardApplicationModel] = []
+
+
+# ===============================
+#  ADMIN: SLOW QUERIES (shared/query_profiler.py)
+# ===============================
+
+class QueryPlanModel(BaseModel):
+    stages: str
+    indexes: List[str] = []
+    flags: List[str] = []
+
+
+class SlowQueryModel(BaseModel):
+    id: str
+    service: str
+    namespace: str
+    command: str
+    shape: str
+    count: int
+    slow_count: int
+    failures: int = 0
+    avg_ms: float
+    max_ms: float
+    total_ms: float
+    flags: List[str] = []
+    plan: Optional[QueryPlanModel] = None
+    explained_at: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
@@ -0,0 +1,56 @@
+# password_pool.py
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PasswordPoolSaturated(Exception):
+    pass
+
+
+class PasswordHashPool:
+    """Bounded thread pool for bcrypt work (bcrypt releases the GIL).
+
+    `pending` counts running + queued jobs. It is only touched from the event
+    loop thread, so no lock is needed.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+        self.pending = 0
+        self.completed_total = 0
+        self.rejected_total = 0
+        self.latency_seconds_total = 0.0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected_total += 1
+            raise PasswordPoolSaturated()
+
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed_total += 1
+            self.latency_seconds_total += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+            "latency_seconds_total": round(self.latency_seconds_total, 3),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
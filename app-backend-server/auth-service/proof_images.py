@@ -0,0 +1,257 @@
+# proof_images.py
+"""
+Proof images live in the blob store (shared/blob_store.py); `proof_images`
+documents only keep metadata + the content-addressed `blob_key`.
+
+Image bytes are served by GET /proof-images/{id}/content. <img> tags cannot
+send the Bearer token, so list responses carry signed URLs (HMAC over id +
+expiry, expiry rounded to BLOB_URL_TTL_SECONDS so the URL, and therefore the
+browser cache entry, is stable within a window).
+
+After an upload, `generate_variants()` runs in the background and stores a
+fixed-size thumbnail and a capped-resolution preview (image_variants.py, in
+a process pool) under `variants.<name>`; until then every variant falls back
+to the original.
+
+Documents written before the blob store still hold an inline base64 `image`;
+they are served as-is until migrated with `python -m proof_images migrate`
+(`python -m proof_images variants` fills in missing thumbnails/previews).
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import re
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from shared.blob_store import get_blob_store
+from shared.config import JWT_SECRET_KEY, BLOB_URL_TTL_SECONDS, IMAGE_VARIANT_FORMAT, IMAGE_VARIANT_QUALITY
+from shared.database import proof_images_collection
+from shared.logger import get_logger
+from models import ProofImageModel
+from image_variants import VARIANTS, ORIGINAL
+
+logger = get_logger("proof_images")
+
+BLOB_PREFIX = "proofs"
+VARIANT_BLOB_PREFIX = "proofs/variants"
+VARIANT_NAMES = (ORIGINAL,) + tuple(VARIANTS)
+ALLOWED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif"}
+
+_DATA_URL_RE = re.compile(r"^data:(?P<type>[\w/+.-]+)?(;[\w=-]+)*;base64,(?P<data>.*)$", re.S)
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+# ============================================
+# SIGNED URLS
+# ============================================
+def _signature(image_id: str, expires: int) -> str:
+    msg = f"{image_id}:{expires}".encode()
+    return hmac.new(JWT_SECRET_KEY.encode(), msg, hashlib.sha256).hexdigest()[:32]
+
+
+def signed_content_url(image_id: str, root_path: str = "", variant: str = ORIGINAL) -> str:
+    window = max(BLOB_URL_TTL_SECONDS, 1)
+    # valid for at least one full window
+    expires = (int(time.time()) // window + 2) * window
+    url = f"{root_path}/proof-images/{image_id}/content?exp={expires}&sig={_signature(image_id, expires)}"
+    return url if variant == ORIGINAL else f"{url}&variant={variant}"
+
+
+def verify_signature(image_id: str, exp: int, sig: str) -> bool:
+    if exp < time.time():
+        return False
+    return hmac.compare_digest(_signature(image_id, exp), sig or "")
+
+
+# ============================================
+# DOCUMENTS
+# ============================================
+def blob_for_variant(doc: dict, variant: str = ORIGINAL) -> Tuple[str, dict]:
+    """(served variant, blob metadata) - falls back to the original while the
+    requested variant is not generated yet."""
+    generated = (doc.get("variants") or {}).get(variant)
+    if variant != ORIGINAL and generated:
+        return variant, generated
+    return ORIGINAL, {
+        "key": doc.get("blob_key"),
+        "size": doc.get("size"),
+        "sha256": doc.get("sha256"),
+        "content_type": doc.get("content_type"),
+    }
+
+
+def to_proof_image_model(doc: dict, root_path: str = "", variant: str = ORIGINAL) -> ProofImageModel:
+    image_id = str(doc["_id"])
+    variant_urls = {name: signed_content_url(image_id, root_path, name) for name in VARIANT_NAMES}
+    served, blob = blob_for_variant(doc, variant)
+    return ProofImageModel(
+        id=image_id,
+        type=doc.get("type"),
+        type_id=str(doc.get("type_id")) if doc.get("type_id") else None,
+        url=variant_urls[variant],
+        image=variant_urls[variant],
+        variant=served,
+        variant_urls=variant_urls,
+        content_type=blob.get("content_type"),
+        size=blob.get("size"),
+        sha256=blob.get("sha256"),
+        created_at=doc.get("created_at"),
+    )
+
+
+def decode_data_url(value: str) -> Tuple[bytes, str]:
+    """'data:image/png;base64,...' (or bare base64) -> (bytes, content_type)"""
+    content_type = "application/octet-stream"
+    match = _DATA_URL_RE.match(value or "")
+    if match:
+        content_type = match.group("type") or content_type
+        value = match.group("data")
+    try:
+        return base64.b64decode(value, validate=False), content_type
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid base64 image")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """`Range: bytes=a-b` -> inclusive (start, end); None = whole blob.
+    Multi-range requests are served whole."""
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "" and last == "":
+        return None
+    if first == "":
+        # suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+# ============================================
+# VARIANTS (thumbnail / preview)
+# ============================================
+TranscodeFn = Callable[[bytes, str, int], Awaitable[Dict[str, dict]]]
+
+
+async def generate_variants(image_id, transcode: TranscodeFn) -> bool:
+    """Transcode the original and attach `variants` to the document.
+    Failures are recorded (variants_error) and never raised: the original
+    keeps being served."""
+    doc = await proof_images_collection.find_one({"_id": image_id}, {"blob_key": 1})
+    if not doc or not doc.get("blob_key"):
+        return False
+
+    store = get_blob_store()
+    try:
+        original = await store.read_bytes(doc["blob_key"])
+        outputs = await transcode(original, IMAGE_VARIANT_FORMAT, IMAGE_VARIANT_QUALITY)
+
+        variants = {}
+        for name, out in outputs.items():
+            info = await store.put_bytes(out["data"], content_type=out["content_type"], prefix=VARIANT_BLOB_PREFIX)
+            variants[name] = {
+                "key": info.key,
+                "size": info.size,
+                "sha256": info.sha256,
+                "content_type": info.content_type,
+                "width": out["width"],
+                "height": out["height"],
+            }
+    except Exception as e:
+        logger.warning("Variant generation failed for proof image %s: %s", image_id, e)
+        await proof_images_collection.update_one(
+            {"_id": image_id},
+            {"$set": {"variants_error": str(e)[:300], "variants_updated_at": datetime.utcnow()}},
+        )
+        return False
+
+    await proof_images_collection.update_one(
+        {"_id": image_id},
+        {
+            "$set": {"variants": variants, "variants_updated_at": datetime.utcnow()},
+            "$unset": {"variants_error": ""},
+        },
+    )
+    return True
+
+
+def variant_blob_keys(doc: dict) -> list:
+    return [v["key"] for v in (doc.get("variants") or {}).values() if v.get("key")]
+
+
+def blob_lock_name(key: str) -> str:
+    # mongo_lock held while storing + referencing a key and while dropping its last reference
+    return f"proof-blob:{key}"
+
+
+async def transcode_inline(data: bytes, fmt: str, quality: int) -> Dict[str, dict]:
+    from image_variants import transcode
+    return transcode(data, fmt, quality)
+
+
+async def backfill_variants() -> int:
+    done = 0
+    async for doc in proof_images_collection.find(
+        {"blob_key": {"$exists": True}, "variants": {"$exists": False}}, {"_id": 1}
+    ):
+        done += await generate_variants(doc["_id"], transcode_inline)
+    return done
+
+
+# ============================================
+# MIGRATION (inline base64 -> blob store)
+# ============================================
+async def migrate_inline_images(batch_size: int = 50) -> int:
+    store = get_blob_store()
+    await store.startup()
+    migrated = 0
+    ops = []
+    async for doc in proof_images_collection.find({"image": {"$exists": True}, "blob_key": {"$exists": False}}):
+        data, content_type = decode_data_url(doc["image"])
+        info = await store.put_bytes(data, content_type=content_type, prefix=BLOB_PREFIX)
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {
+                "$set": {"blob_key": info.key, "size": info.size, "sha256": info.sha256, "content_type": content_type},
+                "$unset": {"image": ""},
+            },
+        ))
+        if len(ops) >= batch_size:
+            await proof_images_collection.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+    if ops:
+        await proof_images_collection.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proof image storage")
+    parser.add_argument("command", choices=["migrate", "variants"])
+    args = parser.parse_args()
+    if args.command == "migrate":
+        print(f"{asyncio.run(migrate_inline_images())} proof images moved to the blob store")
+    else:
+        print(f"{asyncio.run(backfill_variants())} proof images got thumbnails/previews")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+# synthetic_data.py
+"""
+Synthetic dataset at production scale, to benchmark indexes, pagination and
+search (`python -m init_db generate`, see init_db.py):
+
+    python -m init_db generate --users 50000 --posts 1000000
+
+Post states and references follow what the services write (see
+transaction-service/payments.py):
+    - posts.creator_id, applications.tutor_id, bookings.* and ratings.* are
+      generated users (never the post's own creator as tutor)
+    - some posts have a paid "post" fee transaction; like POST_PAYMENT, it
+      leaves the post "inactive" without payment_tx_id
+    - only a hired post is "active": one application "accepted_and_paid" +
+      its paid "application" transaction, assigned_tutor, and a booking with
+      that tutor. So scope=all (inactive posts) lists the unhired ones
+    - completed bookings may have a rating from the parent; rating_summaries
+      are incremented to match (shared.rating_stats)
+    - posts carry their `search` fields (shared.post_search)
+
+Popularity is skewed (a few users create / apply much more than the others),
+`_id`s follow `created_at` so keyset pagination walks the data in time order.
+
+Documents are built in streaming batches and written with concurrent
+`insert_many(ordered=False)` (bounded in flight), so memory stays flat
+whatever the size. bcrypt runs once per PASSWORD_HASH_POOL_SIZE hashes, not
+per user: every generated user logs in with --password.
+
+Load into an empty database (MONGO_INITDB_DATABASE=tutor_bench ...) before
+the services start: their startup hooks build the indexes once, which is
+much faster than maintaining them during the load.
+"""
+import asyncio
+import itertools
+import os
+import random
+import struct
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from shared.database import (
+    db,
+    users_collection,
+    posts_collection,
+    applications_collection,
+    bookings_collection,
+    transactions_collection,
+    ratings_collection,
+    rating_summaries_collection,
+)
+from shared.logger import get_logger
+from shared.post_search import build_search_fields
+from utilities import hash_password
+
+logger = get_logger("synthetic_data")
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+SYNTHETIC_DOC_ID = "synthetic"
+
+PASSWORD_HASH_POOL_SIZE = 8
+POST_FEE = 10000.0
+APPLICATION_FEE = 10000.0
+
+# (value, weight): a few subjects / cities dominate, like real traffic
+SUBJECTS = [
+    ("Toán", 30), ("Tiếng Anh", 25), ("Vật Lý", 10), ("Hóa", 10), ("Ngữ Văn", 8),
+    ("Tin học", 6), ("Sinh học", 4), ("Lịch sử", 2), ("Tiếng Nhật", 3), ("Mỹ thuật", 2),
+]
+LEVELS = [(str(grade), 6) for grade in range(1, 13)] + [("Giao tiếp", 8), ("Cơ bản", 6), ("Đại học", 4)]
+CITIES = [
+    ("TP. Hồ Chí Minh", 35), ("Hà Nội", 30), ("Đà Nẵng", 8), ("Cần Thơ", 5), ("Hải Phòng", 5),
+    ("Huế", 3), ("Nha Trang", 3), ("Biên Hòa", 3), ("Online", 8),
+]
+DISTRICTS = {
+    "TP. Hồ Chí Minh": ["Quận 1", "Quận 3", "Quận 7", "Bình Thạnh", "Thủ Đức"],
+    "Hà Nội": ["Cầu Giấy", "Đống Đa", "Hai Bà Trưng", "Ba Đình"],
+    "Đà Nẵng": ["Hải Châu", "Sơn Trà"],
+    "Cần Thơ": ["Ninh Kiều"],
+}
+MODES = [("online", 40), ("offline", 60)]
+TIMES = ["Tối thứ 2, 4, 6", "Chiều thứ 3 và thứ 5", "Sáng thứ 7 và Chủ nhật", "Buổi tối các ngày trong tuần", "Chiều Chủ nhật"]
+STUDENT_INFO = ["Học sinh cần củng cố kiến thức nền", "Chuẩn bị thi chuyển cấp", "Muốn luyện thi học sinh giỏi", "Người đi làm cần học thêm"]
+REQUIREMENTS = ["Có kinh nghiệm dạy học 2 năm", "Sinh viên sư phạm", "Kiên nhẫn, dễ hiểu", "Có chứng chỉ liên quan"]
+FIRST_NAMES = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hùng", "Lan", "Linh", "Minh", "Nam", "Ngọc", "Phong", "Quân", "Thảo", "Trang", "Tuấn", "Vy"]
+LAST_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng"]
+MAX_APPLICATIONS_PER_POST = 100
+
+
+def _choices(table):
+    """(values, cumulative weights) for random.choices: computed once, not per document."""
+    values, weights = zip(*table)
+    return values, list(itertools.accumulate(weights))
+
+
+SUBJECT_CHOICES, LEVEL_CHOICES, CITY_CHOICES, MODE_CHOICES = map(_choices, (SUBJECTS, LEVELS, CITIES, MODES))
+
+
+@dataclass
+class GenerateOptions:
+    users: int = 1000
+    posts: int = 10000
+    applications_per_post: float = 3.0   # mean fan-out
+    post_fee_ratio: float = 0.6          # posts with a paid "post" fee transaction (status unchanged)
+    hire_ratio: float = 0.3              # posts with a paid application + booking
+    completed_ratio: float = 0.5         # bookings "completed" (the others accepted / cancelled)
+    rating_ratio: float = 0.7            # completed bookings rated by the parent
+    days: int = 365                      # created_at spread over the last `days`
+    username_prefix: str = "synth"
+    password: str = "123456"
+    batch_size: int = 5000
+    max_in_flight: int = 4
+    seed: int = 42
+
+
+# ============================================
+# BATCH WRITER
+# ============================================
+class BatchWriter:
+    """Buffers documents, inserts full batches concurrently (at most `max_in_flight`)."""
+
+    def __init__(self, collection, batch_size: int, max_in_flight: int):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.inserted = 0
+        self.failed = 0
+        self._buffer: List[dict] = []
+        self._in_flight = set()
+
+    async def add(self, doc: dict) -> None:
+        self._buffer.append(doc)
+        if len(self._buffer) >= self.batch_size:
+            await self._send()
+
+    async def _send(self) -> None:
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        while len(self._in_flight) >= self.max_in_flight:
+            done, self._in_flight = await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        self._in_flight.add(asyncio.create_task(self._insert(batch)))
+
+    async def _insert(self, batch: List[dict]) -> None:
+        try:
+            result = await self.collection.insert_many(batch, ordered=False)
+            self.inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            # ordered=False: everything but the failed documents is written
+            self.inserted += e.details.get("nInserted", 0)
+            self.failed += len(e.details.get("writeErrors", []))
+
+    async def flush(self) -> None:
+        await self._send()
+        if self._in_flight:
+            for task in await asyncio.gather(*self._in_flight, return_exceptions=True):
+                if isinstance(task, BaseException):
+                    raise task
+            self._in_flight = set()
+
+
+# ============================================
+# GENERATOR
+# ============================================
+class Generator:
+    def __init__(self, opts: GenerateOptions):
+        self.opts = opts
+        self.rng = random.Random(opts.seed)
+        self.now = datetime.now(timezone.utc)
+        self.start = self.now - timedelta(days=opts.days)
+        self.writers = {
+            name: BatchWriter(collection, opts.batch_size, opts.max_in_flight)
+            for name, collection in (
+                ("users", users_collection),
+                ("posts", posts_collection),
+                ("applications", applications_collection),
+                ("bookings", bookings_collection),
+                ("transactions", transactions_collection),
+                ("ratings", ratings_collection),
+            )
+        }
+        # tutor_id -> [rating_sum, rating_count], written to rating_summaries at the end
+        self.rating_totals: Dict[ObjectId, List[int]] = defaultdict(lambda: [0, 0])
+        self.user_ids: List[ObjectId] = []
+
+    # ---- helpers ----
+    def pick(self, choices):
+        values, cum_weights = choices
+        return self.rng.choices(values, cum_weights=cum_weights)[0]
+
+    def object_id(self, at: datetime) -> ObjectId:
+        """ObjectId whose timestamp is `at`: _id order == creation order."""
+        return ObjectId(struct.pack(">I", int(at.timestamp())) + self.rng.randbytes(8))
+
+    def skewed_user(self, exclude: ObjectId = None) -> ObjectId:
+        # power law over user index: the first users are the most active ones
+        while True:
+            user_id = self.user_ids[min(int(len(self.user_ids) * self.rng.random() ** 2), len(self.user_ids) - 1)]
+            if user_id != exclude:
+                return user_id
+
+    def fan_out(self, mean: float) -> int:
+        # geometric-ish: many posts with 0-2 applications, a long tail of popular ones
+        if mean <= 0:
+            return 0
+        return int(self.rng.expovariate(1 / mean) + 0.5)
+
+    # ---- users ----
+    def password_hashes(self) -> List[str]:
+        with ThreadPoolExecutor(max_workers=min(PASSWORD_HASH_POOL_SIZE, os.cpu_count() or 1)) as pool:
+            return list(pool.map(hash_password, [self.opts.password] * PASSWORD_HASH_POOL_SIZE))
+
+    async def generate_users(self) -> None:
+        hashes = await asyncio.to_thread(self.password_hashes)
+        writer = self.writers["users"]
+        for i in range(self.opts.users):
+            first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+            user_id = ObjectId()
+            self.user_ids.append(user_id)
+            teaches = self.rng.random() < 0.5
+            username = f"{self.opts.username_prefix}{i:07d}"
+            await writer.add({
+                "_id": user_id,
+                "username": username,
+                "email": f"{username}@example.com",
+                "phone": f"09{self.rng.randrange(10**8):08d}",
+                "password_hash": hashes[i % len(hashes)],
+                "display_name": f"{last} {first}",
+                "subjects": self.rng.sample([s for s, _ in SUBJECTS], self.rng.randint(1, 3)) if teaches else [],
+                "levels": self.rng.sample([lv for lv, _ in LEVELS], self.rng.randint(1, 4)) if teaches else [],
+                "gender": self.rng.choice(["male", "female"]),
+                "address": self.pick(CITY_CHOICES),
+                "bio": "",
+                "balance": float(self.rng.randrange(0, 5_000_000, 10000)),
+                "role": "customer",
+                "status": "verified" if self.rng.random() < 0.3 else "unverified",
+            })
+        await writer.flush()
+
+    # ---- posts and everything hanging off them ----
+    async def generate_posts(self) -> None:
+        opts = self.opts
+        span = (self.now - self.start).total_seconds()
+        for i in range(opts.posts):
+            created_at = self.start + timedelta(seconds=span * i / opts.posts + self.rng.random())
+            await self.generate_post(created_at)
+            if (i + 1) % 100000 == 0:
+                logger.info("%d / %d posts", i + 1, opts.posts)
+        for writer in self.writers.values():
+            await writer.flush()
+
+    async def generate_post(self, created_at: datetime) -> None:
+        opts, rng = self.opts, self.rng
+        post_id = self.object_id(created_at)
+        creator_id = self.skewed_user()
+        subject, level, city = self.pick(SUBJECT_CHOICES), self.pick(LEVEL_CHOICES), self.pick(CITY_CHOICES)
+        districts = DISTRICTS.get(city)
+        address = f"{rng.choice(districts)}, {city}" if districts else city
+        post = {
+            "_id": post_id,
+            "creator_id": creator_id,
+            "title": f"Gia sư {subject} {level}" if not level.isdigit() else f"Gia sư {subject} lớp {level}",
+            "subject": subject,
+            "level": level,
+            "address": address,
+            "salary_amount": float(rng.randrange(100000, 500001, 10000)),
+            "sessions_per_week": rng.randint(1, 5),
+            "minutes_per_session": rng.choice([60, 75, 90, 120]),
+            "preferred_times": rng.choice(TIMES),
+            "student_info": rng.choice(STUDENT_INFO),
+            "requirements": rng.choice(REQUIREMENTS),
+            "mode": self.pick(MODE_CHOICES),
+            "post_status": "inactive",
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+        if rng.random() < opts.post_fee_ratio:
+            # POST_PAYMENT releases its claim: the post stays inactive, no payment_tx_id
+            paid_at = created_at + timedelta(minutes=rng.randint(1, 120))
+            await self.add_transaction("post", creator_id, post_id, POST_FEE, paid_at)
+
+        tutors = self.applicants(creator_id, self.fan_out(opts.applications_per_post))
+        hired = bool(tutors) and rng.random() < opts.hire_ratio
+        for n, tutor_id in enumerate(tutors):
+            applied_at = created_at + timedelta(hours=rng.randint(1, 72))
+            application_id = self.object_id(applied_at)
+            application = {
+                "_id": application_id,
+                "post_id": post_id,
+                "tutor_id": tutor_id,
+                "application_status": rng.choice(["pending", "pending", "rejected"]),
+                "applied_at": applied_at,
+            }
+            if hired and n == 0:
+                paid_at = applied_at + timedelta(hours=rng.randint(1, 48))
+                application["application_status"] = "accepted_and_paid"
+                application["payment_tx_id"] = await self.add_transaction(
+                    "application", tutor_id, post_id, APPLICATION_FEE, paid_at, application_id=application_id
+                )
+                application["updated_at"] = paid_at
+                post["assigned_tutor"] = tutor_id
+                post["post_status"] = "active"
+                await self.add_booking(post_id, tutor_id, creator_id, paid_at)
+            elif hired:
+                application["application_status"] = "rejected"
+            await self.writers["applications"].add(application)
+
+        post["search"] = build_search_fields(post)
+        await self.writers["posts"].add(post)
+
+    def applicants(self, creator_id: ObjectId, count: int) -> List[ObjectId]:
+        count = min(count, len(self.user_ids) - 1, MAX_APPLICATIONS_PER_POST)
+        tutors = []
+        seen = {creator_id}
+        while len(tutors) < count:
+            tutor_id = self.skewed_user(exclude=creator_id)
+            if tutor_id not in seen:
+                seen.add(tutor_id)
+                tutors.append(tutor_id)
+        return tutors
+
+    async def add_transaction(self, kind, payer_id, post_id, amount, at, application_id=None) -> ObjectId:
+        tx_id = self.object_id(at)
+        tx = {
+            "_id": tx_id,
+            "kind": kind,
+            "post_id": post_id,
+            "payer_id": payer_id,
+            "amount_money": amount,
+            "transaction_status": "paid",
+            # naive UTC like transaction-service/payments.py
+            "created_at": at.replace(tzinfo=None),
+        }
+        if application_id is not None:
+            tx["application_id"] = application_id
+        await self.writers["transactions"].add(tx)
+        return tx_id
+
+    async def add_booking(self, post_id, tutor_id, parent_id, at: datetime) -> None:
+        rng = self.rng
+        start_date = at + timedelta(days=rng.randint(1, 7))
+        end_date = start_date + timedelta(days=rng.choice([30, 60, 90]))
+        if end_date < self.now and rng.random() < self.opts.completed_ratio:
+            status = "completed"
+        else:
+            status = "cancelled" if rng.random() < 0.1 else "accepted"
+        booking_id = self.object_id(at)
+        await self.writers["bookings"].add({
+            "_id": booking_id,
+            "post_id": post_id,
+            "tutor_id": tutor_id,
+            "parent_id": parent_id,
+            "start_date": start_date,
+            "end_date": end_date,
+            "contract_status": status,
+            "created_at": at,
+            "updated_at": min(end_date, self.now) if status == "completed" else at,
+        })
+
+        if status == "completed" and rng.random() < self.opts.rating_ratio:
+            rating = rng.choices([1, 2, 3, 4, 5], [2, 3, 10, 35, 50])[0]
+            rated_at = min(end_date + timedelta(days=rng.randint(0, 14)), self.now)
+            await self.writers["ratings"].add({
+                "_id": self.object_id(rated_at),
+                "tutor_id": tutor_id,
+                "parent_id": parent_id,
+                "booking_id": booking_id,
+                "rating": rating,
+                "comment": rng.choice(["Rất nhiệt tình", "Khá tốt", "Dạy dễ hiểu", "Bình thường", ""]),
+                "rated_at": rated_at,
+            })
+            totals = self.rating_totals[tutor_id]
+            totals[0] += rating
+            totals[1] += 1
+
+    async def write_rating_summaries(self) -> None:
+        """$inc like shared.rating_stats.apply_rating_delta: existing summaries stay right."""
+        ops = []
+        for tutor_id, (rating_sum, rating_count) in self.rating_totals.items():
+            ops.append(UpdateOne(
+                {"_id": tutor_id},
+                {"$inc": {"rating_sum": rating_sum, "rating_count": rating_count}, "$set": {"updated_at": self.now}},
+                upsert=True,
+            ))
+            if len(ops) >= self.opts.batch_size:
+                await rating_summaries_collection.bulk_write(ops, ordered=False)
+                ops = []
+        if ops:
+            await rating_summaries_collection.bulk_write(ops, ordered=False)
+
+
+# ============================================
+# ENTRY POINT
+# ============================================
+async def generate(opts: GenerateOptions) -> Dict[str, int]:
+    """Insert the dataset; returns the number of documents written per collection."""
+    if opts.users < 2:
+        raise ValueError("need at least 2 users (a post creator and a tutor)")
+    first_username = f"{opts.username_prefix}{0:07d}"
+    if await users_collection.find_one({"username": first_username}, {"_id": 1}):
+        raise ValueError(f"user {first_username} exists already: pick another --prefix")
+
+    started = time.perf_counter()
+    gen = Generator(opts)
+    await gen.generate_users()
+    logger.info("%d users in %.1fs", gen.writers["users"].inserted, time.perf_counter() - started)
+    await gen.generate_posts()
+    await gen.write_rating_summaries()
+
+    counts = {name: writer.inserted for name, writer in gen.writers.items()}
+    failed = {name: writer.failed for name, writer in gen.writers.items() if writer.failed}
+    elapsed = round(time.perf_counter() - started, 1)
+    await db[SCHEMA_VERSIONS_COLLECTION].update_one(
+        {"_id": SYNTHETIC_DOC_ID},
+        {"$push": {"runs": {"options": asdict(opts), "counts": counts, "failed": failed,
+                            "seconds": elapsed, "at": datetime.now(timezone.utc)}}},
+        upsert=True,
+    )
+    logger.info("Synthetic data in %.1fs: %s%s", elapsed, counts, f", failed {failed}" if failed else "")
+    return counts
+
+
+async def generated_runs() -> List[dict]:
+    marker = await db[SCHEMA_VERSIONS_COLLECTION].find_one({"_id": SYNTHETIC_DOC_ID})
+    return marker.get("runs", []) if marker else []
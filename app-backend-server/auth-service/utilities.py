@@ -1,4 +1,5 @@
 import bcrypt
+from bson import ObjectId
 from models import UserModel
 
 def hash_password(plain_password: str) -> str:
@@ -7,8 +8,8 @@ def hash_password(plain_password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
 
-def get_user_from_db(username: str, users_collection) -> UserModel | None:
-    user = users_collection.find_one({"username": username})
+async def get_user_from_db(username: str, users_collection) -> UserModel | None:
+    user = await users_collection.find_one({"username": username})
     if not user:
         return None
 
@@ -20,10 +21,19 @@ def get_user_from_db(username: str, users_collection) -> UserModel | None:
         phone=user.get("phone"),
         password_hash=user.get("password_hash"),
         role=user.get("role"),
+        status=user.get("status"),
         display_name=user.get("display_name"),
         subjects=user.get("subjects", []),
         levels=user.get("levels", []),
         gender=user.get("gender"),
         address=user.get("address"),
         bio=user.get("bio")
-    )
\ No newline at end of file
+    )
+
+async def get_user_by_id(user_id: str, users_collection) -> UserModel | None:
+    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    if not user:
+        return None
+
+    user["id"] = str(user.pop("_id"))
+    return UserModel(**user)
@@ -1,11 +1,17 @@
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Security, status, Query, Body
+from fastapi import FastAPI, HTTPException, Security, status, Query, Body, Response
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 import requests
 
 from shared.database import users_collection, bookings_collection, posts_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.idempotency import IdempotencyMiddleware
+from shared.pagination import fetch_page, set_next_cursor
 # from shared.config import EMAIL_SERVICE_URL
 from models import BookingModel, GetBookingModelByPost, AddBookingModel
 from jwt_utils import get_current_user
@@ -20,6 +26,23 @@ app = FastAPI(
     root_path="/api/booking"
 )
 
+# Retried writes with the same Idempotency-Key replay the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/add-booking"})
+
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "booking-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "booking-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
 
 # ==========================
 # UPDATE BOOKING STATUS
@@ -40,7 +63,7 @@ async def update_booking_status(
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid booking id')
 
-    b = bookings_collection.find_one({'_id': bid})
+    b = await bookings_collection.find_one({'_id': bid})
     if not b:
         raise HTTPException(status_code=404, detail='Booking not found')
 
@@ -54,8 +77,8 @@ async def update_booking_status(
         raise HTTPException(status_code=400, detail='contract_status is required')
 
     # set updated_at
-    bookings_collection.update_one({'_id': bid}, {'$set': {'contract_status': new_status, 'updated_at': datetime.now(VN_TZ)}})
-    updated = bookings_collection.find_one({'_id': bid})
+    await bookings_collection.update_one({'_id': bid}, {'$set': {'contract_status': new_status, 'updated_at': datetime.now(VN_TZ)}})
+    updated = await bookings_collection.find_one({'_id': bid})
 
     return BookingModel(
         id=str(updated["_id"]),
@@ -79,10 +102,12 @@ async def update_booking_status(
     response_model=List[BookingModel]
 )
 async def get_me_bookings(
+    response: Response,
     token: str = Security(oauth2_scheme),
     scope: Optional[str] = Query("tutor", description="Select 'tutor' or 'parent'"),
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1)
+    limit: int = Query(10, ge=1),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page (thay cho skip)."),
 ):
     current_user = await get_current_user(token, users_collection)
     user_id = str(current_user.id)
@@ -91,8 +116,8 @@ async def get_me_bookings(
         raise HTTPException(status_code=400, detail="scope phải là 'tutor' hoặc 'parent'")  
 
     query = {f"{scope}_id": ObjectId(user_id)}
-    cursor = bookings_collection.find(query).skip(skip).limit(limit)
-    booking_list = list(cursor)
+    booking_list, next_cursor = await fetch_page(bookings_collection, query, limit, cursor=cursor, skip=skip)
+    set_next_cursor(response, next_cursor)
 
     if not booking_list:
         raise HTTPException(status_code=404, detail="No bookings found")
@@ -129,7 +154,7 @@ async def get_bookings_by_post(
     if not input_data or not input_data.post_id:
         raise HTTPException(status_code=400, detail="post_id is required")
     
-    post = posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
+    post = await posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
@@ -137,7 +162,7 @@ async def get_bookings_by_post(
         raise HTTPException(status_code=403, detail="You are not allowed to view bookings for this post")
 
     cursor = bookings_collection.find({"post_id": ObjectId(input_data.post_id)})
-    booking_list = list(cursor)
+    booking_list = await cursor.to_list(length=None)
 
     if not booking_list:
         raise HTTPException(status_code=404, detail="No bookings found for this post_id")
@@ -173,13 +198,12 @@ async def add_booking(
     current_user_id = str(current_user.id)
 
     # Lấy bài post
-    post = posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
+    post = await posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
     # Kiểm tra quyền tạo booking: chỉ owner của post hoặc admin được phép
-    db_user = users_collection.find_one({"_id": ObjectId(current_user_id)})
-    is_admin = db_user and db_user.get("role") == "admin"
+    is_admin = current_user.role == "admin"
     post_creator_id = str(post["creator_id"])
     if post_creator_id != current_user_id and not is_admin:
         raise HTTPException(status_code=403, detail="Not allowed to add booking to this post")
@@ -202,8 +226,8 @@ async def add_booking(
         "updated_at": datetime.now(VN_TZ),
     }
 
-    saved = bookings_collection.insert_one(booking_data)
-    new_booking = bookings_collection.find_one({"_id": saved.inserted_id})
+    saved = await bookings_collection.insert_one(booking_data)
+    new_booking = await bookings_collection.find_one({"_id": saved.inserted_id})
 
     # try:
     #     # Lấy thông tin tutor (người nhận email)
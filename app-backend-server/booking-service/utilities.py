@@ -7,8 +7,8 @@ def hash_password(plain_password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
 
-def get_user_from_db(username: str, users_collection) -> UserModel | None:
-    user = users_collection.find_one({"username": username})
+async def get_user_from_db(username: str, users_collection) -> UserModel | None:
+    user = await users_collection.find_one({"username": username})
     if not user:
         return None
 
@@ -1,8 +1,35 @@
-from fastapi import FastAPI, HTTPException, Body
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Body, Security
 from fastapi.responses import JSONResponse
-from shared.database import users_collection
-from send_email import send_booking_email, send_parent_notify_email
-from models import TransactionEmailRequest, ParentNotifyEmailRequest
+from fastapi.concurrency import run_in_threadpool
+from bson import ObjectId
+from shared.database import users_collection, email_outbox_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.outbox import BOOKING_EMAIL, PARENT_NOTIFY_EMAIL, outbox_status, requeue
+from shared.config import EMAIL_OUTBOX_CONCURRENCY, EMAIL_OUTBOX_POLL_INTERVAL_SECONDS, EMAIL_BATCH_MAX_MESSAGES
+from shared.logger import get_logger
+from shared.auth import Principal, get_current_principal, oauth2_scheme
+from send_email import (
+    send_booking_email,
+    send_parent_notify_email,
+    send_emails,
+    render_booking_email,
+    render_parent_notify_email,
+    precompile_templates,
+    gmail_client,
+    GMAIL_BATCH_SIZE,
+)
+from models import (
+    TransactionEmailRequest,
+    ParentNotifyEmailRequest,
+    SendBatchRequest,
+    SendBatchResponse,
+    BatchEmailResult,
+)
+from outbox_worker import OutboxWorker, PermanentEmailError
 
 app = FastAPI(
     title="Email Service",
@@ -11,19 +38,54 @@ app = FastAPI(
     root_path="/api/email"
 )
 
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "email-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "email-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+logger = get_logger("email-service")
+
+# Templates/icon compiled once; Gmail credentials + sender identity loaded once
+@app.on_event("startup")
+async def startup_email_client():
+    precompile_templates()
+    try:
+        await run_in_threadpool(gmail_client.warm_up)
+    except Exception as e:
+        # no token.json yet: the first send retries lazily
+        logger.warning("Gmail client not ready at startup: %s", e)
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
-@app.post("/send-email")
-def send_booking_email_api(input: TransactionEmailRequest = Body(...)) -> dict:
+
+# Outbox + direct send routes: reachable through the gateway, so admin token only
+# (the services themselves go through the outbox, not HTTP)
+async def require_admin(token: str = Security(oauth2_scheme)) -> Principal:
+    principal = await get_current_principal(token, users_collection)
+    if principal.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return principal
+
+
+# ============================================
+# DELIVERY (shared by the HTTP endpoints and the outbox worker)
+# ============================================
+async def deliver_booking_email(input: TransactionEmailRequest) -> None:
     # 1. Kiểm tra applicant có tồn tại trong DB
-    user_data = users_collection.find_one({"email": input.applicant_email})
+    user_data = await users_collection.find_one({"email": input.applicant_email})
     if not user_data:
-        raise HTTPException(
-            status_code=404,
-            detail="Applicant email not found in users_collection"
-        )
+        raise PermanentEmailError("Applicant email not found in users_collection")
 
     # Tên applicant ưu tiên từ DB
     applicant_name = (
@@ -32,8 +94,9 @@ def send_booking_email_api(input: TransactionEmailRequest = Body(...)) -> dict:
         or "Applicant"
     )
 
-    # 2. Khởi tạo và gửi email
-    success = send_booking_email(
+    # 2. Khởi tạo và gửi email (Gmail client is blocking -> threadpool)
+    success = await run_in_threadpool(
+        send_booking_email,
         applicant_email=input.applicant_email,
         applicant_name=applicant_name,
         parent_name=input.parent_name or "",
@@ -43,33 +106,217 @@ def send_booking_email_api(input: TransactionEmailRequest = Body(...)) -> dict:
         content=input.content
     )
 
-    # 3. Trả kết quả
-    if success:
-        return JSONResponse(
-            content={"message": f"Booking email sent to {input.applicant_email}"},
-            status_code=200
-        )
-    else:
-        raise HTTPException(
-            status_code=500,
-            detail="Failed to send booking email"
-        )
+    if not success:
+        raise RuntimeError("Failed to send booking email")
+
 
+async def deliver_parent_notify_email(input: ParentNotifyEmailRequest) -> None:
+    user_data = await users_collection.find_one({"email": input.parent_email})
+    if not user_data:
+        raise PermanentEmailError("Parent email not found in users_collection")
 
+    parent_name = user_data.get("display_name") or input.parent_name or "Parent"
 
+    success = await run_in_threadpool(send_parent_notify_email, input.parent_email, parent_name, input.post_title)
+    if not success:
+        raise RuntimeError("Failed to send parent notification")
 
 
-@app.post("/send-parent-notify")
-def send_parent_notify_api(input: ParentNotifyEmailRequest = Body(...)) -> dict:
-    user_data = users_collection.find_one({"email": input.parent_email})
-    if not user_data:
-        raise HTTPException(status_code=404, detail="Parent email not found in users_collection")
+# ============================================
+# OUTBOX WORKER (drains shared/outbox.py)
+# ============================================
+async def handle_booking_email(payload: dict) -> None:
+    await deliver_booking_email(TransactionEmailRequest(**payload))
 
-    parent_name = user_data.get("display_name") or input.parent_name or "Parent"
+async def handle_parent_notify_email(payload: dict) -> None:
+    await deliver_parent_notify_email(ParentNotifyEmailRequest(**payload))
+
+# claimed messages go out together, as one Gmail batch request (deliver_batch)
+async def handle_outbox_batch(messages: List[dict]) -> List[Optional[Exception]]:
+    results = await deliver_batch([(m.get("kind"), m.get("payload") or {}) for m in messages])
+    errors = []
+    for result in results:
+        if result.status == "sent":
+            errors.append(None)
+        elif result.status in ("invalid", "not_found"):
+            errors.append(PermanentEmailError(result.detail))
+        else:
+            errors.append(RuntimeError(result.detail or "Failed to send email"))
+    return errors
+
+outbox_worker = OutboxWorker(
+    handlers={
+        BOOKING_EMAIL: handle_booking_email,
+        PARENT_NOTIFY_EMAIL: handle_parent_notify_email,
+    },
+    concurrency=EMAIL_OUTBOX_CONCURRENCY,
+    poll_interval=EMAIL_OUTBOX_POLL_INTERVAL_SECONDS,
+    batch_handler=handle_outbox_batch,
+    batch_size=GMAIL_BATCH_SIZE,
+)
+
+@app.on_event("startup")
+async def startup_outbox_worker():
+    if EMAIL_OUTBOX_CONCURRENCY > 0:
+        outbox_worker.start()
+
+@app.on_event("shutdown")
+async def shutdown_outbox_worker():
+    await outbox_worker.stop()
+
+
+@app.get("/outbox/status", dependencies=[Security(require_admin)])
+async def get_outbox_status() -> dict:
+    return await outbox_status()
+
+
+@app.get("/outbox/{message_id}", dependencies=[Security(require_admin)])
+async def get_outbox_message(message_id: str) -> dict:
+    try:
+        message = await email_outbox_collection.find_one({"_id": ObjectId(message_id)})
+    except Exception:
+        message = None
+    if not message:
+        raise HTTPException(status_code=404, detail="Outbox message not found")
+
+    message["id"] = str(message.pop("_id"))
+    return message
+
+
+@app.post("/outbox/{message_id}/retry", dependencies=[Security(require_admin)])
+async def retry_outbox_message(message_id: str) -> dict:
+    """Requeue a dead-lettered message."""
+    try:
+        requeued = await requeue(message_id)
+    except Exception:
+        requeued = False
+    if not requeued:
+        raise HTTPException(status_code=404, detail="No dead-lettered message with this id")
+    return {"message": "Message requeued", "id": message_id}
+
+
+# ============================================
+# SYNCHRONOUS SEND (direct calls, bypassing the outbox)
+# ============================================
+@app.post("/send-email", dependencies=[Security(require_admin)])
+async def send_booking_email_api(input: TransactionEmailRequest = Body(...)) -> dict:
+    try:
+        await deliver_booking_email(input)
+    except PermanentEmailError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return JSONResponse(
+        content={"message": f"Booking email sent to {input.applicant_email}"},
+        status_code=200
+    )
+
+
+@app.post("/send-parent-notify", dependencies=[Security(require_admin)])
+async def send_parent_notify_api(input: ParentNotifyEmailRequest = Body(...)) -> dict:
+    try:
+        await deliver_parent_notify_email(input)
+    except PermanentEmailError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return JSONResponse(content={"message": f"Parent notification sent to {input.parent_email}"}, status_code=200)
+
+
+# ============================================
+# BATCH SEND
+# ============================================
+def render_batch(items: list) -> list:
+    """items: (kind, request, display_name) -> [(recipient, subject, html)]"""
+    rendered = []
+    for kind, req, display_name in items:
+        if kind == BOOKING_EMAIL:
+            subject, html = render_booking_email(
+                display_name or req.applicant_name or "Applicant",
+                req.parent_name or "",
+                req.post_title or "",
+                req.poster_email or "",
+                req.poster_phone or "",
+                req.content,
+            )
+            rendered.append((req.applicant_email, subject, html))
+        else:
+            subject, html = render_parent_notify_email(
+                display_name or req.parent_name or "Parent", req.post_title
+            )
+            rendered.append((req.parent_email, subject, html))
+    return rendered
+
+
+async def deliver_batch(messages: List[Tuple[str, dict]]) -> List[BatchEmailResult]:
+    """Deliver (kind, payload) messages together; one result per message, in order.
+
+    Recipients are resolved with a single `$in` query, templates are rendered
+    in bulk and messages go out through Gmail batch requests. One bad message
+    never fails the others.
+    """
+    results = [None] * len(messages)
+
+    # 1. Validate payloads
+    parsed = []  # (index, kind, request, recipient)
+    for index, (kind, payload) in enumerate(messages):
+        try:
+            if kind == BOOKING_EMAIL:
+                req = TransactionEmailRequest(**payload)
+                recipient = req.applicant_email
+            elif kind == PARENT_NOTIFY_EMAIL:
+                req = ParentNotifyEmailRequest(**payload)
+                recipient = req.parent_email
+            else:
+                raise ValueError(f"Unknown message kind: {kind}")
+        except Exception as e:
+            results[index] = BatchEmailResult(index=index, status="invalid", detail=str(e))
+            continue
+        parsed.append((index, kind, req, recipient))
+
+    # 2. Resolve every recipient with one query
+    emails = list({recipient for _, _, _, recipient in parsed})
+    users = {}
+    if emails:
+        async for user in users_collection.find({"email": {"$in": emails}}, {"email": 1, "display_name": 1}):
+            users[user["email"]] = user
+
+    to_send = []  # (index, kind, request, display_name)
+    for index, kind, req, recipient in parsed:
+        user = users.get(recipient)
+        if user is None:
+            results[index] = BatchEmailResult(
+                index=index, recipient=recipient, status="not_found",
+                detail="Recipient email not found in users_collection",
+            )
+            continue
+        to_send.append((index, kind, req, user.get("display_name")))
+
+    # 3. Render + send in bulk (Gmail client is blocking -> threadpool)
+    if to_send:
+        rendered = await run_in_threadpool(render_batch, [item[1:] for item in to_send])
+        try:
+            errors = await run_in_threadpool(send_emails, rendered)
+        except Exception as e:
+            errors = [str(e)] * len(rendered)
+
+        for (index, _, _, _), (recipient, _, _), error in zip(to_send, rendered, errors):
+            results[index] = BatchEmailResult(
+                index=index, recipient=recipient,
+                status="failed" if error else "sent", detail=error,
+            )
+    return results
+
+
+@app.post("/send-batch", response_model=SendBatchResponse, dependencies=[Security(require_admin)])
+async def send_batch_api(input: SendBatchRequest = Body(...)) -> SendBatchResponse:
+    """Send many booking / parent-notify emails in one call (see deliver_batch)."""
+    if len(input.messages) > EMAIL_BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"Too many messages (max {EMAIL_BATCH_MAX_MESSAGES})")
 
-    success = send_parent_notify_email(input.parent_email, parent_name, input.post_title)
+    results = await deliver_batch([(message.kind, message.payload) for message in input.messages])
+    sent = sum(1 for r in results if r.status == "sent")
+    return SendBatchResponse(sent=sent, failed=len(results) - sent, results=results)
 
-    if success:
-        return JSONResponse(content={"message": f"Parent notification sent to {input.parent_email}"}, status_code=200)
-    else:
-        raise HTTPException(status_code=500, detail="Failed to send parent notification")
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 
 
 class TransactionEmailRequest(BaseModel):
@@ -23,4 +23,28 @@ class TransactionEmailRequest(BaseModel):
 class ParentNotifyEmailRequest(BaseModel):
     parent_email: str = Field(..., description="Email of the post owner / parent")
     parent_name: Optional[str] = Field(None, description="Parent full name")
-    post_title: str = Field(..., description="Title of the post")
\ No newline at end of file
+    post_title: str = Field(..., description="Title of the post")
+
+# ==========================
+# BATCH
+# ==========================
+class BatchEmailMessage(BaseModel):
+    kind: Literal["booking_email", "parent_notify_email"] = Field(..., description="Template to use")
+    payload: Dict[str, Any] = Field(..., description="TransactionEmailRequest / ParentNotifyEmailRequest fields")
+
+
+class SendBatchRequest(BaseModel):
+    messages: List[BatchEmailMessage]
+
+
+class BatchEmailResult(BaseModel):
+    index: int
+    recipient: Optional[str] = None
+    status: Literal["sent", "failed", "not_found", "invalid"]
+    detail: Optional[str] = None
+
+
+class SendBatchResponse(BaseModel):
+    sent: int
+    failed: int
+    results: List[BatchEmailResult]
@@ -0,0 +1,138 @@
+# outbox_worker.py
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from prometheus_client import Counter
+
+from shared.logger import get_logger
+from shared.outbox import claim_next, claim_batch, mark_sent, mark_failed, DEAD, SENT
+from shared.tracing import SpanKind, extract_context, start_span
+
+logger = get_logger("email-outbox")
+
+LEASE_LOST = "lease_lost"
+
+OUTBOX_PROCESSED = Counter(
+    "email_outbox_processed_total", "Outbox messages processed, by outcome", ["kind", "result"]
+)
+
+
+class PermanentEmailError(Exception):
+    """Delivery can never succeed (e.g. unknown recipient): dead-letter at once."""
+
+
+class OutboxWorker:
+    """Drains shared.outbox with `concurrency` consumers per process.
+
+    Claims are atomic leases in Mongo, so several workers / replicas can run
+    side by side. A consumer sleeps `poll_interval` when nothing is due.
+
+    With a `batch_handler`, a consumer claims up to `batch_size` due messages
+    at once and hands them over together (email-service sends them as one
+    Gmail batch request); it returns one error (or None) per message.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[dict], Awaitable[None]]],
+        concurrency: int,
+        poll_interval: float,
+        batch_handler: Optional[Callable[[List[dict]], Awaitable[List[Optional[Exception]]]]] = None,
+        batch_size: int = 1,
+    ):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.batch_handler = batch_handler
+        self.batch_size = batch_size
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self):
+        while True:
+            try:
+                if self.batch_handler is not None:
+                    messages = await claim_batch(self.batch_size)
+                else:
+                    message = await claim_next()
+                    messages = [message] if message else []
+            except Exception as e:
+                logger.error("Outbox claim failed: %s", e)
+                messages = []
+
+            if not messages:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if self.batch_handler is not None:
+                await self.process_batch(messages)
+            else:
+                await self.process(messages[0])
+
+    async def process_batch(self, messages: List[dict]):
+        with start_span("outbox.process_batch", {"outbox.batch_size": len(messages)}, kind=SpanKind.CONSUMER):
+            try:
+                errors = await self.batch_handler(messages)
+            except Exception as e:
+                errors = [e] * len(messages)
+        for message, error in zip(messages, errors):
+            # one span per message, child of the request that enqueued it
+            with start_span(
+                f"outbox.process {message.get('kind')}",
+                {"outbox.message_id": str(message["_id"]), "outbox.attempts": message.get("attempts", 0)},
+                kind=SpanKind.CONSUMER,
+                context=extract_context(message.get("trace_context")),
+            ):
+                await self._finish(message, error)
+
+    async def process(self, message: dict):
+        # child of the request that enqueued the message (see shared.outbox.enqueue_email)
+        with start_span(
+            f"outbox.process {message.get('kind')}",
+            {"outbox.message_id": str(message["_id"]), "outbox.attempts": message.get("attempts", 0)},
+            kind=SpanKind.CONSUMER,
+            context=extract_context(message.get("trace_context")),
+        ):
+            await self._process(message)
+
+    async def _process(self, message: dict):
+        handler = self.handlers.get(message.get("kind"))
+        error = None
+        try:
+            if handler is None:
+                raise PermanentEmailError(f"Unknown message kind: {message.get('kind')}")
+            await handler(message.get("payload") or {})
+        except Exception as e:
+            error = e
+        await self._finish(message, error)
+
+    async def _finish(self, message: dict, error: Optional[Exception]):
+        if error is None:
+            self._record(message, SENT if await mark_sent(message) else None)
+        elif isinstance(error, PermanentEmailError):
+            new_status = await mark_failed(message, str(error), permanent=True)
+            self._record(message, new_status)
+            if new_status:
+                logger.warning("Outbox message %s dead-lettered: %s", message["_id"], error)
+        else:
+            new_status = await mark_failed(message, str(error) or error.__class__.__name__)
+            self._record(message, new_status)
+            if new_status:
+                log = logger.warning if new_status == DEAD else logger.info
+                log("Outbox message %s failed (attempt %s, now %s): %s",
+                    message["_id"], message.get("attempts"), new_status, error)
+
+    def _record(self, message: dict, new_status):
+        if new_status is None:
+            # the lease expired mid-send and another worker re-claimed the message
+            new_status = LEASE_LOST
+            logger.warning("Outbox message %s: lease lost, result not recorded", message["_id"])
+        OUTBOX_PROCESSED.labels(message.get("kind") or "-", new_status).inc()
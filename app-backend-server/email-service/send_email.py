@@ -1,14 +1,21 @@
 # send_email.py
 import base64
+import os
+import re
+import threading
+import time
+from typing import List, Optional, Tuple
 from email.message import EmailMessage
 from email.utils import formataddr
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from prometheus_client import Counter, Histogram
+
+from shared.tracing import SpanKind, start_span
 from datetime import datetime
 from zoneinfo import ZoneInfo
-import os
 
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
@@ -18,66 +25,220 @@ SCOPES = [
 
 VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
 
+BASE_DIR = os.path.dirname(__file__)
+TOKEN_FILE = "token.json"
+SENDER_NAME = "Booking Service"
+# Gmail accepts up to 100 calls per batch request but recommends <= 50
+GMAIL_BATCH_SIZE = 50
 
-def load_template_with_icon(template_file: str, icon_file: str, context: dict = None):
-    """Load HTML template và nhúng icon Base64"""
-    with open(template_file, "r", encoding="utf-8") as f:
-        template = f.read()
+# ============================================
+# METRICS (exported on /metrics, see shared/metrics.py)
+# ============================================
+# one observation per Gmail HTTP call: a single send, or one batch of <= GMAIL_BATCH_SIZE
+EMAIL_SEND_DURATION = Histogram(
+    "email_send_duration_seconds",
+    "Gmail API send latency",
+    ["mode"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+EMAIL_MESSAGES = Counter("email_messages_total", "Emails handed to Gmail", ["result"])
+EMAIL_SEND_FAILURES = Counter("email_send_failures_total", "Failed Gmail sends", ["mode", "error"])
 
-    if context:
-        for key, value in context.items():
-            template = template.replace(f"{{{{{key}}}}}", str(value))
 
-    # Encode icon
-    with open(icon_file, "rb") as f:
-        encoded_icon = base64.b64encode(f.read()).decode()
+# ============================================
+# TEMPLATES (loaded + compiled once)
+# ============================================
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
 
-    template = template.replace("{{icon_base64}}", encoded_icon)
-    return template
 
+class CompiledTemplate:
+    """HTML template split once into literal chunks and `{{name}}` slots.
 
-def load_template(template_file: str, context: dict = None):
-    """Load an HTML template and replace placeholders without an icon"""
-    with open(template_file, "r", encoding="utf-8") as f:
-        template = f.read()
+    `static` values (e.g. the base64 icon) are baked in at compile time;
+    unknown placeholders are left as-is, like the old str.replace renderer.
+    """
 
-    if context:
-        for key, value in context.items():
-            template = template.replace(f"{{{{{key}}}}}", str(value))
+    def __init__(self, source: str, static: dict = None):
+        static = static or {}
+        self._parts = []  # (literal, placeholder or None)
+        pos = 0
+        literal = ""
+        for match in _PLACEHOLDER_RE.finditer(source):
+            literal += source[pos:match.start()]
+            name = match.group(1)
+            if name in static:
+                literal += str(static[name])
+            else:
+                self._parts.append((literal, name))
+                literal = ""
+            pos = match.end()
+        self._tail = literal + source[pos:]
 
-    return template
+    def render(self, context: dict = None) -> str:
+        context = context or {}
+        out = []
+        for literal, name in self._parts:
+            out.append(literal)
+            out.append(str(context[name]) if name in context else "{{%s}}" % name)
+        out.append(self._tail)
+        return "".join(out)
 
 
-def send_email_v1(recipient: str, subject: str, html_content: str):
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            with open("token.json", "w") as token:
-                token.write(creds.to_json())
-        else:
-            raise Exception("No valid credentials. Tạo token.json bên ngoài Docker.")
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _read_base64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def precompile_templates() -> dict:
+    """Load every template/asset from disk once (called at startup)."""
+    with _templates_lock:
+        if not _templates:
+            templates_dir = os.path.join(BASE_DIR, "templates")
+            icon_base64 = _read_base64(os.path.join(BASE_DIR, "assets", "booking-icon.png"))
+            _templates["booking"] = CompiledTemplate(
+                _read_text(os.path.join(templates_dir, "booking_template.html")),
+                static={"icon_base64": icon_base64},
+            )
+            _templates["parent_notify"] = CompiledTemplate(
+                _read_text(os.path.join(templates_dir, "parent_notify_template.html")),
+            )
+    return _templates
+
+
+def render_template(name: str, context: dict = None) -> str:
+    with start_span(f"email.render {name}"):
+        return (_templates or precompile_templates())[name].render(context)
+
+
+# ============================================
+# GMAIL CLIENT (long-lived, refresh-aware)
+# ============================================
+class GmailClient:
+    """Credentials and sender address are loaded once per process.
+
+    googleapiclient service objects are not thread-safe (httplib2), and the
+    send functions run in the threadpool, so each thread builds its own
+    service once and reuses it. Expired credentials are refreshed under a
+    lock and written back to token.json.
+    """
+
+    def __init__(self, token_file: str = TOKEN_FILE):
+        self.token_file = token_file
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._creds = None
+        self._sender = None
+
+    def credentials(self) -> Credentials:
+        with self._lock:
+            creds = self._creds
+            if creds is None and os.path.exists(self.token_file):
+                creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                    with open(self.token_file, "w") as token:
+                        token.write(creds.to_json())
+                else:
+                    raise Exception("No valid credentials. Tạo token.json bên ngoài Docker.")
+
+            self._creds = creds
+            return creds
+
+    def service(self):
+        creds = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None or getattr(self._local, "creds", None) is not creds:
+            service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+            self._local.service = service
+            self._local.creds = creds
+        return service
+
+    def sender(self) -> str:
+        if self._sender is None:
+            profile = self.service().users().getProfile(userId="me").execute()
+            self._sender = profile["emailAddress"]
+        return self._sender
+
+    def warm_up(self) -> None:
+        self.sender()
+
+    def send(self, raw: str) -> None:
+        start = time.perf_counter()
+        try:
+            with start_span("gmail.send", kind=SpanKind.CLIENT):
+                self.service().users().messages().send(userId="me", body={"raw": raw}).execute()
+        except Exception as e:
+            EMAIL_SEND_FAILURES.labels("single", e.__class__.__name__).inc()
+            EMAIL_MESSAGES.labels("failed").inc()
+            raise
+        finally:
+            EMAIL_SEND_DURATION.labels("single").observe(time.perf_counter() - start)
+        EMAIL_MESSAGES.labels("sent").inc()
+
+    def send_batch(self, raws: List[str]) -> List[Optional[str]]:
+        """Send many messages with Gmail batch requests (one HTTP round trip
+        per GMAIL_BATCH_SIZE). Returns one error string (or None) per message."""
+        service = self.service()
+        errors: List[Optional[str]] = [None] * len(raws)
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                errors[int(request_id)] = str(exception)
+                EMAIL_SEND_FAILURES.labels("batch", exception.__class__.__name__).inc()
+
+        for start in range(0, len(raws), GMAIL_BATCH_SIZE):
+            chunk = range(start, min(start + GMAIL_BATCH_SIZE, len(raws)))
+            batch = service.new_batch_http_request(callback=on_response)
+            for i in chunk:
+                batch.add(
+                    service.users().messages().send(userId="me", body={"raw": raws[i]}),
+                    request_id=str(i),
+                )
+            started = time.perf_counter()
+            try:
+                with start_span("gmail.send_batch", {"email.batch_size": len(chunk)}, kind=SpanKind.CLIENT):
+                    batch.execute()
+            except Exception as e:
+                EMAIL_SEND_FAILURES.labels("batch", e.__class__.__name__).inc()
+                for i in chunk:
+                    errors[i] = errors[i] or str(e)
+            EMAIL_SEND_DURATION.labels("batch").observe(time.perf_counter() - started)
+            failed = sum(1 for i in chunk if errors[i])
+            EMAIL_MESSAGES.labels("sent").inc(len(chunk) - failed)
+            EMAIL_MESSAGES.labels("failed").inc(failed)
+        return errors
+
+
+gmail_client = GmailClient()
 
+
+def build_message(recipient: str, subject: str, html_content: str, sender: str) -> str:
+    message = EmailMessage()
+    message["Subject"] = subject
+    message["To"] = recipient
+    message["From"] = formataddr((SENDER_NAME, sender))
+
+    message.set_content("Nếu bạn không xem được HTML, đây là nội dung fallback.")
+    message.add_alternative(html_content, subtype="html")
+
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+
+def send_email_v1(recipient: str, subject: str, html_content: str):
     try:
-        service = build("gmail", "v1", credentials=creds)
-
-        message = EmailMessage()
-        message["Subject"] = subject
-        message["To"] = recipient
-        message["From"] = formataddr((
-            "Booking Service",
-            service.users().getProfile(userId="me").execute()["emailAddress"],
-        ))
-
-        message.set_content("Nếu bạn không xem được HTML, đây là nội dung fallback.")
-        message.add_alternative(html_content, subtype="html")
-
-        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        create_message = {"raw": encoded_message}
-        service.users().messages().send(userId="me", body=create_message).execute()
+        raw = build_message(recipient, subject, html_content, gmail_client.sender())
+        gmail_client.send(raw)
         return True
 
     except HttpError as e:
@@ -85,22 +246,30 @@ def send_email_v1(recipient: str, subject: str, html_content: str):
         return False
 
 
-def send_booking_email(
-    applicant_email: str,
+def send_emails(messages: List[Tuple[str, str, str]]) -> List[Optional[str]]:
+    """Send (recipient, subject, html) tuples in Gmail batches; returns one
+    error string (or None on success) per message, in order."""
+    if not messages:
+        return []
+    sender = gmail_client.sender()
+    raws = [build_message(recipient, subject, html, sender) for recipient, subject, html in messages]
+    return gmail_client.send_batch(raws)
+
+
+# ============================================
+# EMAILS (subject + rendered HTML)
+# ============================================
+def render_booking_email(
     applicant_name: str,
     parent_name: str,
     post_title: str,
     poster_email: str,
     poster_phone: str,
     content: str,
-):
-    template_file = os.path.join(os.path.dirname(__file__), "templates", "booking_template.html")
-    icon_file = os.path.join(os.path.dirname(__file__), "assets", "booking-icon.png")
-
-    html_content = load_template_with_icon(
-        template_file,
-        icon_file,
-        context={
+) -> Tuple[str, str]:
+    html_content = render_template(
+        "booking",
+        {
             "applicant_name": applicant_name,
             "parent_name": parent_name,
             "post_title": post_title,
@@ -109,17 +278,32 @@ def send_booking_email(
             "content": content,
         },
     )
+    return "Booking Confirmation", html_content
 
-    return send_email_v1(applicant_email, "Booking Confirmation", html_content)
 
+def render_parent_notify_email(parent_name: str, post_title: str) -> Tuple[str, str]:
+    html_content = render_template("parent_notify", {
+        "parent_name": parent_name,
+        "post_title": post_title,
+    })
+    return "Your post has a tutor", html_content
 
 
+def send_booking_email(
+    applicant_email: str,
+    applicant_name: str,
+    parent_name: str,
+    post_title: str,
+    poster_email: str,
+    poster_phone: str,
+    content: str,
+):
+    subject, html_content = render_booking_email(
+        applicant_name, parent_name, post_title, poster_email, poster_phone, content
+    )
+    return send_email_v1(applicant_email, subject, html_content)
 
 
 def send_parent_notify_email(recipient: str, parent_name: str, post_title: str):
-    template_file = os.path.join(os.path.dirname(__file__), "templates", "parent_notify_template.html")
-    html_content = load_template(template_file, context={
-        "parent_name": parent_name,
-        "post_title": post_title,
-    })
-    return send_email_v1(recipient, "Your post has a tutor", html_content)
+    subject, html_content = render_parent_notify_email(parent_name, post_title)
+    return send_email_v1(recipient, subject, html_content)
@@ -1,12 +1,22 @@
+import asyncio
 from typing import List, Optional, Literal
-from fastapi import FastAPI, HTTPException, Security, status, Query, Body
+from fastapi import FastAPI, HTTPException, Security, status, Query, Body, Response, Request
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from bson import ObjectId
 from datetime import datetime
 
 from shared.database import posts_collection, users_collection
-from models import PostModel, AddPostModel, DelPostModel
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.idempotency import IdempotencyMiddleware
+from shared.pagination import fetch_page, set_next_cursor
+from shared.post_search import build_search_fields, build_search_query, facet_counts, ensure_post_search_fields
+from shared.response_cache import response_cache, cached_response, invalidate_tags, POSTS_TAG, post_tag, post_tags
+from shared.config import CACHE_TTL_POST_DETAIL, CACHE_TTL_POST_LIST
+from models import PostModel, AddPostModel, DelPostModel, PostSearchResultModel
 from jwt_utils import get_current_user
 
 app = FastAPI(
@@ -16,6 +26,37 @@ app = FastAPI(
     root_path="/api/post"
 )
 
+# Retried writes with the same Idempotency-Key replay the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/add-post"})
+
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "post-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "post-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+# SEARCH FIELDS (backfill posts created before shared/post_search.py)
+@app.on_event("startup")
+async def startup_ensure_post_search_fields():
+    await ensure_post_search_fields()
+
+# RESPONSE CACHE (Redis invalidation listener when RESPONSE_CACHE_REDIS_URL is set)
+@app.on_event("startup")
+async def startup_response_cache():
+    await response_cache.startup()
+
+@app.on_event("shutdown")
+async def shutdown_response_cache():
+    await response_cache.shutdown()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
@@ -23,6 +64,22 @@ class UpdatePostStatusModel(BaseModel):
     id: str
     post_status: Literal["active", "inactive"]
 
+
+async def scope_query(scope: str, token: str) -> dict:
+    if scope == "me":
+        # Lấy cả active + inactive của user
+        current_user = await get_current_user(token, users_collection)
+        return {"creator_id": ObjectId(current_user.id)}
+
+    # scope == "all": chỉ lấy bài inactive (bài chưa được thanh toán/kích hoạt)
+    return {"post_status": "inactive"}
+
+
+def to_post_model(p: dict) -> PostModel:
+    p["id"] = str(p["_id"])
+    p["creator_id"] = str(p["creator_id"])
+    return PostModel(**p)
+
 @app.get(
     "/get-post",
     response_model=List[PostModel],
@@ -30,60 +87,102 @@ class UpdatePostStatusModel(BaseModel):
     tags=["Post"]
 )
 async def get_posts(
+    request: Request,
+    response: Response,
     token: str = Security(oauth2_scheme),
     scope: str = Query("me", regex="^(me|all)$", description="me: bài của user, all: bài active của tất cả"),
     skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page (thay cho skip)."),
     limit: int = Query(10, ge=1, le=100),
     subject: Optional[List[str]] = Query(None),
     level: Optional[List[str]] = Query(None),
     mode: Optional[List[str]] = Query(None),
+    address: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Từ khoá (không phân biệt dấu / hoa thường)"),
+    salary_min: Optional[float] = Query(None, ge=0),
+    salary_max: Optional[float] = Query(None, ge=0),
+    sessions_min: Optional[int] = Query(None, ge=0),
+    sessions_max: Optional[int] = Query(None, ge=0),
 ):
-    query = {}
-
     # -------------------------
     # 1. Xử lý scope
     # -------------------------
-    if scope == "me":
-        # Lấy cả active + inactive của user
-        current_user = await get_current_user(token, users_collection)
-        query["creator_id"] = ObjectId(current_user.id)
+    query = await scope_query(scope, token)
 
-    elif scope == "all":
-        # Chỉ lấy bài inactive (bài chưa được thanh toán/kích hoạt)
-        query["post_status"] = "inactive"
+    # -------------------------
+    # 2. Filter trên các field search đã chuẩn hoá (có index)
+    # -------------------------
+    query.update(build_search_query(
+        q=q, subject=subject, level=level, mode=mode, address=address,
+        salary_min=salary_min, salary_max=salary_max,
+        sessions_min=sessions_min, sessions_max=sessions_max,
+    ))
 
+    async def load():
+        posts, next_cursor = await fetch_page(posts_collection, query, limit, cursor=cursor, skip=skip)
+        set_next_cursor(response, next_cursor)
 
-    # Case-insensitive regex search for each filter
-    if subject:
-        query["subject"] = {"$regex": subject[0], "$options": "i"} if len(subject) == 1 else {"$in": subject}
-    if level:
-        query["level"] = {"$regex": level[0], "$options": "i"} if len(level) == 1 else {"$in": level}
-    if mode:
-        query["mode"] = {"$regex": mode[0], "$options": "i"} if len(mode) == 1 else {"$in": mode}
+        if not posts:
+            raise HTTPException(status_code=404, detail="No posts found")
 
-    # Address filter (add if needed)
-    address = None
-    try:
-        from fastapi import Request
-        address = Request.query_params.get("address")
-    except Exception:
-        pass
-    if address:
-        query["address"] = {"$regex": address, "$options": "i"}
+        return [to_post_model(p) for p in posts]
 
-    posts_cursor = posts_collection.find(query).skip(skip).limit(limit)
-    posts = list(posts_cursor)
+    if scope == "me":
+        return await load()
 
-    if not posts:
-        raise HTTPException(status_code=404, detail="No posts found")
+    # scope=all giống nhau cho mọi user -> cache (invalidate khi post thay đổi)
+    return await cached_response(request, response, load, ttl=CACHE_TTL_POST_LIST, tags=[POSTS_TAG])
 
-    result = []
-    for p in posts:
-        p["id"] = str(p["_id"])
-        p["creator_id"] = str(p["creator_id"])
-        result.append(PostModel(**p))
 
-    return result
+@app.get(
+    "/search",
+    response_model=PostSearchResultModel,
+    status_code=status.HTTP_200_OK,
+    tags=["Post"],
+    description="Tìm kiếm bài post + facet theo subject/level/mode"
+)
+async def search_posts(
+    response: Response,
+    token: str = Security(oauth2_scheme),
+    scope: str = Query("all", regex="^(me|all)$"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page."),
+    limit: int = Query(10, ge=1, le=100),
+    q: Optional[str] = Query(None, description="Từ khoá (không phân biệt dấu / hoa thường)"),
+    subject: Optional[List[str]] = Query(None),
+    level: Optional[List[str]] = Query(None),
+    mode: Optional[List[str]] = Query(None),
+    address: Optional[str] = Query(None),
+    salary_min: Optional[float] = Query(None, ge=0),
+    salary_max: Optional[float] = Query(None, ge=0),
+    sessions_min: Optional[int] = Query(None, ge=0),
+    sessions_max: Optional[int] = Query(None, ge=0),
+    facets: Optional[bool] = Query(None, description="Trả về total + facet counts. Mặc định: chỉ trang đầu (không có cursor)."),
+):
+    """Same filters as /get-post; returns an empty page instead of 404, plus
+    the total and facet counts of the whole result set (first page only,
+    unless facets=true)."""
+    query = await scope_query(scope, token)
+    query.update(build_search_query(
+        q=q, subject=subject, level=level, mode=mode, address=address,
+        salary_min=salary_min, salary_max=salary_max,
+        sessions_min=sessions_min, sessions_max=sessions_max,
+    ))
+
+    with_facets = facets if facets is not None else cursor is None
+    if with_facets:
+        (posts, next_cursor), counts = await asyncio.gather(
+            fetch_page(posts_collection, query, limit, cursor=cursor),
+            facet_counts(query),
+        )
+    else:
+        (posts, next_cursor), counts = await fetch_page(posts_collection, query, limit, cursor=cursor), {}
+    set_next_cursor(response, next_cursor)
+
+    return PostSearchResultModel(
+        items=[to_post_model(p) for p in posts],
+        total=counts.get("total"),
+        facets=counts.get("facets"),
+    )
 
 @app.post(
     "/add-post",
@@ -100,8 +199,10 @@ async def add_post(
     new_post = input_data.dict()
     new_post["creator_id"] = ObjectId(current_user.id)
     new_post["created_at"] = datetime.utcnow()
+    new_post["search"] = build_search_fields(new_post)
 
-    result = posts_collection.insert_one(new_post)
+    result = await posts_collection.insert_one(new_post)
+    await invalidate_tags(*post_tags(result.inserted_id))
 
     # convert output
     new_post["id"] = str(result.inserted_id)
@@ -121,7 +222,7 @@ async def delete_post(
 ):
     current_user = await get_current_user(token, users_collection)
 
-    post = posts_collection.find_one({"_id": ObjectId(input_data.id)})
+    post = await posts_collection.find_one({"_id": ObjectId(input_data.id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
@@ -132,7 +233,8 @@ async def delete_post(
             detail="You are not allowed to delete this post"
         )
 
-    posts_collection.delete_one({"_id": ObjectId(input_data.id)})
+    await posts_collection.delete_one({"_id": ObjectId(input_data.id)})
+    await invalidate_tags(*post_tags(input_data.id))
 
     return {"message": "Post deleted successfully"}
 
@@ -151,19 +253,12 @@ async def update_post_status(
     """
     current_user = await get_current_user(token, users_collection)
 
-    post = posts_collection.find_one({"_id": ObjectId(input_data.id)})
+    post = await posts_collection.find_one({"_id": ObjectId(input_data.id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # Chỉ creator mới được phép update, nhưng admin cũng được phép
-    try:
-        db_user = users_collection.find_one({"_id": ObjectId(current_user.id)})
-    except Exception:
-        db_user = None
-
-    is_admin = False
-    if db_user:
-        is_admin = db_user.get("role") == "admin"
+    # Chỉ creator mới được phép update, nhưng admin cũng được phép (role từ token)
+    is_admin = current_user.role == "admin"
 
     if str(post["creator_id"]) != current_user.id and not is_admin:
         raise HTTPException(
@@ -171,13 +266,23 @@ async def update_post_status(
             detail="You are not allowed to update this post"
         )
 
-    posts_collection.update_one(
+    await posts_collection.update_one(
         {"_id": ObjectId(input_data.id)},
         {"$set": {"post_status": input_data.post_status}}
     )
+    await invalidate_tags(*post_tags(input_data.id))
 
     return {"message": f"Post status updated to {input_data.post_status}"}
 
+# /api/post/health (before /{post_id}, which would match it)
+@app.get(
+    "/health",
+    tags=["System"],
+    status_code=200
+)
+async def health_check():
+    return {"status": "ok"}
+
 @app.get(
     "/{post_id}",
     response_model=PostModel,
@@ -187,6 +292,8 @@ async def update_post_status(
 )
 async def get_post_detail(
     post_id: str,
+    request: Request,
+    response: Response,
     token: str = Security(oauth2_scheme)
 ):
     """
@@ -206,25 +313,19 @@ async def get_post_detail(
     # Get current user just to verify token is valid
     await get_current_user(token, users_collection)
     
-    post = posts_collection.find_one({"_id": post_obj_id})
-    
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found"
-        )
-    
-    # Convert ObjectId to string
-    post["id"] = str(post["_id"])
-    post["creator_id"] = str(post["creator_id"])
-    
-    return PostModel(**post)
+    async def load():
+        post = await posts_collection.find_one({"_id": post_obj_id})
 
-# /api/post/health
-@app.get(
-    "/health",
-    tags=["System"],
-    status_code=200
-)
-async def health_check():
-    return {"status": "ok"}
+        if not post:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Post not found"
+            )
+
+        # Convert ObjectId to string
+        post["id"] = str(post["_id"])
+        post["creator_id"] = str(post["creator_id"])
+
+        return PostModel(**post)
+
+    return await cached_response(request, response, load, ttl=CACHE_TTL_POST_DETAIL, tags=[post_tag(post_id)])
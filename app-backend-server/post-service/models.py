@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # ==========================
@@ -104,3 +104,17 @@ class AddPostModel(BaseModel):
 
 class DelPostModel(BaseModel):
     id: str
+
+# ==========================
+# SEARCH
+# ==========================
+class FacetBucketModel(BaseModel):
+    key: str            # giá trị đã chuẩn hoá (không dấu, chữ thường)
+    value: str          # giá trị hiển thị
+    count: int
+
+class PostSearchResultModel(BaseModel):
+    items: List[PostModel]
+    # None trên các trang sau (cursor) trừ khi facets=true
+    total: Optional[int] = None
+    facets: Optional[Dict[str, List[FacetBucketModel]]] = None
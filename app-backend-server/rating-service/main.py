@@ -1,15 +1,77 @@
-from fastapi import FastAPI, HTTPException, Security, status, Body
+import asyncio
+from fastapi import FastAPI, HTTPException, Security, status, Body, Request, Response
 from fastapi.security import OAuth2PasswordBearer
 from typing import List
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 from shared.database import ratings_collection, users_collection, bookings_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.locks import acquire_lease
+from shared.idempotency import IdempotencyMiddleware
+from shared.rating_stats import apply_rating_delta, reconcile_rating_summaries
+from shared.config import RATING_RECONCILE_INTERVAL_SECONDS, CACHE_TTL_TUTOR_RATINGS
+from shared.response_cache import response_cache, cached_response, invalidate_tags, tutor_ratings_tag
+from shared.logger import get_logger
 from models import RatingModel, AddRatingModel, UpdateRatingModel, DelRatingModel
 from jwt_utils import get_current_user
 
 app = FastAPI(title="Rating Service", version="1.0.0", root_path="/api/rating")
 
+# Retried writes with the same Idempotency-Key replay the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/add-rating"})
+
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "rating-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "rating-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+# RESPONSE CACHE (Redis invalidation listener when RESPONSE_CACHE_REDIS_URL is set)
+@app.on_event("startup")
+async def startup_response_cache():
+    await response_cache.startup()
+
+@app.on_event("shutdown")
+async def shutdown_response_cache():
+    await response_cache.shutdown()
+
+# Periodic repair of the materialized rating_summaries (0 disables it)
+# Every worker runs the loop; the lease lets only one of them reconcile per interval.
+logger = get_logger("rating-service")
+
+async def reconcile_rating_summaries_forever():
+    while True:
+        try:
+            if await acquire_lease("rating-reconciler", ttl_seconds=RATING_RECONCILE_INTERVAL_SECONDS * 0.9):
+                await reconcile_rating_summaries()
+        except Exception as e:
+            logger.error("Rating summary reconciliation failed: %s", e)
+        await asyncio.sleep(RATING_RECONCILE_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def startup_rating_reconciler():
+    if RATING_RECONCILE_INTERVAL_SECONDS > 0:
+        app.state.rating_reconciler = asyncio.create_task(reconcile_rating_summaries_forever())
+
+@app.on_event("shutdown")
+async def shutdown_rating_reconciler():
+    task = getattr(app.state, "rating_reconciler", None)
+    if task:
+        task.cancel()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
 
@@ -32,7 +94,7 @@ async def add_rating(input_data: AddRatingModel = Body(...), token: str = Securi
 
     # validate tutor exists
     try:
-        tutor_obj = users_collection.find_one({'_id': ObjectId(input_data.tutor_id)})
+        tutor_obj = await users_collection.find_one({'_id': ObjectId(input_data.tutor_id)})
     except Exception:
         tutor_obj = None
     if not tutor_obj:
@@ -41,7 +103,7 @@ async def add_rating(input_data: AddRatingModel = Body(...), token: str = Securi
     # optional: validate booking exists
     if input_data.booking_id:
         try:
-            booking_obj = bookings_collection.find_one({'_id': ObjectId(input_data.booking_id)})
+            booking_obj = await bookings_collection.find_one({'_id': ObjectId(input_data.booking_id)})
         except Exception:
             booking_obj = None
         if not booking_obj:
@@ -56,9 +118,12 @@ async def add_rating(input_data: AddRatingModel = Body(...), token: str = Securi
         'rated_at': datetime.now(timezone.utc)
     }
 
-    result = ratings_collection.insert_one(doc)
-    saved = ratings_collection.find_one({'_id': result.inserted_id})
-    return to_output(saved)
+    result = await ratings_collection.insert_one(doc)
+    await apply_rating_delta(doc['tutor_id'], doc['rating'], 1)
+    await invalidate_tags(tutor_ratings_tag(doc['tutor_id']))
+
+    doc['_id'] = result.inserted_id
+    return to_output(doc)
 
 
 @app.post('/update-rating', response_model=RatingModel)
@@ -67,7 +132,7 @@ async def update_rating(input_data: UpdateRatingModel = Body(...), token: str =
     parent_id = current_user.id
 
     try:
-        rating_doc = ratings_collection.find_one({'_id': ObjectId(input_data.id)})
+        rating_doc = await ratings_collection.find_one({'_id': ObjectId(input_data.id)})
     except Exception:
         rating_doc = None
     if not rating_doc:
@@ -86,9 +151,20 @@ async def update_rating(input_data: UpdateRatingModel = Body(...), token: str =
     if not update_data:
         raise HTTPException(status_code=400, detail='No fields to update')
 
-    ratings_collection.update_one({'_id': ObjectId(input_data.id)}, {'$set': update_data})
-    updated = ratings_collection.find_one({'_id': ObjectId(input_data.id)})
-    return to_output(updated)
+    # Atomically swap and get the previous value -> exact delta for the summary
+    before = await ratings_collection.find_one_and_update(
+        {'_id': ObjectId(input_data.id)},
+        {'$set': update_data},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail='Rating not found')
+
+    if 'rating' in update_data and update_data['rating'] != before.get('rating'):
+        await apply_rating_delta(before['tutor_id'], update_data['rating'] - int(before.get('rating', 0)), 0)
+    await invalidate_tags(tutor_ratings_tag(before['tutor_id']))
+
+    return to_output({**before, **update_data})
 
 
 @app.post('/delete-rating', status_code=status.HTTP_200_OK)
@@ -97,7 +173,7 @@ async def delete_rating(input_data: DelRatingModel = Body(...), token: str = Sec
     parent_id = current_user.id
 
     try:
-        rating_doc = ratings_collection.find_one({'_id': ObjectId(input_data.id)})
+        rating_doc = await ratings_collection.find_one({'_id': ObjectId(input_data.id)})
     except Exception:
         rating_doc = None
     if not rating_doc:
@@ -106,22 +182,28 @@ async def delete_rating(input_data: DelRatingModel = Body(...), token: str = Sec
     if str(rating_doc.get('parent_id')) != parent_id:
         raise HTTPException(status_code=403, detail='Not allowed to delete this rating')
 
-    ratings_collection.delete_one({'_id': ObjectId(input_data.id)})
+    deleted = await ratings_collection.find_one_and_delete({'_id': ObjectId(input_data.id)})
+    if deleted:
+        await apply_rating_delta(deleted['tutor_id'], -int(deleted.get('rating', 0)), -1)
+        await invalidate_tags(tutor_ratings_tag(deleted['tutor_id']))
     return {'message': 'Rating deleted successfully'}
 
 
 @app.get('/tutor/{tutor_id}/ratings', response_model=List[RatingModel])
-async def get_ratings_for_tutor(tutor_id: str, token: str = Security(oauth2_scheme)):
+async def get_ratings_for_tutor(tutor_id: str, request: Request, response: Response, token: str = Security(oauth2_scheme)):
     # token only to ensure requester is authenticated
     _ = await get_current_user(token=token, users_collection=users_collection)
 
     try:
-        cursor = ratings_collection.find({'tutor_id': ObjectId(tutor_id)}).sort('rated_at', -1)
+        tutor_obj_id = ObjectId(tutor_id)
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid tutor id')
 
-    items = [to_output(d) for d in cursor]
-    return items
+    async def load():
+        cursor = ratings_collection.find({'tutor_id': tutor_obj_id}).sort('rated_at', -1)
+        return [RatingModel(**to_output(d)) async for d in cursor]
+
+    return await cached_response(request, response, load, ttl=CACHE_TTL_TUTOR_RATINGS, tags=[tutor_ratings_tag(tutor_id)])
 
 
 @app.get('/health')
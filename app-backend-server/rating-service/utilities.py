@@ -11,14 +11,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode("utf-8")[:72], hashed_password.encode("utf-8"))
 
 
-def get_user_from_db(username: str, users_collection):
+async def get_user_from_db(username: str, users_collection):
     """Return a lightweight user-like object (SimpleNamespace) or None.
 
     Other services return a Pydantic UserModel, but rating-service doesn't
     define that model. Returning a SimpleNamespace provides the `.id`
     attribute that `jwt_utils.get_current_user` and other code expect.
     """
-    user = users_collection.find_one({"username": username})
+    user = await users_collection.find_one({"username": username})
     if not user:
         return None
 
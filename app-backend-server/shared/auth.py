@@ -0,0 +1,177 @@
+# shared/auth.py
+"""
+Stateless JWT principal shared by every service.
+
+Tokens issued by auth-service carry the user id, role and status as signed
+claims, so authenticating a request needs no `users` lookup. Tokens issued
+before these claims existed (only `sub`) fall back to a single DB read.
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt, JWTError
+
+from shared.response_cache import response_cache, invalidate_tags, user_tag
+from shared.config import (
+    JWT_SECRET_KEY,
+    JWT_ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    USER_CACHE_TTL_SECONDS,
+    USER_CACHE_MAXSIZE,
+)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+
+
+# ============================================
+# PRINCIPAL
+# ============================================
+@dataclass(frozen=True)
+class Principal:
+    id: str
+    username: str
+    role: Optional[str] = None
+    status: Optional[str] = None
+
+
+def principal_claims(user) -> dict:
+    """Claims embedded by create_access_token for a user-like object."""
+    return {
+        "sub": user.username,
+        "uid": str(user.id),
+        "role": getattr(user, "role", None),
+        "status": getattr(user, "status", None),
+    }
+
+
+def create_access_token(data: dict, expires_delta=None) -> str:
+    to_encode = data.copy()
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire})
+    return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Token không hợp lệ",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+async def get_current_principal(token: str, users_collection=None) -> Principal:
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+
+    username = payload.get("sub")
+    if not username:
+        raise _credentials_exception()
+
+    if payload.get("uid"):
+        return Principal(
+            id=payload["uid"],
+            username=username,
+            role=payload.get("role"),
+            status=payload.get("status"),
+        )
+
+    # Legacy token (sub only): resolve the user once
+    if users_collection is None:
+        from shared.database import users_collection
+    user = await users_collection.find_one(
+        {"username": username},
+        {"username": 1, "role": 1, "status": 1}
+    )
+    if not user:
+        raise _credentials_exception()
+
+    return Principal(
+        id=str(user["_id"]),
+        username=user["username"],
+        role=user.get("role"),
+        status=user.get("status"),
+    )
+
+
+# ============================================
+# USER CACHE (TTL + LRU, per process)
+# ============================================
+class TTLCache:
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl_seconds > 0
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+user_cache = TTLCache(USER_CACHE_MAXSIZE, USER_CACHE_TTL_SECONDS)
+
+USER_TAG_PREFIX = user_tag("")
+
+
+def _on_tag_invalidated(tag: Optional[str]) -> None:
+    # invalidations of the other workers / replicas arrive on the response cache channel
+    if tag is None:
+        user_cache.clear()
+    elif tag.startswith(USER_TAG_PREFIX):
+        user_cache.invalidate(tag[len(USER_TAG_PREFIX):])
+
+
+response_cache.add_tag_listener(_on_tag_invalidated)
+
+
+async def get_cached_user(user_id: str, loader: Callable[[str], Awaitable[Any]]) -> Any:
+    """Return the cached user for `user_id`, calling `loader(user_id)` on a miss."""
+    user_id = str(user_id)
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await loader(user_id)
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+async def invalidate_user(user_id) -> None:
+    """Call after any write to a user document (profile, role, status).
+
+    Evicts it here at once and, through the response cache's Redis channel,
+    in every other worker / replica. Without Redis the others keep their copy
+    for up to USER_CACHE_TTL_SECONDS.
+    """
+    user_cache.invalidate(str(user_id))
+    await invalidate_tags(user_tag(user_id))
@@ -0,0 +1,328 @@
+# shared/blob_store.py
+"""
+Pluggable blob storage (local filesystem or S3-compatible, e.g. MinIO).
+
+Blobs are content-addressed: the key is derived from the SHA-256 of the
+bytes, so uploading the same file twice stores it once and a key's content
+never changes (safe to cache forever). Uploads are streamed in chunks to a
+temporary file while hashing, then moved/uploaded under the final key;
+boto3 switches to S3 multipart upload for large files.
+
+    store = get_blob_store()
+    info = await store.put_stream(chunks, content_type="image/png", prefix="proofs")
+    async for chunk in store.iter_range(info.key, 0, info.size - 1): ...
+
+A content key can be shared by several records, so "store the bytes + add a
+reference" must not interleave with "last reference gone -> delete the bytes".
+`staged()` exposes the key before anything is written, so a caller can run
+both steps under one per-key lock:
+
+    async with store.staged(chunks, content_type="image/png", prefix="proofs") as blob:
+        async with mongo_lock(f"blob:{blob.info.key}"):
+            await blob.store()
+            await insert_reference(blob.info)
+
+Backend is selected with BLOB_STORE_BACKEND=local|s3 (see shared/config.py).
+"""
+import abc
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from shared.config import (
+    BLOB_STORE_BACKEND,
+    BLOB_STORE_LOCAL_ROOT,
+    S3_ENDPOINT_URL,
+    S3_BUCKET,
+    S3_ACCESS_KEY,
+    S3_SECRET_KEY,
+    S3_REGION,
+)
+from shared.logger import get_logger
+
+logger = get_logger("blob_store")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class BlobInfo:
+    key: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+def content_key(sha256: str, prefix: str = "") -> str:
+    # fan out on the first bytes of the hash to keep directories small
+    key = f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    return f"{prefix.strip('/')}/{key}" if prefix else key
+
+
+async def _spool(chunks: AsyncIterator[bytes], max_bytes: Optional[int]):
+    """Write chunks to a temp file while hashing; returns (path, size, sha256)."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="blob-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise BlobTooLarge(f"Blob exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, size, digest.hexdigest()
+
+
+class StagedBlob:
+    """Spooled bytes whose key is known; written by store()."""
+
+    def __init__(self, blob_store: "BlobStore", path: str, info: BlobInfo):
+        self._blob_store = blob_store
+        self._path = path
+        self.info = info
+
+    async def store(self) -> BlobInfo:
+        # same key = same bytes: only write when missing
+        if not await self._blob_store.exists(self.info.key):
+            await self._blob_store._put_file(self.info.key, self._path, self.info.content_type)
+        return self.info
+
+
+class BlobStore(abc.ABC):
+    @asynccontextmanager
+    async def staged(
+        self,
+        chunks: AsyncIterator[bytes],
+        content_type: str = "application/octet-stream",
+        prefix: str = "",
+        max_bytes: Optional[int] = None,
+    ) -> AsyncIterator[StagedBlob]:
+        """Spool + hash the upload; the temp file is removed on exit."""
+        path, size, sha256 = await _spool(chunks, max_bytes)
+        info = BlobInfo(key=content_key(sha256, prefix), size=size, sha256=sha256, content_type=content_type)
+        try:
+            yield StagedBlob(self, path, info)
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def put_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        content_type: str = "application/octet-stream",
+        prefix: str = "",
+        max_bytes: Optional[int] = None,
+    ) -> BlobInfo:
+        async with self.staged(chunks, content_type=content_type, prefix=prefix, max_bytes=max_bytes) as blob:
+            return await blob.store()
+
+    async def put_bytes(self, data: bytes, content_type: str = "application/octet-stream", prefix: str = "") -> BlobInfo:
+        async def one_chunk():
+            yield data
+        return await self.put_stream(one_chunk(), content_type=content_type, prefix=prefix)
+
+    async def read_bytes(self, key: str) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_range(key)])
+
+    # ---- backend specific ----
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def size(self, key: str) -> int:
+        """Size in bytes; raises BlobNotFound."""
+
+    @abc.abstractmethod
+    async def _put_file(self, key: str, path: str, content_type: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield bytes [start, end] (inclusive) of the blob."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    async def startup(self) -> None:
+        pass
+
+
+# ============================================
+# LOCAL FILESYSTEM
+# ============================================
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise BlobNotFound(key)
+        return path
+
+    async def startup(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    async def size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self._path(key))
+        except OSError:
+            raise BlobNotFound(key)
+
+    async def _put_file(self, key: str, path: str, content_type: str) -> None:
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # the temp file may live on another device: copy then atomic rename
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        await run_in_threadpool(shutil.copyfile, path, tmp_target)
+        os.replace(tmp_target, target)
+
+    async def iter_range(self, key: str, start: int = 0, end: Optional[int] = None):
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise BlobNotFound(key)
+        end = os.path.getsize(path) - 1 if end is None else end
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+# ============================================
+# S3 / MINIO
+# ============================================
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, region: Optional[str] = None):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:  # optional dependency
+            raise RuntimeError("BLOB_STORE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region,
+            # one client shared by the threadpool: keep enough pooled connections
+            config=Config(max_pool_connections=32, s3={"addressing_style": "path"}),
+        )
+
+    async def startup(self) -> None:
+        from botocore.exceptions import ClientError
+        try:
+            await run_in_threadpool(self._client.head_bucket, Bucket=self.bucket)
+        except ClientError:
+            await run_in_threadpool(self._client.create_bucket, Bucket=self.bucket)
+            logger.info("Created bucket %s", self.bucket)
+
+    async def _head(self, key: str):
+        from botocore.exceptions import ClientError
+        try:
+            return await run_in_threadpool(self._client.head_object, Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await self._head(key) is not None
+
+    async def size(self, key: str) -> int:
+        head = await self._head(key)
+        if head is None:
+            raise BlobNotFound(key)
+        return int(head["ContentLength"])
+
+    async def _put_file(self, key: str, path: str, content_type: str) -> None:
+        # upload_file uses multipart upload (parallel parts) above 8 MB
+        await run_in_threadpool(
+            self._client.upload_file, path, self.bucket, key,
+            ExtraArgs={"ContentType": content_type},
+        )
+
+    async def iter_range(self, key: str, start: int = 0, end: Optional[int] = None):
+        from botocore.exceptions import ClientError
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        try:
+            obj = await run_in_threadpool(self._client.get_object, Bucket=self.bucket, Key=key, Range=byte_range)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise BlobNotFound(key)
+            raise
+        body = obj["Body"]
+        try:
+            while True:
+                chunk = await run_in_threadpool(body.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(self._client.delete_object, Bucket=self.bucket, Key=key)
+
+
+# ============================================
+# FACTORY
+# ============================================
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        if BLOB_STORE_BACKEND == "s3":
+            _store = S3BlobStore(
+                bucket=S3_BUCKET,
+                endpoint_url=S3_ENDPOINT_URL,
+                access_key=S3_ACCESS_KEY,
+                secret_key=S3_SECRET_KEY,
+                region=S3_REGION,
+            )
+        elif BLOB_STORE_BACKEND == "local":
+            _store = LocalBlobStore(BLOB_STORE_LOCAL_ROOT)
+        else:
+            raise RuntimeError(f"Unknown BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+    return _store
@@ -17,8 +17,110 @@ MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "tutor_db")
 # ===========================
 # JWT / AUTH
 # ===========================
-JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-key")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 120))
+
+# In-process cache of user documents keyed by user id (0 disables it).
+# Writes evict it in every process through the RESPONSE_CACHE_REDIS_URL channel;
+# without Redis other workers may serve a stale user for up to the TTL.
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", 1024))
+
+# Max ids accepted by auth-service /get-profiles-by-user-ids
+PROFILE_BATCH_MAX_IDS = int(os.getenv("PROFILE_BATCH_MAX_IDS", 200))
+
+# bcrypt runs on a bounded pool; logins beyond MAX_PENDING get a fast 503
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", PASSWORD_POOL_WORKERS * 8))
+
+# ===========================
+# BLOB STORAGE (proof images)
+# ===========================
+# local: files under BLOB_STORE_LOCAL_ROOT; s3: S3-compatible bucket (MinIO in docker-compose)
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_LOCAL_ROOT = os.getenv("BLOB_STORE_LOCAL_ROOT", "/data/blobs")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_BUCKET = os.getenv("S3_BUCKET", "tutor-blobs")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY") or None
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+
+PROOF_IMAGE_MAX_BYTES = int(os.getenv("PROOF_IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+# Thumbnail / preview transcoding (auth-service process pool)
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", min(2, os.cpu_count() or 1)))
+IMAGE_VARIANT_FORMAT = os.getenv("IMAGE_VARIANT_FORMAT", "webp")  # webp | jpeg
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80))
+# Lifetime of signed image URLs; rounded to this window so URLs (and browser caches) stay stable
+BLOB_URL_TTL_SECONDS = int(os.getenv("BLOB_URL_TTL_SECONDS", 3600))
+
+# ===========================
+# PAYMENTS
+# ===========================
+# auto: multi-document transactions when MongoDB is a replica set / mongos,
+# otherwise the compensating saga (transaction-service/payments.py)
+PAYMENTS_USE_TRANSACTIONS = os.getenv("PAYMENTS_USE_TRANSACTIONS", "auto").lower()  # auto | true | false
+# Payments still "pending" after this long are resumed / rolled back at startup
+PAYMENT_RESUME_AFTER_SECONDS = int(os.getenv("PAYMENT_RESUME_AFTER_SECONDS", 300))
+
+# ===========================
+# RESPONSE CACHE (shared/response_cache.py)
+# ===========================
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+# Entries in the in-process LRU tier (per worker)
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", 2048))
+# Optional shared tier + cross-process invalidation, e.g. redis://redis:6379/0
+RESPONSE_CACHE_REDIS_URL = os.getenv("RESPONSE_CACHE_REDIS_URL") or None
+# Per-route TTLs (0 disables caching of that route)
+CACHE_TTL_POST_DETAIL = int(os.getenv("CACHE_TTL_POST_DETAIL", 60))
+CACHE_TTL_POST_LIST = int(os.getenv("CACHE_TTL_POST_LIST", 15))
+# Facet counts of post-service /search, per filter set (dropped on every post write)
+CACHE_TTL_POST_FACETS = int(os.getenv("CACHE_TTL_POST_FACETS", 60))
+CACHE_TTL_TUTOR_RATINGS = int(os.getenv("CACHE_TTL_TUTOR_RATINGS", 60))
+CACHE_TTL_USER_CERTIFICATES = int(os.getenv("CACHE_TTL_USER_CERTIFICATES", 120))
+
+# ===========================
+# IDEMPOTENCY KEYS (shared/idempotency.py)
+# ===========================
+# How long a stored response can be replayed
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+# A request still "in progress" after this long is assumed dead and can be retried
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+# Larger responses are not stored (the retry runs the handler again)
+IDEMPOTENCY_MAX_RESPONSE_BYTES = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", 64 * 1024))
+
+# ===========================
+# TRACING (shared/tracing.py, OpenTelemetry)
+# ===========================
+# none | otlp | console | file. otlp sends OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT
+# (read by the exporter itself, e.g. http://jaeger:4318)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+# Share of new traces kept; requests arriving with a traceparent follow the caller's decision
+TRACING_SAMPLE_RATIO = float(os.getenv("TRACING_SAMPLE_RATIO", 1.0))
+# TRACING_EXPORTER=file: one JSON span per line, appended by every worker
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "/tmp/traces.jsonl")
+
+# ===========================
+# QUERY PROFILER (shared/query_profiler.py)
+# ===========================
+QUERY_PROFILER_ENABLED = os.getenv("QUERY_PROFILER_ENABLED", "true").lower() in ("true", "1", "yes")
+# Commands at least this slow are counted as slow and get their plan explained
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 100))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("true", "1", "yes")
+# A shape is explained again at most this often (per worker)
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 600))
+QUERY_STATS_FLUSH_INTERVAL_SECONDS = float(os.getenv("QUERY_STATS_FLUSH_INTERVAL_SECONDS", 10))
+# query_stats documents cover one window each and expire after the retention
+QUERY_STATS_WINDOW_SECONDS = int(os.getenv("QUERY_STATS_WINDOW_SECONDS", 3600))
+QUERY_STATS_RETENTION_SECONDS = int(os.getenv("QUERY_STATS_RETENTION_SECONDS", 24 * 3600))
+# Distinct shapes kept in memory between two flushes (per worker)
+QUERY_STATS_MAX_SHAPES = int(os.getenv("QUERY_STATS_MAX_SHAPES", 1000))
+
+# ===========================
+# RATINGS
+# ===========================
+# Interval of the rating_summaries reconciliation job in rating-service (0 = off)
+RATING_RECONCILE_INTERVAL_SECONDS = int(os.getenv("RATING_RECONCILE_INTERVAL_SECONDS", 3600))
 
 # ===========================
 # EMAIL
@@ -26,4 +128,17 @@ JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
 EMAIL_SENDER = os.getenv("EMAIL_SENDER", "no-reply@example.com")
-EMAIL_SENDER_NAME = os.getenv("EMAIL_SENDER_NAME", "IBanking Bot")
\ No newline at end of file
+EMAIL_SENDER_NAME = os.getenv("EMAIL_SENDER_NAME", "IBanking Bot")
+
+# Email outbox (shared/outbox.py), drained by the worker in email-service
+EMAIL_OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL_SECONDS", 1))
+EMAIL_OUTBOX_CONCURRENCY = int(os.getenv("EMAIL_OUTBOX_CONCURRENCY", 4))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 8))
+EMAIL_OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_BASE_SECONDS", 5))
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX_SECONDS", 900))
+# A message claimed by a worker that died is retried after the lease expires
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", 120))
+EMAIL_OUTBOX_RETENTION_SECONDS = int(os.getenv("EMAIL_OUTBOX_RETENTION_SECONDS", 7 * 24 * 3600))
+
+# Max messages accepted by email-service /send-batch
+EMAIL_BATCH_MAX_MESSAGES = int(os.getenv("EMAIL_BATCH_MAX_MESSAGES", 500))
\ No newline at end of file
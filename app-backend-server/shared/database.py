@@ -1,7 +1,11 @@
 # shared/database.py
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 
+from shared.metrics import MONGO_EVENT_LISTENERS
+from shared.query_profiler import profiler
+from shared.tracing import MongoTracingListener
+
 # ============================================
 # Load ENV
 # ============================================
@@ -9,17 +13,31 @@ DB_HOST = os.getenv("DB_HOST", "db")
 DB_PORT = os.getenv("DB_PORT", "27017")
 DB_NAME = os.getenv("MONGO_INITDB_DATABASE", "tutor_db")
 
+# Connection pool (per process, shared by every request of a worker)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
 # ============================================
-# Create ONE MongoClient for entire project
+# Create ONE async MongoClient for entire project
 # ============================================
 MONGO_URI = f"mongodb://{DB_HOST}:{DB_PORT}/"
-client = MongoClient(MONGO_URI)
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    # command timings + pool stats for /metrics (shared/metrics.py), command spans (shared/tracing.py),
+    # per-shape stats + plans of slow queries (shared/query_profiler.py)
+    event_listeners=[*MONGO_EVENT_LISTENERS, MongoTracingListener(), profiler],
+)
 
 # Global database instance
 db = client[DB_NAME]
 
 # ============================================
 # Export collections to be reused anywhere
+# (every operation is awaitable, e.g. `await users_collection.find_one(...)`)
 # ============================================
 users_collection = db.users
 certificates_collection = db.certificates
@@ -28,4 +46,10 @@ applications_collection = db.applications
 bookings_collection = db.bookings
 transactions_collection = db.transactions
 ratings_collection = db.ratings
-proof_images_collection = db.proof_images
\ No newline at end of file
+proof_images_collection = db.proof_images
+rating_summaries_collection = db.rating_summaries
+email_outbox_collection = db.email_outbox
+idempotency_keys_collection = db.idempotency_keys
+locks_collection = db.locks
+query_stats_collection = db.query_stats
+query_plans_collection = db.query_plans
@@ -0,0 +1,64 @@
+# shared/gunicorn_conf.py
+"""
+Gunicorn settings shared by every service (see the Dockerfiles):
+
+    gunicorn -c shared/gunicorn_conf.py main:app
+
+Gunicorn supervises WEB_CONCURRENCY uvicorn workers (restarts crashed ones,
+graceful reload on HUP). Each worker is a separate process with its own Mongo
+pool and local caches; startup work that must run once goes through
+shared/locks.py.
+
+Env:
+    PORT                      listen port (0.0.0.0)
+    WEB_CONCURRENCY           worker processes (default 1)
+    GUNICORN_TIMEOUT          kill a worker silent for this long (s)
+    GUNICORN_GRACEFUL_TIMEOUT time given to in-flight requests on restart (s)
+    GUNICORN_MAX_REQUESTS     recycle a worker after N requests (0 = never)
+    GUNICORN_RELOAD           true: restart workers on code change (dev)
+    PROMETHEUS_MULTIPROC_DIR  per-worker metric files, merged by /metrics
+                              (shared/metrics.py); emptied at boot
+"""
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# > nginx upstream keepalive_timeout (60s): nginx closes idle pooled connections first
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 0))
+# spread recycling so the workers do not restart together
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+reload = os.getenv("GUNICORN_RELOAD", "false").lower() in ("true", "1", "yes")
+
+# behind the gateway: trust its X-Forwarded-* headers
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "*")
+
+# no preload: the Motor client and event-loop bound state are created per worker
+preload_app = False
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+# ===== Prometheus multiprocess mode =====
+def on_starting(server):
+    # samples of a previous run would be added to the new ones
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # in-flight / pool gauges of a dead worker must not count any more
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
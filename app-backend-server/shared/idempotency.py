@@ -0,0 +1,233 @@
+# shared/idempotency.py
+"""
+Idempotency-Key support for write endpoints.
+
+Clients send `Idempotency-Key: <uuid>` and reuse it when retrying (see
+fetchWithAuth in web-frontend api.js). The first request runs the handler and
+its response is stored in `idempotency_keys` (TTL index on expires_at); a
+repeat with the same key gets the stored response replayed without running
+the handler again.
+
+    app.add_middleware(IdempotencyMiddleware, paths={"/add-post"})
+
+Keys are scoped by method, path and the caller's Authorization header, and
+bound to a hash of the request body:
+    - same key, different body          -> 422
+    - same key while the first one runs -> 409 (Retry-After)
+Only final outcomes are stored. 5xx, "try again" responses (409, 429, 503 or
+any Retry-After, e.g. a payment for the same item still in progress) and
+responses over IDEMPOTENCY_MAX_RESPONSE_BYTES release the key, so their
+retries run the handler again.
+
+The store is Mongo rather than a per-process cache so replicas of a service
+share it.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+
+from shared.config import IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_LOCK_SECONDS, IDEMPOTENCY_MAX_RESPONSE_BYTES
+from shared.database import idempotency_keys_collection
+from shared.logger import get_logger
+
+logger = get_logger("idempotency")
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+# recomputed on replay
+_SKIPPED_HEADERS = {"content-length", "date", "server", "set-cookie"}
+
+# transient: the client is told to retry, so the retry must run the handler
+_RETRYABLE_STATUSES = {409, 429, 503}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _route_path(scope) -> str:
+    path = scope.get("path", "")
+    root_path = scope.get("root_path") or ""
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    return path
+
+
+def _record_id(method: str, path: str, authorization: str, key: str) -> str:
+    return hashlib.sha256(f"{method} {path}\n{authorization}\n{key}".encode()).hexdigest()
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+def _receive_with_body(body: bytes, receive):
+    sent = False
+
+    async def wrapped():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return wrapped
+
+
+# ============================================
+# STORE
+# ============================================
+async def _acquire(record_id: str, fingerprint: str) -> Optional[dict]:
+    """Lock the key for this request: None when acquired, else the existing record."""
+    now = _now()
+    lock = {
+        "status": IN_PROGRESS,
+        "fingerprint": fingerprint,
+        "locked_until": now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS),
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    }
+    for _ in range(2):
+        try:
+            await idempotency_keys_collection.insert_one({"_id": record_id, **lock})
+            return None
+        except DuplicateKeyError:
+            pass
+
+        # the request holding the lock died: take it over
+        taken = await idempotency_keys_collection.find_one_and_update(
+            {"_id": record_id, "status": IN_PROGRESS, "fingerprint": fingerprint, "locked_until": {"$lte": now}},
+            {"$set": lock},
+        )
+        if taken is not None:
+            return None
+
+        existing = await idempotency_keys_collection.find_one({"_id": record_id})
+        if existing is not None:
+            return existing
+        # expired between insert and read: try again
+    return await idempotency_keys_collection.find_one({"_id": record_id})
+
+
+async def _complete(record_id: str, status_code: int, headers: list, body: bytes) -> None:
+    await idempotency_keys_collection.update_one(
+        {"_id": record_id},
+        {
+            "$set": {
+                "status": COMPLETED,
+                "status_code": status_code,
+                "headers": headers,
+                "body": body,
+                "completed_at": _now(),
+            },
+            "$unset": {"locked_until": ""},
+        },
+    )
+
+
+async def _release(record_id: str) -> None:
+    await idempotency_keys_collection.delete_one({"_id": record_id, "status": IN_PROGRESS})
+
+
+def _is_final(status_code: int, headers: list) -> bool:
+    if status_code >= 500 or status_code in _RETRYABLE_STATUSES:
+        return False
+    return not any(name.lower() == "retry-after" for name, _ in headers)
+
+
+def _replay_response(record: dict, fingerprint: str) -> Response:
+    if record.get("fingerprint") != fingerprint:
+        return JSONResponse(
+            {"detail": "Idempotency-Key was already used for a different request"}, status_code=422
+        )
+    if record.get("status") != COMPLETED:
+        return JSONResponse(
+            {"detail": "A request with this Idempotency-Key is in progress"},
+            status_code=409,
+            headers={"Retry-After": "1"},
+        )
+    response = Response(content=bytes(record.get("body") or b""), status_code=record["status_code"])
+    for name, value in record.get("headers") or []:
+        response.headers.append(name, value)
+    response.headers[REPLAYED_HEADER] = "true"
+    return response
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+class IdempotencyMiddleware:
+    """ASGI middleware: POST requests to `paths` (relative to root_path)
+    carrying an Idempotency-Key run at most once per key."""
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or _route_path(scope) not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        record_id = _record_id(scope["method"], _route_path(scope), headers.get("authorization", ""), key)
+
+        existing = await _acquire(record_id, fingerprint)
+        if existing is not None:
+            await _replay_response(existing, fingerprint)(scope, receive, send)
+            return
+
+        captured = {"status": 500, "headers": [], "body": bytearray(), "storable": True}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                captured["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                    if name.decode("latin-1").lower() not in _SKIPPED_HEADERS
+                ]
+            elif message["type"] == "http.response.body" and captured["storable"]:
+                captured["body"].extend(message.get("body", b""))
+                if len(captured["body"]) > IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    captured["storable"] = False
+                    captured["body"] = bytearray()
+            await send(message)
+
+        try:
+            await self.app(scope, _receive_with_body(body, receive), capture_send)
+        except BaseException:
+            await _release(record_id)
+            raise
+
+        if not captured["storable"] or not _is_final(captured["status"], captured["headers"]):
+            await _release(record_id)
+        else:
+            await _complete(record_id, captured["status"], captured["headers"], bytes(captured["body"]))
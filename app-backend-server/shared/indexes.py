@@ -0,0 +1,306 @@
+# shared/indexes.py
+"""
+Declarative, versioned index registry for tutor_db.
+
+Every service calls `await ensure_indexes()` at startup. The applied registry
+version is stored in the `schema_versions` collection so that restarts with an
+up-to-date database cost a single `find_one`.
+
+CLI (run from a service directory, next to `shared/`):
+    python -m shared.indexes apply     # create missing / drop retired indexes
+    python -m shared.indexes report    # missing, redundant, unused, unknown
+"""
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from shared.config import EMAIL_OUTBOX_RETENTION_SECONDS, QUERY_STATS_RETENTION_SECONDS
+from shared.database import db
+from shared.locks import mongo_lock
+from shared.logger import get_logger
+
+logger = get_logger("indexes")
+
+# Bump when INDEXES or RETIRED_INDEXES change.
+INDEX_REGISTRY_VERSION = 11
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+INDEX_VERSION_DOC_ID = "indexes"
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    keys: Tuple[Tuple[str, int], ...]
+    unique: bool = False
+    sparse: bool = False
+    options: Dict = field(default_factory=dict)
+    # registry version that introduced this index
+    since: int = 1
+
+    @property
+    def name(self) -> str:
+        return "_".join(f"{k}_{d}" for k, d in self.keys)
+
+    def to_index_model(self) -> IndexModel:
+        kwargs = dict(self.options)
+        if self.unique:
+            kwargs["unique"] = True
+        if self.sparse:
+            kwargs["sparse"] = True
+        return IndexModel(list(self.keys), name=self.name, **kwargs)
+
+
+def _idx(*keys: Tuple[str, int], **kwargs) -> IndexSpec:
+    return IndexSpec(keys=tuple(keys), **kwargs)
+
+
+# ============================================
+# REGISTRY: collection -> indexes
+# ============================================
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        _idx(("username", ASCENDING), unique=True),
+        _idx(("email", ASCENDING)),
+        # v2: (filter, _id) pairs back keyset pagination (shared.pagination)
+        _idx(("status", ASCENDING), ("_id", ASCENDING), since=2),
+    ],
+    "certificates": [
+        _idx(("user_id", ASCENDING)),
+        _idx(("status", ASCENDING), ("_id", ASCENDING), since=2),
+    ],
+    "posts": [
+        _idx(("creator_id", ASCENDING), ("_id", ASCENDING), since=2),
+        _idx(("post_status", ASCENDING), ("_id", ASCENDING), since=2),
+        # v3: folded search fields (shared.post_search)
+        _idx(("post_status", ASCENDING), ("search.tokens", ASCENDING), since=3),
+        # v10: replaces (post_status, search.subject): also covers the /search facet counts
+        _idx(
+            ("post_status", ASCENDING), ("search.subject", ASCENDING), ("search.level", ASCENDING), ("search.mode", ASCENDING),
+            since=10,
+        ),
+        _idx(("post_status", ASCENDING), ("search.level", ASCENDING), since=3),
+        _idx(("post_status", ASCENDING), ("salary_amount", ASCENDING), since=3),
+        _idx(("search.address", ASCENDING), since=3),
+    ],
+    "applications": [
+        _idx(("post_id", ASCENDING), ("application_status", ASCENDING)),
+        _idx(("post_id", ASCENDING), ("_id", ASCENDING), since=2),
+        _idx(("tutor_id", ASCENDING), ("_id", ASCENDING), since=2),
+    ],
+    "bookings": [
+        _idx(("tutor_id", ASCENDING), ("_id", ASCENDING), since=2),
+        _idx(("parent_id", ASCENDING), ("_id", ASCENDING), since=2),
+        _idx(("post_id", ASCENDING)),
+    ],
+    "transactions": [
+        _idx(("payer_id", ASCENDING), ("_id", ASCENDING), since=2),
+        # v7: payment engine (transaction-service/payments.py) - idempotency
+        # keys are unique per payer, pending payments are resumed by age
+        _idx(
+            ("payer_id", ASCENDING), ("idempotency_key", ASCENDING), unique=True,
+            options={"partialFilterExpression": {"idempotency_key": {"$exists": True}}}, since=7,
+        ),
+        _idx(("transaction_status", ASCENDING), ("created_at", ASCENDING), since=7),
+    ],
+    "ratings": [
+        _idx(("tutor_id", ASCENDING), ("rated_at", DESCENDING)),
+    ],
+    "proof_images": [
+        _idx(("type", ASCENDING), ("type_id", ASCENDING)),
+        # v5: reference check before deleting a shared content-addressed blob
+        _idx(("blob_key", ASCENDING), since=5),
+        # v6: all proof images of a user in one query (auth /me/dashboard)
+        _idx(("user_id", ASCENDING), since=6),
+    ],
+    "email_outbox": [
+        # worker claim: {status, next_attempt_at <= now} sorted by next_attempt_at
+        _idx(("status", ASCENDING), ("next_attempt_at", ASCENDING), since=4),
+        _idx(("dedupe_key", ASCENDING), unique=True, sparse=True, since=4),
+        # v11: batch claim reads its messages back by claim token (unset once done)
+        _idx(("claim", ASCENDING), sparse=True, since=11),
+        # delivered messages expire (dead ones are kept for inspection)
+        _idx(("sent_at", ASCENDING), options={"expireAfterSeconds": EMAIL_OUTBOX_RETENTION_SECONDS}, since=4),
+    ],
+    "idempotency_keys": [
+        # v8: stored responses of write endpoints (shared.idempotency) expire
+        _idx(("expires_at", ASCENDING), options={"expireAfterSeconds": 0}, since=8),
+    ],
+    # v9: slow-query profiler (shared.query_profiler), rolling window
+    "query_stats": [
+        _idx(("window_start", ASCENDING), options={"expireAfterSeconds": QUERY_STATS_RETENTION_SECONDS}, since=9),
+    ],
+    "query_plans": [
+        _idx(("explained_at", ASCENDING), options={"expireAfterSeconds": QUERY_STATS_RETENTION_SECONDS}, since=9),
+    ],
+}
+
+# Indexes dropped by a migration: collection -> index names
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # v2: superseded by the (field, _id) keyset indexes (same prefix)
+    "users": ["status_1"],
+    "certificates": ["status_1"],
+    "posts": ["creator_id_1", "post_status_1", "post_status_1_search.subject_1"],
+    "applications": ["tutor_id_1"],
+    "bookings": ["tutor_id_1", "parent_id_1"],
+    "transactions": ["payer_id_1_transaction_status_1"],
+}
+
+
+# ============================================
+# APPLY
+# ============================================
+async def apply_indexes(from_version: int = 0) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, str]]]:
+    """Create registered indexes newer than `from_version` and drop retired ones (idempotent).
+
+    Returns (created, failed): index names per collection, and the error of
+    every index that could not be built (collection -> index name -> error).
+    """
+    created: Dict[str, List[str]] = {}
+    failed: Dict[str, Dict[str, str]] = {}
+    for collection_name, specs in INDEXES.items():
+        pending = [spec for spec in specs if spec.since > from_version]
+        if not pending:
+            continue
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(
+                [spec.to_index_model() for spec in pending]
+            )
+            continue
+        except OperationFailure:
+            pass
+        # one bad spec fails the whole call: build them one by one so the
+        # others still get created, and keep the errors of the bad ones
+        for spec in pending:
+            try:
+                names = await db[collection_name].create_indexes([spec.to_index_model()])
+                created.setdefault(collection_name, []).extend(names)
+            except OperationFailure as e:
+                # e.g. duplicate data for a unique index: keep serving, report it
+                failed.setdefault(collection_name, {})[spec.name] = str(e)
+                logger.error("Failed to create index %s.%s: %s", collection_name, spec.name, e)
+
+    for collection_name, names in RETIRED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection_name].drop_index(name)
+                logger.info("Dropped retired index %s.%s", collection_name, name)
+
+    return created, failed
+
+
+async def ensure_indexes() -> None:
+    """Startup hook: apply the registry only when the stored version is behind.
+
+    Every worker of every service runs it; one applies, the others wait and
+    then find the version up to date. When an index fails to build the version
+    is not bumped (the failures are stored on the version doc instead), so the
+    next startup retries.
+    """
+    versions = db[SCHEMA_VERSIONS_COLLECTION]
+
+    async def applied_version() -> int:
+        current = await versions.find_one({"_id": INDEX_VERSION_DOC_ID})
+        return current.get("version", 0) if current else 0
+
+    if await applied_version() >= INDEX_REGISTRY_VERSION:
+        return
+
+    async with mongo_lock("ensure_indexes", ttl_seconds=600, wait_seconds=600):
+        from_version = await applied_version()
+        if from_version >= INDEX_REGISTRY_VERSION:
+            return
+        _, failed = await apply_indexes(from_version=from_version)
+        if failed:
+            await versions.update_one(
+                {"_id": INDEX_VERSION_DOC_ID},
+                {"$set": {"failed": failed, "failed_version": INDEX_REGISTRY_VERSION, "failed_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+            logger.error(
+                "Index registry version %s not applied, %s index(es) failed (retried on next startup): %s",
+                INDEX_REGISTRY_VERSION, sum(len(v) for v in failed.values()), failed,
+            )
+            return
+        await versions.update_one(
+            {"_id": INDEX_VERSION_DOC_ID},
+            {
+                "$max": {"version": INDEX_REGISTRY_VERSION},
+                "$unset": {"failed": "", "failed_version": "", "failed_at": ""},
+            },
+            upsert=True,
+        )
+    logger.info("Index registry applied (version %s)", INDEX_REGISTRY_VERSION)
+
+
+# ============================================
+# REPORT ($indexStats)
+# ============================================
+def _key_tuple(key) -> Tuple:
+    # $indexStats may return 1 / 1.0 / Int64(1) for the same direction
+    return tuple((k, int(d) if isinstance(d, (int, float)) else d) for k, d in key.items())
+
+
+async def report() -> Dict[str, Dict[str, List]]:
+    """Compare registry vs. database.
+
+    - missing:   registered but not present
+    - unknown:   present but not registered (and not _id_)
+    - redundant: key pattern is a strict prefix of another index on the collection
+    - unused:    zero accesses since the server (re)started, per $indexStats
+    """
+    result: Dict[str, Dict[str, List]] = {}
+    collection_names = set(INDEXES) | set(await db.list_collection_names())
+    collection_names.discard(SCHEMA_VERSIONS_COLLECTION)
+
+    for collection_name in sorted(collection_names):
+        collection = db[collection_name]
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+        present = {s["name"]: _key_tuple(s["key"]) for s in stats}
+        registered = {spec.name: spec.keys for spec in INDEXES.get(collection_name, [])}
+
+        missing = sorted(name for name in registered if name not in present)
+        unknown = sorted(name for name in present if name not in registered and name != "_id_")
+        redundant = sorted(
+            name for name, key in present.items()
+            if name != "_id_" and any(
+                other_name != name and len(other) > len(key) and other[:len(key)] == key
+                for other_name, other in present.items()
+            )
+        )
+        unused = sorted(
+            s["name"] for s in stats
+            if s["name"] != "_id_" and int(s.get("accesses", {}).get("ops", 0)) == 0
+        )
+
+        result[collection_name] = {
+            "missing": missing,
+            "unknown": unknown,
+            "redundant": redundant,
+            "unused": unused,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="tutor_db index registry")
+    parser.add_argument("command", choices=["apply", "report"])
+    args = parser.parse_args()
+
+    if args.command == "apply":
+        created, failed = asyncio.run(apply_indexes())
+        print(json.dumps({"created": created, "failed": failed}, indent=2))
+        if failed:
+            raise SystemExit(1)
+    else:
+        print(json.dumps(asyncio.run(report()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# shared/locks.py
+"""
+Mongo leases, for startup work and background jobs that must not run in every
+worker / replica at once (gunicorn starts WEB_CONCURRENCY copies of each
+service, and compose may scale them).
+
+    # one worker at a time; the others wait, then see the work already done
+    async with mongo_lock("init_db"):
+        await init_db()
+
+    # periodic job: whoever holds the lease this round runs it, the rest skip
+    if await acquire_lease("rating-reconciler", ttl_seconds=interval):
+        await reconcile_rating_summaries()
+
+A lease is one document in `locks` ({_id: name, holder, expires_at}). An
+expired lease (its holder crashed) can be taken by anyone.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+from shared.database import locks_collection
+from shared.logger import get_logger
+
+logger = get_logger("locks")
+
+# identifies this process (container hostname + worker pid)
+HOLDER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def acquire_lease(name: str, ttl_seconds: float, holder: str = HOLDER) -> bool:
+    """Take (or renew) the lease `name` for ttl_seconds; False when someone else holds it."""
+    now = _now()
+    try:
+        await locks_collection.update_one(
+            {"_id": name, "$or": [{"expires_at": {"$lte": now}}, {"holder": holder}]},
+            {"$set": {"holder": holder, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # the document exists and the filter did not match: held by another process
+        return False
+
+
+async def release_lease(name: str, holder: str = HOLDER) -> None:
+    await locks_collection.delete_one({"_id": name, "holder": holder})
+
+
+@asynccontextmanager
+async def mongo_lock(name: str, ttl_seconds: float = 120, wait_seconds: float = 120, poll_seconds: float = 0.5):
+    """Run the block while holding `name`, waiting for the current holder.
+
+    After wait_seconds the block runs anyway (logged): callers guard work that
+    is idempotent but wasteful or racy to run concurrently, and a worker that
+    fails its startup would take the whole gunicorn master down.
+    """
+    # per acquisition, so two tasks of one process exclude each other too
+    holder = f"{HOLDER}/{uuid.uuid4().hex[:8]}"
+    deadline = asyncio.get_running_loop().time() + wait_seconds
+    acquired = await acquire_lease(name, ttl_seconds, holder)
+    while not acquired and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(poll_seconds)
+        acquired = await acquire_lease(name, ttl_seconds, holder)
+    if not acquired:
+        logger.warning("Lock %s still held after %ss, continuing without it", name, wait_seconds)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            await release_lease(name, holder)
@@ -0,0 +1,262 @@
+# shared/metrics.py
+"""
+Prometheus instrumentation shared by every service.
+
+    app = FastAPI(...)
+    setup_metrics(app)      # after the other add_middleware calls: outermost
+
+exports on GET /metrics (not routed by the gateway, scrape the services):
+    http_requests_total{method, route, status}
+    http_request_duration_seconds{method, route}      histogram
+    http_requests_in_progress{method, route}
+    mongodb_command_duration_seconds{collection, command}   histogram
+    mongodb_command_failures_total{collection, command}
+    mongodb_pool_connections{address}                  open connections
+    mongodb_pool_connections_in_use{address}
+    mongodb_pool_checkout_wait_seconds{address}        histogram
+    mongodb_pool_checkout_failures_total{address, reason}
+
+`route` is the route template with the service prefix
+("/api/post/{post_id}"), never the raw path, so label cardinality stays
+bounded; requests matching no route are counted as "unmatched".
+
+Mongo metrics come from pymongo monitoring listeners (MONGO_EVENT_LISTENERS,
+registered on the client in shared/database.py).
+
+Under gunicorn every worker is a process of its own: with
+PROMETHEUS_MULTIPROC_DIR set (Dockerfiles) the workers write their samples
+there and /metrics aggregates all of them, whichever worker serves it.
+"""
+import os
+import time
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    # prometheus_client expects it to exist (gunicorn_conf wipes it at boot)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402  (after PROMETHEUS_MULTIPROC_DIR)
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+from starlette.routing import Match  # noqa: E402
+
+METRICS_PATH = "/metrics"
+UNMATCHED_ROUTE = "unmatched"
+
+# ============================================
+# HTTP
+# ============================================
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+)
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency (until the response body is sent)",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1, 2.5, 5, 10, 30),
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+
+def route_label(scope) -> str:
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    partial = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return (scope.get("root_path") or "") + route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route  # path matches, method does not (405)
+    if partial is not None:
+        return (scope.get("root_path") or "") + partial.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware: latency, status and in-flight count per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_label(scope)
+        if route.endswith(METRICS_PATH):
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_progress = HTTP_IN_PROGRESS.labels(method, route)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_DURATION.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            in_progress.dec()
+
+
+# ============================================
+# MONGO COMMANDS
+# ============================================
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency as seen by the driver",
+    ["collection", "command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongodb_command_failures_total", "MongoDB commands that returned an error", ["collection", "command"]
+)
+
+# handshake / auth / session bookkeeping, not application queries
+IGNORED_MONGO_COMMANDS = {
+    "hello", "ismaster", "ping", "buildinfo", "saslstart", "saslcontinue",
+    "authenticate", "getnonce", "endsessions",
+}
+
+
+def command_collection(command_name: str, command) -> str:
+    """Collection a command targets ({"find": "posts"}, getMore's "collection"), "-" if none."""
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else "-"
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request_id) -> collection; started/finished come in pairs
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name.lower() in IGNORED_MONGO_COMMANDS:
+            return
+        self._pending[(event.connection_id, event.request_id)] = command_collection(
+            event.command_name, event.command
+        )
+
+    def _finished(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return None
+        MONGO_COMMAND_DURATION.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        return collection
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        collection = self._finished(event)
+        if collection is not None:
+            MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+# ============================================
+# MONGO CONNECTION POOL
+# ============================================
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongodb_pool_connections", "Open pooled connections", ["address"], multiprocess_mode="livesum"
+)
+MONGO_POOL_IN_USE = Gauge(
+    "mongodb_pool_connections_in_use", "Connections checked out of the pool", ["address"], multiprocess_mode="livesum"
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool (grows when maxPoolSize is too small)",
+    ["address"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total", "Failed connection checkouts", ["address", "reason"]
+)
+
+
+def _address(event) -> str:
+    host, port = event.address
+    return f"{host}:{port}"
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(_address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILURES.labels(_address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_IN_USE.labels(_address(event)).inc()
+        duration = getattr(event, "duration", None)  # pymongo >= 4.7
+        if duration is not None:
+            MONGO_POOL_CHECKOUT_WAIT.labels(_address(event)).observe(duration)
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_IN_USE.labels(_address(event)).dec()
+
+
+MONGO_EVENT_LISTENERS = [MongoCommandMetrics(), MongoPoolMetrics()]
+
+
+# ============================================
+# /metrics
+# ============================================
+async def metrics_endpoint(request: Request) -> Response:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def setup_metrics(app) -> None:
+    """Instrument `app` and add GET /metrics (hidden from the OpenAPI docs)."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_route(METRICS_PATH, metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,223 @@
+# shared/outbox.py
+"""
+Durable email outbox.
+
+Services record the intent to send an email with `await enqueue_email(...)`
+in the same flow as the state change that triggers it (inside the payment
+transaction / saga step with `session=`, or failing the request so the
+client retries) and return immediately; the worker in email-service
+(outbox_worker.py) claims pending messages, sends them, and retries failures
+with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS, after which the
+message is dead-lettered (status "dead") for inspection / manual retry.
+
+Every claim writes a fresh `claim` token: mark_sent / mark_failed only apply
+while the worker still holds it, so a worker whose lease expired (and whose
+message was re-claimed) cannot overwrite the newer state.
+
+Message lifecycle: pending -> sending -> sent
+                                      \\-> pending (retry) ... -> dead
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from shared.config import (
+    EMAIL_OUTBOX_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_BACKOFF_BASE_SECONDS,
+    EMAIL_OUTBOX_BACKOFF_MAX_SECONDS,
+    EMAIL_OUTBOX_LEASE_SECONDS,
+)
+from shared.database import email_outbox_collection
+from shared.tracing import SpanKind, inject_context, start_span
+
+# Message kinds (handled by email-service)
+BOOKING_EMAIL = "booking_email"
+PARENT_NOTIFY_EMAIL = "parent_notify_email"
+
+PENDING = "pending"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+STATUSES = (PENDING, SENDING, SENT, DEAD)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff (with jitter) before retrying the `attempts`-th failure."""
+    ceiling = min(EMAIL_OUTBOX_BACKOFF_MAX_SECONDS, EMAIL_OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+# ============================================
+# PRODUCER
+# ============================================
+async def enqueue_email(kind: str, payload: dict, dedupe_key: Optional[str] = None, session=None) -> str:
+    """Record an email to send; returns the outbox message id.
+
+    With `dedupe_key`, enqueueing the same key twice keeps the first message.
+    Pass the `session` of a multi-document transaction to write the message
+    with the state change. The current trace context is stored with it
+    (`trace_context`): the email-service worker continues the trace of the
+    request that enqueued it.
+    """
+    with start_span(f"outbox.enqueue {kind}", {"outbox.kind": kind}, kind=SpanKind.PRODUCER):
+        return await _insert_message(kind, payload, dedupe_key, session)
+
+
+async def _insert_message(kind: str, payload: dict, dedupe_key: Optional[str], session=None) -> str:
+    now = _now()
+    message = {
+        "kind": kind,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt_at": now,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+    trace_context = inject_context()
+    if trace_context:
+        message["trace_context"] = trace_context
+    if not dedupe_key:
+        result = await email_outbox_collection.insert_one(message, session=session)
+        return str(result.inserted_id)
+
+    # upsert, not insert: a duplicate must not abort the caller's transaction
+    try:
+        result = await email_outbox_collection.update_one(
+            {"dedupe_key": dedupe_key}, {"$setOnInsert": message}, upsert=True, session=session
+        )
+        if result.upserted_id is not None:
+            return str(result.upserted_id)
+    except DuplicateKeyError:
+        # concurrent upsert of the same key (outside a transaction)
+        pass
+    existing = await email_outbox_collection.find_one({"dedupe_key": dedupe_key}, {"_id": 1}, session=session)
+    return str(existing["_id"])
+
+
+# ============================================
+# CONSUMER (email-service worker)
+# ============================================
+def _due(now: datetime) -> dict:
+    # pending and due, or still "sending" after its lease expired
+    return {
+        "$or": [
+            {"status": PENDING, "next_attempt_at": {"$lte": now}},
+            {"status": SENDING, "locked_until": {"$lte": now}},
+        ]
+    }
+
+
+def _lease(now: datetime, claim: ObjectId) -> dict:
+    return {
+        "$set": {
+            "status": SENDING,
+            "claim": claim,
+            "locked_until": now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS),
+            "updated_at": now,
+        },
+        "$inc": {"attempts": 1},
+    }
+
+
+async def claim_next() -> Optional[dict]:
+    """Atomically lease the next due message (or one whose lease expired)."""
+    now = _now()
+    return await email_outbox_collection.find_one_and_update(
+        _due(now),
+        _lease(now, ObjectId()),
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def claim_batch(limit: int) -> List[dict]:
+    """Lease up to `limit` due messages (oldest first) under one claim token.
+
+    Candidates are re-checked by the update, so a message another worker
+    leased in between is simply not part of the batch.
+    """
+    now = _now()
+    candidates = await email_outbox_collection.find(
+        _due(now), {"_id": 1}, sort=[("next_attempt_at", 1)], limit=limit
+    ).to_list(length=limit)
+    if not candidates:
+        return []
+    claim = ObjectId()
+    await email_outbox_collection.update_many(
+        {"_id": {"$in": [c["_id"] for c in candidates]}, **_due(now)},
+        _lease(now, claim),
+    )
+    return await email_outbox_collection.find({"claim": claim}, sort=[("next_attempt_at", 1)]).to_list(length=limit)
+
+
+def _held(message: dict) -> dict:
+    # still ours: not re-claimed by another worker after our lease expired
+    return {"_id": message["_id"], "status": SENDING, "claim": message.get("claim")}
+
+
+async def mark_sent(message: dict) -> bool:
+    """False when the lease was lost (the message belongs to another worker now)."""
+    now = _now()
+    result = await email_outbox_collection.update_one(
+        _held(message),
+        {
+            "$set": {"status": SENT, "sent_at": now, "updated_at": now, "last_error": None},
+            "$unset": {"locked_until": "", "claim": ""},
+        },
+    )
+    return result.matched_count == 1
+
+
+async def mark_failed(message: dict, error: str, permanent: bool = False) -> Optional[str]:
+    """Schedule a retry, or dead-letter the message; returns the new status
+    (None when the lease was lost and the message was left alone)."""
+    now = _now()
+    attempts = message.get("attempts", 1)
+    if permanent or attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        update = {"status": DEAD, "dead_at": now}
+    else:
+        update = {"status": PENDING, "next_attempt_at": now + timedelta(seconds=backoff_seconds(attempts))}
+    update.update({"last_error": error[:500], "updated_at": now})
+
+    result = await email_outbox_collection.update_one(
+        _held(message),
+        {"$set": update, "$unset": {"locked_until": "", "claim": ""}},
+    )
+    return update["status"] if result.matched_count == 1 else None
+
+
+async def requeue(message_id) -> bool:
+    """Move a dead-lettered message back to pending (attempts reset)."""
+    now = _now()
+    result = await email_outbox_collection.update_one(
+        {"_id": ObjectId(message_id), "status": DEAD},
+        {"$set": {"status": PENDING, "attempts": 0, "next_attempt_at": now, "updated_at": now}},
+    )
+    return result.modified_count == 1
+
+
+async def outbox_status() -> Dict:
+    # one index-only count per status (status is the index prefix)
+    counts = {s: await email_outbox_collection.count_documents({"status": s}) for s in STATUSES}
+
+    oldest = await email_outbox_collection.find_one(
+        {"status": PENDING}, {"created_at": 1}, sort=[("next_attempt_at", 1)]
+    )
+    oldest_age = None
+    if oldest:
+        created_at = oldest["created_at"]
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        oldest_age = round((_now() - created_at).total_seconds(), 1)
+
+    return {"counts": counts, "oldest_pending_age_seconds": oldest_age}
@@ -0,0 +1,60 @@
+# shared/pagination.py
+"""
+Keyset (cursor) pagination on `_id`.
+
+List endpoints return their page as before and put an opaque token for the
+following page in the `X-Next-Cursor` response header (absent on the last
+page). Passing it back as `cursor` continues after the last `_id` seen, so a
+deep page costs the same index seek as the first one. `skip` is still
+accepted as a legacy option when no cursor is given.
+"""
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: ObjectId) -> str:
+    raw = json.dumps({"_id": str(last_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(json.loads(base64.urlsafe_b64decode(padded))["_id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Return (docs, next_cursor) ordered by `_id` ascending."""
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+
+    find = collection.find(query, projection).sort("_id", 1)
+    if skip and not cursor:
+        find = find.skip(skip)
+
+    # one extra document tells us whether another page exists
+    docs = await find.limit(limit + 1).to_list(length=None)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1]["_id"])
+    return docs, None
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
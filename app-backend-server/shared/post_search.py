@@ -0,0 +1,252 @@
+# shared/post_search.py
+"""
+Search fields for posts.
+
+Every post carries a `search` sub-document with diacritic-folded, lower-case
+copies of its text ("Vật Lý" -> "vat ly"):
+
+    search.tokens   inverted-index tokens (title, subject, level, address, ...)
+    search.address  address tokens
+    search.subject / search.level / search.mode   folded keys (filters + facets)
+
+All of them are indexed (see shared/indexes.py), so filters are equality,
+`$all` or anchored-prefix lookups instead of unanchored `$regex` scans.
+Facet counts group on the folded keys only (covered by the
+post_status + subject/level/mode index) and are cached per filter set.
+`build_search_fields()` must be called on every post write; old documents are
+backfilled by `ensure_post_search_fields()` (startup hook of post-service, or
+`python -m shared.post_search backfill`).
+"""
+import argparse
+import asyncio
+import json
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from shared.config import CACHE_TTL_POST_FACETS
+from shared.database import db, posts_collection
+from shared.locks import mongo_lock
+from shared.logger import get_logger
+from shared.response_cache import response_cache, POSTS_TAG
+
+logger = get_logger("post_search")
+
+# Bump when build_search_fields() changes: existing posts are re-indexed.
+SEARCH_VERSION = 1
+
+SCHEMA_VERSIONS_COLLECTION = "schema_versions"
+SEARCH_VERSION_DOC_ID = "post_search"
+
+TEXT_FIELDS = ("title", "subject", "level", "address", "preferred_times", "student_info", "requirements")
+FACET_FIELDS = ("subject", "level", "mode")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+# ============================================
+# NORMALIZE
+# ============================================
+def fold(text) -> str:
+    """Lower-case, strip Vietnamese diacritics (đ -> d), collapse whitespace."""
+    if not text:
+        return ""
+    text = str(text).replace("đ", "d").replace("Đ", "D")
+    text = "".join(
+        c for c in unicodedata.normalize("NFD", text)
+        if unicodedata.category(c) != "Mn"
+    )
+    return " ".join(text.lower().split())
+
+
+def tokenize(text) -> List[str]:
+    """Unique folded tokens, in order of appearance."""
+    return list(dict.fromkeys(_TOKEN_RE.findall(fold(text))))
+
+
+def build_search_fields(post: dict) -> dict:
+    tokens = []
+    for name in TEXT_FIELDS:
+        tokens.extend(tokenize(post.get(name)))
+    return {
+        "v": SEARCH_VERSION,
+        "tokens": list(dict.fromkeys(tokens)),
+        "address": tokenize(post.get("address")),
+        "subject": fold(post.get("subject")) or None,
+        "level": fold(post.get("level")) or None,
+        "mode": fold(post.get("mode")) or None,
+    }
+
+
+# ============================================
+# QUERY
+# ============================================
+def _key_filter(values: List[str]) -> Optional[dict]:
+    keys = [fold(v) for v in values if fold(v)]
+    if not keys:
+        return None
+    if len(keys) == 1:
+        # anchored, case-sensitive prefix on a folded key -> index range scan
+        return {"$regex": "^" + re.escape(keys[0])}
+    return {"$in": keys}
+
+
+def _range(low, high) -> Optional[dict]:
+    bounds = {}
+    if low is not None:
+        bounds["$gte"] = low
+    if high is not None:
+        bounds["$lte"] = high
+    return bounds or None
+
+
+def build_search_query(
+    q: Optional[str] = None,
+    subject: Optional[List[str]] = None,
+    level: Optional[List[str]] = None,
+    mode: Optional[List[str]] = None,
+    address: Optional[str] = None,
+    salary_min: Optional[float] = None,
+    salary_max: Optional[float] = None,
+    sessions_min: Optional[int] = None,
+    sessions_max: Optional[int] = None,
+) -> dict:
+    """Mongo filter for the search params (combine with scope filters)."""
+    query = {}
+
+    q_tokens = tokenize(q)
+    if q_tokens:
+        query["search.tokens"] = {"$all": q_tokens}
+
+    address_tokens = tokenize(address)
+    if address_tokens:
+        query["search.address"] = {"$all": address_tokens}
+
+    for name, values in (("subject", subject), ("level", level), ("mode", mode)):
+        condition = _key_filter(values or [])
+        if condition:
+            query[f"search.{name}"] = condition
+
+    salary = _range(salary_min, salary_max)
+    if salary:
+        query["salary_amount"] = salary
+    sessions = _range(sessions_min, sessions_max)
+    if sessions:
+        query["sessions_per_week"] = sessions
+
+    return query
+
+
+# folded key -> display value ("toan" -> "Toán"), per facet; values rarely change
+_facet_labels: Dict[str, Dict[str, str]] = {name: {} for name in FACET_FIELDS}
+
+
+async def _facet_label(query: dict, name: str, key: str) -> str:
+    labels = _facet_labels[name]
+    if key not in labels:
+        post = await posts_collection.find_one({**query, f"search.{name}": key}, {name: 1})
+        labels[key] = (post or {}).get(name) or key
+    return labels[key]
+
+
+async def _count_facets(query: dict) -> Dict:
+    # only search.* keys after the $match: the index on
+    # (post_status, search.subject, search.level, search.mode) covers it
+    # for scope=all, no document is fetched
+    facets = {
+        name: [
+            {"$group": {"_id": f"$search.{name}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+        for name in FACET_FIELDS
+    }
+    facets["total"] = [{"$count": "count"}]
+
+    rows = await posts_collection.aggregate([
+        {"$match": query},
+        {"$project": {"_id": 0, **{f"search.{name}": 1 for name in FACET_FIELDS}}},
+        {"$facet": facets},
+    ]).to_list(length=None)
+    row = rows[0] if rows else {}
+
+    total = row.get("total") or [{"count": 0}]
+    result = {"total": total[0]["count"], "facets": {}}
+    for name in FACET_FIELDS:
+        buckets = [b for b in row.get(name, []) if b["_id"] is not None]
+        result["facets"][name] = [
+            {"key": b["_id"], "value": await _facet_label(query, name, b["_id"]), "count": b["count"]}
+            for b in buckets
+        ]
+    return result
+
+
+async def facet_counts(query: dict) -> Dict:
+    """Total + per subject/level/mode counts for `query`, cached per filter set.
+
+    Cached in the response cache under POSTS_TAG, which every post write
+    (post-service, payments) already invalidates.
+    """
+    if not response_cache.enabled or CACHE_TTL_POST_FACETS <= 0:
+        return await _count_facets(query)
+    key = "post-facets:" + json.dumps(query, sort_keys=True, default=str, ensure_ascii=False)
+    counts, _ = await response_cache.get_or_build(
+        key, lambda: _count_facets(query), CACHE_TTL_POST_FACETS, [POSTS_TAG]
+    )
+    return counts
+
+
+# ============================================
+# BACKFILL
+# ============================================
+async def backfill_search_fields(batch_size: int = 500) -> int:
+    """(Re)build `search` on posts indexed by an older SEARCH_VERSION."""
+    updated = 0
+    ops = []
+    projection = {name: 1 for name in TEXT_FIELDS + FACET_FIELDS}
+    async for post in posts_collection.find({"search.v": {"$ne": SEARCH_VERSION}}, projection):
+        ops.append(UpdateOne({"_id": post["_id"]}, {"$set": {"search": build_search_fields(post)}}))
+        if len(ops) >= batch_size:
+            await posts_collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        await posts_collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    return updated
+
+
+async def ensure_post_search_fields() -> None:
+    """Startup hook: backfill only when the stored search version is behind."""
+    versions = db[SCHEMA_VERSIONS_COLLECTION]
+
+    async def up_to_date() -> bool:
+        current = await versions.find_one({"_id": SEARCH_VERSION_DOC_ID})
+        return bool(current) and current.get("version", 0) >= SEARCH_VERSION
+
+    if await up_to_date():
+        return
+
+    # one post-service worker backfills, the others wait for it
+    async with mongo_lock("post_search_backfill", ttl_seconds=600, wait_seconds=600):
+        if await up_to_date():
+            return
+        updated = await backfill_search_fields()
+        await versions.update_one(
+            {"_id": SEARCH_VERSION_DOC_ID},
+            {"$max": {"version": SEARCH_VERSION}},
+            upsert=True,
+        )
+    logger.info("Post search fields backfilled (version %s, %s posts)", SEARCH_VERSION, updated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post search fields")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    print(f"{asyncio.run(backfill_search_fields())} posts re-indexed")
+
+
+if __name__ == "__main__":
+    main()
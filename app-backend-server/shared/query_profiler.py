@@ -0,0 +1,451 @@
+# shared/query_profiler.py
+"""
+Slow-query profiler built on pymongo command monitoring.
+
+    app = FastAPI(...)
+    setup_query_profiler(app, "post-service")   # flush loop (startup / shutdown hooks)
+
+`QueryProfiler` (a CommandListener registered on the client in
+shared/database.py) records every command: namespace, duration and the
+redacted *shape* of its filter, values replaced by "?" but operators and
+field order kept:
+
+    find tutor_db.posts {"filter": {"post_status": "?", "search.tokens": {"$all": "?"}}, "sort": {"_id": -1}}
+
+Per-shape counters (count, total / max ms, commands over
+SLOW_QUERY_THRESHOLD_MS) stay in memory and are flushed every
+QUERY_STATS_FLUSH_INTERVAL_SECONDS into `query_stats`, one document per
+service, shape and hour, expiring after QUERY_STATS_RETENTION_SECONDS: that
+is the rolling window `top_slow_queries()` (auth-service
+GET /admin/slow-queries) ranks across every service and worker.
+
+A shape over the threshold gets its plan captured with
+`explain` (queryPlanner: the query is not run again), at most once per
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, into `query_plans`, flagged
+COLLSCAN / IN_MEMORY_SORT; unanchored `$regex` filters are flagged
+UNANCHORED_REGEX from the shape alone.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne, monitoring
+
+from shared.config import (
+    QUERY_PROFILER_ENABLED,
+    QUERY_STATS_FLUSH_INTERVAL_SECONDS,
+    QUERY_STATS_MAX_SHAPES,
+    QUERY_STATS_WINDOW_SECONDS,
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS,
+    SLOW_QUERY_THRESHOLD_MS,
+)
+from shared.logger import get_logger
+from shared.metrics import IGNORED_MONGO_COMMANDS, command_collection
+
+logger = get_logger("query_profiler")
+
+QUERY_STATS_COLLECTION = "query_stats"
+QUERY_PLANS_COLLECTION = "query_plans"
+# the profiler's own writes, and explain itself, are not profiled
+PROFILER_COLLECTIONS = {QUERY_STATS_COLLECTION, QUERY_PLANS_COLLECTION}
+UNPROFILED_COMMANDS = IGNORED_MONGO_COMMANDS | {"explain", "killcursors", "aborttransaction", "committransaction"}
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# driver / session fields that explain does not accept
+UNEXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+MAX_EXPLAIN_QUEUE = 100
+
+SORT_FIELDS = ("max_ms", "total_ms", "avg_ms", "slow_count", "count")
+
+
+# ============================================
+# SHAPES
+# ============================================
+def _regex_pattern(value) -> Optional[str]:
+    pattern = getattr(value, "pattern", None)  # re.Pattern / bson Regex
+    if isinstance(pattern, (str, bytes)):
+        return pattern if isinstance(pattern, str) else pattern.decode(errors="replace")
+    return None
+
+
+def _anchored(pattern: str) -> bool:
+    return pattern.startswith("^") or pattern.startswith("\\A")
+
+
+def redact(value, flags: set):
+    """Filter with every value replaced by "?" (operators and field names kept)."""
+    if isinstance(value, dict):
+        shape = {}
+        for key, item in value.items():
+            if key == "$regex":
+                pattern = _regex_pattern(item) or (item if isinstance(item, str) else "")
+                if not _anchored(pattern):
+                    flags.add("UNANCHORED_REGEX")
+                shape[key] = "?"
+            elif key == "$options":
+                continue
+            elif key in ("$and", "$or", "$nor") and isinstance(item, list):
+                shape[key] = [redact(clause, flags) for clause in item]
+            elif key in ("$elemMatch", "$not") or (not key.startswith("$") and isinstance(item, dict)):
+                shape[key] = redact(item, flags)
+            else:
+                pattern = _regex_pattern(item)
+                if pattern is not None:
+                    if not _anchored(pattern):
+                        flags.add("UNANCHORED_REGEX")
+                    shape[key] = {"$regex": "?"}
+                else:
+                    shape[key] = "?"
+        return shape
+    return "?"
+
+
+def _pipeline_shape(pipeline, flags: set) -> list:
+    shape = []
+    for stage in pipeline if isinstance(pipeline, list) else []:
+        for name, body in stage.items():
+            if name == "$match":
+                shape.append({name: redact(body, flags)})
+            elif name == "$sort":
+                shape.append({name: dict(body)})
+            elif name == "$facet" and isinstance(body, dict):
+                shape.append({name: {k: _pipeline_shape(v, flags) for k, v in body.items()}})
+            else:
+                shape.append({name: "…"})
+    return shape
+
+
+def query_shape(command_name: str, command) -> Tuple[dict, set]:
+    """(redacted shape, flags) of a command: what makes two queries "the same query"."""
+    flags: set = set()
+    if command_name == "find":
+        shape = {"filter": redact(command.get("filter", {}), flags)}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+    elif command_name == "aggregate":
+        shape = {"pipeline": _pipeline_shape(command.get("pipeline"), flags)}
+    elif command_name == "count":
+        shape = {"query": redact(command.get("query", {}), flags)}
+    elif command_name == "distinct":
+        shape = {"key": command.get("key"), "query": redact(command.get("query", {}), flags)}
+    elif command_name == "findAndModify":
+        shape = {"query": redact(command.get("query", {}), flags)}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+    elif command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        shape = {"q": redact(statements[0].get("q", {}), flags)}
+    else:
+        shape = {}
+    return shape, flags
+
+
+def shape_id(service: str, namespace: str, command_name: str, shape_json: str) -> str:
+    digest = hashlib.sha1(f"{namespace}|{command_name}|{shape_json}".encode()).hexdigest()[:16]
+    return f"{service}:{digest}"
+
+
+def explain_command(command_name: str, command) -> dict:
+    """The command to explain: session fields dropped, one statement for update / delete."""
+    cmd = {k: v for k, v in command.items() if not k.startswith("$") and k not in UNEXPLAINABLE_FIELDS}
+    if command_name == "update":
+        cmd["updates"] = cmd.get("updates", [])[:1]
+    elif command_name == "delete":
+        cmd["deletes"] = cmd.get("deletes", [])[:1]
+    return cmd
+
+
+# ============================================
+# PLANS
+# ============================================
+def _winning_plans(node, found: list) -> list:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan" and isinstance(value, dict):
+                # SBE (MongoDB >= 5.1) nests the classic tree under queryPlan
+                found.append(value.get("queryPlan", value))
+            else:
+                _winning_plans(value, found)
+    elif isinstance(node, list):
+        for item in node:
+            _winning_plans(item, found)
+    return found
+
+
+def _stages(plan: dict, out: list) -> list:
+    out.append(plan)
+    for child in plan.get("inputStages", []) or []:
+        _stages(child, out)
+    if isinstance(plan.get("inputStage"), dict):
+        _stages(plan["inputStage"], out)
+    return out
+
+
+def summarize_plan(explain: dict) -> dict:
+    """{"stages": "LIMIT <- FETCH <- IXSCAN", "indexes": [...], "flags": [...]} of an explain result."""
+    stages, indexes, flags = [], [], set()
+    for plan in _winning_plans(explain, []):
+        for stage in _stages(plan, []):
+            name = stage.get("stage", "?")
+            stages.append(name)
+            if name == "COLLSCAN":
+                flags.add("COLLSCAN")
+            if name == "SORT":
+                flags.add("IN_MEMORY_SORT")
+            if stage.get("indexName") and stage["indexName"] not in indexes:
+                indexes.append(stage["indexName"])
+    return {"stages": " <- ".join(stages), "indexes": indexes, "flags": sorted(flags)}
+
+
+# ============================================
+# LISTENER
+# ============================================
+class QueryProfiler(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, max_shapes: int = QUERY_STATS_MAX_SHAPES):
+        self.service = "unknown"
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        # listener callbacks run on driver threads
+        self._lock = threading.Lock()
+        # (connection, request_id) -> (key, meta, database, command to explain)
+        self._pending = {}
+        # key -> stats since the last flush
+        self._stats: Dict[str, dict] = {}
+        self._explain_queue = deque(maxlen=MAX_EXPLAIN_QUEUE)
+        self._explained_at: Dict[str, float] = {}
+        self.dropped = 0
+
+    def started(self, event):
+        name = event.command_name
+        if not QUERY_PROFILER_ENABLED or name.lower() in UNPROFILED_COMMANDS:
+            return
+        collection = command_collection(name, event.command)
+        if collection in PROFILER_COLLECTIONS:
+            return
+        shape, flags = query_shape(name, event.command)
+        shape_json = json.dumps(shape, ensure_ascii=False, default=str)
+        namespace = f"{event.database_name}.{collection}"
+        meta = {"namespace": namespace, "command": name, "shape": shape_json, "flags": flags}
+        explainable = event.command if name in EXPLAINABLE_COMMANDS else None
+        key = shape_id(self.service, namespace, name, shape_json)
+        self._pending[(event.connection_id, event.request_id)] = (key, meta, event.database_name, explainable)
+
+    def _finished(self, event, failed: bool):
+        item = self._pending.pop((event.connection_id, event.request_id), None)
+        if item is None:
+            return
+        key, meta, database_name, explainable = item
+        duration_ms = event.duration_micros / 1000
+        slow = duration_ms >= self.threshold_ms
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_shapes:
+                    self.dropped += 1
+                    return
+                stats = self._stats[key] = {**meta, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow_count": 0, "failures": 0}
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["slow_count"] += slow
+            stats["failures"] += failed
+
+            if slow and explainable is not None and SLOW_QUERY_EXPLAIN:
+                now = time.monotonic()
+                last = self._explained_at.get(key)
+                if last is None or now - last >= SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS:
+                    self._explained_at[key] = now
+                    self._explain_queue.append((key, meta, database_name, explain_command(meta["command"], explainable), duration_ms))
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+    def drain(self):
+        """(stats since the last call, queued explains)."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            explains = list(self._explain_queue)
+            self._explain_queue.clear()
+        return stats, explains
+
+
+profiler = QueryProfiler()
+
+
+# ============================================
+# FLUSH (stats -> query_stats, explains -> query_plans)
+# ============================================
+def _window_start(now: datetime) -> datetime:
+    seconds = int(now.timestamp()) // QUERY_STATS_WINDOW_SECONDS * QUERY_STATS_WINDOW_SECONDS
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+async def flush_query_stats() -> int:
+    """Write what was recorded since the last flush; returns the number of shapes written."""
+    from shared.database import client, db
+
+    stats, explains = profiler.drain()
+    now = datetime.now(timezone.utc)
+    window = _window_start(now)
+
+    if stats:
+        ops = [
+            UpdateOne(
+                {"_id": f"{key}:{int(window.timestamp())}"},
+                {
+                    "$inc": {k: s[k] for k in ("count", "total_ms", "slow_count", "failures")},
+                    "$max": {"max_ms": s["max_ms"]},
+                    "$set": {"last_seen": now},
+                    "$addToSet": {"flags": {"$each": sorted(s["flags"])}},
+                    "$setOnInsert": {
+                        "shape_id": key,
+                        "service": profiler.service,
+                        "namespace": s["namespace"],
+                        "command": s["command"],
+                        "shape": s["shape"],
+                        "window_start": window,
+                    },
+                },
+                upsert=True,
+            )
+            for key, s in stats.items()
+        ]
+        await db[QUERY_STATS_COLLECTION].bulk_write(ops, ordered=False)
+
+    for key, meta, database_name, command, duration_ms in explains:
+        try:
+            result = await client[database_name].command({"explain": command, "verbosity": "queryPlanner"})
+        except Exception as e:
+            logger.warning("explain failed for %s %s: %s", meta["command"], meta["namespace"], e)
+            continue
+        plan = summarize_plan(result)
+        await db[QUERY_PLANS_COLLECTION].replace_one(
+            {"_id": key},
+            {
+                "service": profiler.service,
+                "namespace": meta["namespace"],
+                "command": meta["command"],
+                "shape": meta["shape"],
+                "plan": plan,
+                "flags": sorted(set(plan["flags"]) | meta["flags"]),
+                "sample_ms": round(duration_ms, 2),
+                "explained_at": now,
+            },
+            upsert=True,
+        )
+        if "COLLSCAN" in plan["flags"]:
+            logger.warning("Slow COLLSCAN (%.0f ms): %s %s %s", duration_ms, meta["command"], meta["namespace"], meta["shape"])
+    return len(stats)
+
+
+async def run_query_profiler(interval: float = QUERY_STATS_FLUSH_INTERVAL_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_query_stats()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Query stats flush failed: %s", e)
+
+
+def setup_query_profiler(app, service_name: str) -> None:
+    """Attribute this process's commands to `service_name` and flush them periodically."""
+    profiler.service = service_name
+    if not QUERY_PROFILER_ENABLED:
+        return
+    state = {}
+
+    async def start():
+        state["task"] = asyncio.create_task(run_query_profiler())
+
+    async def stop():
+        task = state.pop("task", None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        try:
+            await flush_query_stats()
+        except Exception as e:
+            logger.warning("Final query stats flush failed: %s", e)
+
+    app.on_event("startup")(start)
+    app.on_event("shutdown")(stop)
+
+
+# ============================================
+# READ (admin endpoint)
+# ============================================
+async def top_slow_queries(
+    limit: int = 20,
+    sort: str = "max_ms",
+    service: Optional[str] = None,
+    hours: float = 24,
+) -> List[dict]:
+    """Top `limit` shapes of the last `hours` across every worker, with their captured plan."""
+    from shared.database import db
+
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of {SORT_FIELDS}")
+    match = {"window_start": {"$gte": _window_start(datetime.now(timezone.utc) - timedelta(hours=hours))}}
+    if service:
+        match["service"] = service
+
+    rows = await db[QUERY_STATS_COLLECTION].aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": "$shape_id",
+            "service": {"$first": "$service"},
+            "namespace": {"$first": "$namespace"},
+            "command": {"$first": "$command"},
+            "shape": {"$first": "$shape"},
+            "count": {"$sum": "$count"},
+            "total_ms": {"$sum": "$total_ms"},
+            "max_ms": {"$max": "$max_ms"},
+            "slow_count": {"$sum": "$slow_count"},
+            "failures": {"$sum": "$failures"},
+            "flags": {"$addToSet": "$flags"},
+            "last_seen": {"$max": "$last_seen"},
+        }},
+        {"$addFields": {"avg_ms": {"$divide": ["$total_ms", {"$max": ["$count", 1]}]}}},
+        {"$sort": {sort: -1}},
+        {"$limit": limit},
+    ]).to_list(length=limit)
+
+    plans = {}
+    if rows:
+        async for plan in db[QUERY_PLANS_COLLECTION].find({"_id": {"$in": [r["_id"] for r in rows]}}):
+            plans[plan["_id"]] = plan
+
+    result = []
+    for row in rows:
+        plan = plans.get(row["_id"])
+        flags = {flag for group in row["flags"] for flag in group or ()}
+        if plan:
+            flags.update(plan.get("flags", []))
+        result.append({
+            "id": row["_id"],
+            "service": row["service"],
+            "namespace": row["namespace"],
+            "command": row["command"],
+            "shape": row["shape"],
+            "count": row["count"],
+            "slow_count": row["slow_count"],
+            "failures": row["failures"],
+            "avg_ms": round(row["avg_ms"], 2),
+            "max_ms": round(row["max_ms"], 2),
+            "total_ms": round(row["total_ms"], 2),
+            "flags": sorted(flags),
+            "plan": plan.get("plan") if plan else None,
+            "explained_at": plan.get("explained_at") if plan else None,
+            "last_seen": row["last_seen"],
+        })
+    return result
@@ -0,0 +1,106 @@
+# shared/rating_stats.py
+"""
+Materialized per-tutor rating aggregates.
+
+rating-service keeps one `rating_summaries` document per tutor
+({_id: tutor_id, rating_sum, rating_count}) up to date with `$inc` on every
+add/update/delete, so profile reads are a single `_id` lookup instead of a
+`$group` over `ratings`. `reconcile_rating_summaries()` rebuilds them from
+`ratings` to repair drift (run periodically by rating-service, or via
+`python -m shared.rating_stats reconcile`).
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne
+
+from shared.database import ratings_collection, rating_summaries_collection
+from shared.logger import get_logger
+
+logger = get_logger("rating_stats")
+
+
+def summary_to_stats(summary) -> dict:
+    count = int(summary.get("rating_count", 0)) if summary else 0
+    if count <= 0:
+        return {"avg_rating": None, "rating_count": 0}
+    return {
+        "avg_rating": round(float(summary.get("rating_sum", 0)) / count, 2),
+        "rating_count": count,
+    }
+
+
+async def apply_rating_delta(tutor_id, sum_delta: int, count_delta: int) -> None:
+    await rating_summaries_collection.update_one(
+        {"_id": ObjectId(tutor_id)},
+        {
+            "$inc": {"rating_sum": sum_delta, "rating_count": count_delta},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
+    )
+
+
+async def get_rating_stats(tutor_id) -> dict:
+    summary = await rating_summaries_collection.find_one({"_id": ObjectId(tutor_id)})
+    return summary_to_stats(summary)
+
+
+async def get_rating_stats_many(tutor_ids: Iterable) -> Dict[str, dict]:
+    """Stats for many tutors with one `$in` query, keyed by str(tutor_id)."""
+    oids = list({ObjectId(t) for t in tutor_ids})
+    stats = {str(oid): summary_to_stats(None) for oid in oids}
+    if not oids:
+        return stats
+
+    async for summary in rating_summaries_collection.find({"_id": {"$in": oids}}):
+        stats[str(summary["_id"])] = summary_to_stats(summary)
+    return stats
+
+
+async def reconcile_rating_summaries() -> int:
+    """Rebuild every summary from `ratings`; returns the number of writes."""
+    now = datetime.now(timezone.utc)
+    truth = {}
+    async for row in ratings_collection.aggregate([
+        {"$group": {"_id": "$tutor_id", "sum": {"$sum": "$rating"}, "count": {"$sum": 1}}}
+    ]):
+        if row["_id"] is not None:
+            truth[row["_id"]] = (int(row["sum"]), int(row["count"]))
+
+    ops = []
+    async for summary in rating_summaries_collection.find({}):
+        expected = truth.pop(summary["_id"], None)
+        if expected is None:
+            ops.append(DeleteOne({"_id": summary["_id"]}))
+        elif (summary.get("rating_sum"), summary.get("rating_count")) != expected:
+            ops.append(ReplaceOne(
+                {"_id": summary["_id"]},
+                {"rating_sum": expected[0], "rating_count": expected[1], "updated_at": now},
+            ))
+
+    for tutor_id, (rating_sum, rating_count) in truth.items():
+        ops.append(ReplaceOne(
+            {"_id": tutor_id},
+            {"rating_sum": rating_sum, "rating_count": rating_count, "updated_at": now},
+            upsert=True,
+        ))
+
+    if ops:
+        await rating_summaries_collection.bulk_write(ops, ordered=False)
+        logger.info("Reconciled %s rating summaries", len(ops))
+    return len(ops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialized tutor rating aggregates")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.parse_args()
+    print(f"{asyncio.run(reconcile_rating_summaries())} summaries repaired")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# shared/response_cache.py
+"""
+Response cache for read-mostly GET endpoints.
+
+Two tiers: an in-process LRU (per worker) and, with RESPONSE_CACHE_REDIS_URL,
+a Redis tier shared by every replica. Entries are the serialized JSON body +
+selected headers, keyed by path and query string, with a per-route TTL and a
+set of tags:
+
+    @app.get("/{post_id}")
+    async def get_post_detail(post_id: str, request: Request, response: Response, ...):
+        await get_current_user(token, users_collection)     # auth is never cached
+        return await cached_response(
+            request, response, lambda: load_post(post_id),
+            ttl=CACHE_TTL_POST_DETAIL, tags=[post_tag(post_id)],
+        )
+
+Every response carries an ETag; `If-None-Match` with the current ETag gets
+304. Write handlers call `await invalidate_tags(...)`: local entries are
+dropped at once, Redis entries are deleted and the tag is published so the
+other processes drop their local copies too. Without Redis, other workers
+only catch up when their TTL expires, so keep TTLs short.
+
+Redis is optional (`pip install redis`); any Redis error falls back to the
+local tier.
+
+Other per-process caches can ride on the same invalidation channel with
+`response_cache.add_tag_listener(callback)`: the callback gets every tag
+invalidated here or published by another process (None when the listener
+reconnected and may have missed some), e.g. shared.auth's user cache.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from shared.config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_REDIS_URL
+from shared.logger import get_logger
+
+logger = get_logger("response_cache")
+
+CACHE_STATUS_HEADER = "X-Cache"
+# headers set by the handler (on the injected Response) that are part of the entry
+CACHED_HEADERS = ("x-next-cursor",)
+REDIS_KEY_PREFIX = "rc:"
+REDIS_TAG_PREFIX = "rctag:"
+# tag -> keys sets outlive their entries; deleting an expired key is a no-op
+REDIS_TAG_TTL_SECONDS = 24 * 3600
+INVALIDATION_CHANNEL = "rc:invalidate"
+
+
+# ============================================
+# TAGS (shared by readers and the services that write the data)
+# ============================================
+POSTS_TAG = "posts"  # every post list
+
+
+def post_tag(post_id) -> str:
+    return f"post:{post_id}"
+
+
+def post_tags(post_id) -> List[str]:
+    """To invalidate when a post changes: its detail and every post list."""
+    return [POSTS_TAG, post_tag(post_id)]
+
+
+def tutor_ratings_tag(tutor_id) -> str:
+    return f"ratings:tutor:{tutor_id}"
+
+
+def user_certificates_tag(user_id) -> str:
+    return f"certificates:user:{user_id}"
+
+
+def user_tag(user_id) -> str:
+    """A user document (role, status, profile): see shared.auth.invalidate_user."""
+    return f"user:{user_id}"
+
+
+# ============================================
+# LOCAL TIER (LRU, per-entry TTL, tag index)
+# ============================================
+class LocalTier:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple[float, dict, tuple]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        # bumped on invalidation: a response built before it is not stored
+        self._versions: Dict[str, int] = {}
+
+    def get(self, key: str) -> Optional[dict]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, entry, _ = item
+        if expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: dict, ttl: float, tags: Iterable[str]) -> None:
+        if self.maxsize <= 0:
+            return
+        tags = tuple(tags)
+        self._drop(key)
+        self._data[key] = (time.monotonic() + ttl, entry, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.maxsize:
+            self._drop(next(iter(self._data)))
+
+    def versions(self, tags: Iterable[str]) -> tuple:
+        return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def invalidate_tag(self, tag: str) -> None:
+        self._versions[tag] = self._versions.get(tag, 0) + 1
+        for key in list(self._tags.pop(tag, ())):
+            self._drop(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._tags.clear()
+
+    def _drop(self, key: str) -> None:
+        item = self._data.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# ============================================
+# CACHE
+# ============================================
+class ResponseCache:
+    def __init__(self, maxsize: int, redis_url: Optional[str] = None, enabled: bool = True):
+        self.enabled = enabled
+        self.local = LocalTier(maxsize)
+        self.redis_url = redis_url
+        self._redis = None
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tag_listeners: List[Callable[[Optional[str]], None]] = []
+
+    def add_tag_listener(self, callback: Callable[[Optional[str]], None]) -> None:
+        self._tag_listeners.append(callback)
+
+    def _invalidate_local(self, tag: Optional[str]) -> None:
+        if tag is None:
+            self.local.clear()
+        else:
+            self.local.invalidate_tag(tag)
+        for callback in self._tag_listeners:
+            try:
+                callback(tag)
+            except Exception as e:
+                logger.warning("Cache tag listener failed for %s: %s", tag, e)
+
+    def _redis_client(self):
+        if self._redis is None and self.redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError:  # optional dependency
+                logger.warning("RESPONSE_CACHE_REDIS_URL is set but redis is not installed, using the local tier only")
+                self.redis_url = None
+                return None
+            self._redis = redis.from_url(self.redis_url)
+        return self._redis
+
+    # ---- lifecycle ----
+    async def startup(self) -> None:
+        """Listen for invalidations published by other processes (Redis only)."""
+        if self.enabled and self._redis_client() is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def shutdown(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._invalidate_local(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation listener failed (%s), resubscribing", e)
+                # entries may have been missed while disconnected
+                self._invalidate_local(None)
+                await asyncio.sleep(1)
+
+    # ---- entries ----
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self.local.get(key)
+        if entry is not None or self._redis_client() is None:
+            return entry
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.get(REDIS_KEY_PREFIX + key)
+                pipe.ttl(REDIS_KEY_PREFIX + key)
+                raw, ttl = await pipe.execute()
+            if raw is None:
+                return None
+            entry = json.loads(raw)
+            if ttl and ttl > 0:
+                self.local.set(key, entry, ttl, entry.get("tags", ()))
+            return entry
+        except Exception as e:
+            logger.warning("Redis cache read failed: %s", e)
+            return None
+
+    async def set(self, key: str, entry: dict, ttl: int, tags: List[str]) -> None:
+        self.local.set(key, entry, ttl, tags)
+        if self._redis_client() is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.set(REDIS_KEY_PREFIX + key, json.dumps(entry), ex=ttl)
+                for tag in tags:
+                    pipe.sadd(REDIS_TAG_PREFIX + tag, key)
+                    pipe.expire(REDIS_TAG_PREFIX + tag, REDIS_TAG_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning("Redis cache write failed: %s", e)
+
+    async def invalidate(self, tags: Iterable[str]) -> None:
+        tags = list(tags)
+        for tag in tags:
+            self._invalidate_local(tag)
+        if not self.enabled or self._redis_client() is None:
+            return
+        try:
+            for tag in tags:
+                keys = await self._redis.smembers(REDIS_TAG_PREFIX + tag)
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    if keys:
+                        pipe.delete(*[REDIS_KEY_PREFIX + k.decode() for k in keys])
+                    pipe.delete(REDIS_TAG_PREFIX + tag)
+                    pipe.publish(INVALIDATION_CHANNEL, tag)
+                    await pipe.execute()
+        except Exception as e:
+            logger.warning("Redis cache invalidation failed: %s", e)
+
+    async def get_or_build(self, key: str, build: Callable[[], Awaitable[dict]], ttl: int, tags: List[str]):
+        """(entry, hit). Concurrent misses on a key share one build."""
+        entry = await self.get(key)
+        if entry is not None:
+            return entry, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            versions = self.local.versions(tags)
+            entry = await build()
+            # invalidated while building: serve it, but do not keep it
+            if self.local.versions(tags) == versions:
+                await self.set(key, entry, ttl, tags)
+            future.set_result(entry)
+            return entry, False
+        except BaseException as e:
+            future.set_exception(e)
+            # nobody else may be awaiting it
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_REDIS_URL, enabled=RESPONSE_CACHE_ENABLED)
+
+
+# ============================================
+# HELPERS FOR ROUTES
+# ============================================
+def _cache_key(request: Request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_response(
+    request: Request,
+    response: Response,
+    build: Callable[[], Awaitable[Any]],
+    ttl: int,
+    tags: Iterable[str] = (),
+    key: Optional[str] = None,
+) -> Response:
+    """Serve `build()` (a model / list of models) from the cache.
+
+    Only successful results are cached: HTTPException from `build` passes
+    through. Headers in CACHED_HEADERS that `build` sets on `response` are
+    stored with the body. `key` defaults to path + query string (pass one for
+    POST reads whose parameters are in the body).
+    """
+    tags = list(tags)
+
+    async def build_entry() -> dict:
+        body = json.dumps(jsonable_encoder(await build()), ensure_ascii=False, separators=(",", ":"))
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+        return {"body": body, "etag": etag, "headers": headers, "tags": tags}
+
+    if response_cache.enabled and ttl > 0:
+        entry, hit = await response_cache.get_or_build(key or _cache_key(request), build_entry, ttl, tags)
+    else:
+        entry, hit = await build_entry(), False
+
+    headers = {
+        **entry["headers"],
+        "ETag": entry["etag"],
+        # authenticated data: browsers may keep it but must revalidate
+        "Cache-Control": "private, no-cache",
+        CACHE_STATUS_HEADER: "HIT" if hit else "MISS",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Call after a write; never raises."""
+    try:
+        await response_cache.invalidate(tags)
+    except Exception as e:
+        logger.warning("Cache invalidation failed for %s: %s", tags, e)
@@ -0,0 +1,221 @@
+# shared/tracing.py
+"""
+OpenTelemetry tracing shared by every service.
+
+    app = FastAPI(...)
+    setup_metrics(app)
+    setup_tracing(app, "post-service")      # outermost middleware
+
+Spans:
+    - one SERVER span per request ("GET /api/post/{post_id}"), continuing the
+      trace of an incoming `traceparent` (set by the gateway, see nginx.conf);
+      the trace id is returned in X-Trace-Id to look a slow request up
+    - one CLIENT span per Mongo command ("find posts"), from a pymongo
+      CommandListener registered in shared/database.py; only inside an
+      existing trace, so background polling does not start traces of its own
+    - explicit spans: `with start_span("payment.run", {"payment.kind": kind}):`
+      or `@traced("payment.debit")`
+    - outbox messages carry the context of the request that enqueued them
+      (inject_context / extract_context), so the email-service worker and its
+      Gmail calls land in the same trace
+
+TRACING_EXPORTER=none (default) installs no SDK: every span is a no-op.
+"""
+import functools
+import os
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from pymongo import monitoring
+
+from shared.config import TRACING_EXPORTER, TRACING_SAMPLE_RATIO, TRACING_FILE_PATH
+from shared.logger import get_logger
+from shared.metrics import IGNORED_MONGO_COMMANDS, METRICS_PATH, command_collection, route_label
+
+logger = get_logger("tracing")
+
+TRACING_ENABLED = TRACING_EXPORTER != "none"
+TRACE_ID_HEADER = "X-Trace-Id"
+# polled by healthchecks / Prometheus: not worth a trace each
+UNTRACED_ROUTE_SUFFIXES = ("/health", METRICS_PATH)
+
+tracer = trace.get_tracer("tutor")
+_provider = None
+
+
+# ============================================
+# PROVIDER
+# ============================================
+def _exporter():
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+    if TRACING_EXPORTER == "file":
+        out = open(TRACING_FILE_PATH, "a", buffering=1, encoding="utf-8")
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    if TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER: {TRACING_EXPORTER}")
+
+
+def init_tracing(service_name: str) -> None:
+    """Install the SDK tracer provider for this process (once)."""
+    global _provider
+    if not TRACING_ENABLED or _provider is not None:
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name, "process.pid": os.getpid()}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATIO)),
+    )
+    _provider.add_span_processor(BatchSpanProcessor(_exporter()))
+    trace.set_tracer_provider(_provider)
+    logger.info("Tracing enabled (%s, sample ratio %s)", TRACING_EXPORTER, TRACING_SAMPLE_RATIO)
+
+
+def shutdown_tracing() -> None:
+    """Flush buffered spans (shutdown hook)."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def setup_tracing(app, service_name: str) -> None:
+    init_tracing(service_name)
+    if not TRACING_ENABLED:
+        return
+    # recent FastAPI versions open their own server span once a provider is
+    # installed (FastAPI(telemetry=...)); TracingMiddleware is the one span on
+    # every version, so turn the built-in one off instead of doubling it
+    native = getattr(app, "_telemetry", None)
+    if isinstance(native, dict):
+        native["tracing"] = False
+    app.add_middleware(TracingMiddleware)
+    app.on_event("shutdown")(shutdown_tracing)
+
+
+# ============================================
+# SPANS
+# ============================================
+@contextmanager
+def start_span(name: str, attributes: Optional[dict] = None, kind: SpanKind = SpanKind.INTERNAL, context=None):
+    """Child span of the current one (or of `context`); exceptions are recorded and re-raised."""
+    with tracer.start_as_current_span(name, context=context, kind=kind, attributes=attributes) as span:
+        yield span
+
+
+def traced(name: str):
+    """Decorator for async functions: one span per call."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject_context() -> Dict[str, str]:
+    """W3C trace context of the current span, to store with queued work."""
+    carrier: Dict[str, str] = {}
+    if TRACING_ENABLED:
+        propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(carrier: Optional[Dict[str, str]]):
+    return propagate.extract(carrier or {})
+
+
+# ============================================
+# HTTP SERVER SPANS
+# ============================================
+class TracingMiddleware:
+    """ASGI middleware: SERVER span per request, parent taken from traceparent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = route_label(scope)
+        if route.endswith(UNTRACED_ROUTE_SUFFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        method = scope["method"]
+        with tracer.start_as_current_span(
+            f"{method} {route}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.request.method": method,
+                "http.route": route,
+                "url.path": scope.get("root_path", "") + scope.get("path", ""),
+            },
+        ) as span:
+            trace_id = format(span.get_span_context().trace_id, "032x")
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    span.set_attribute("http.response.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (TRACE_ID_HEADER.lower().encode(), trace_id.encode()),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_traced)
+
+
+# ============================================
+# MONGO CLIENT SPANS
+# ============================================
+class MongoTracingListener(monitoring.CommandListener):
+    def __init__(self):
+        # (connection, request_id) -> span; started/finished come in pairs
+        self._spans = {}
+
+    def started(self, event):
+        if not TRACING_ENABLED or event.command_name.lower() in IGNORED_MONGO_COMMANDS:
+            return
+        if not trace.get_current_span().get_span_context().is_valid:
+            return
+        collection = command_collection(event.command_name, event.command)
+        host, port = event.connection_id
+        self._spans[(event.connection_id, event.request_id)] = tracer.start_span(
+            f"{event.command_name} {collection}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "mongodb",
+                "db.namespace": event.database_name,
+                "db.collection.name": collection,
+                "db.operation.name": event.command_name,
+                "server.address": host,
+                "server.port": port,
+            },
+        )
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            failure = event.failure if isinstance(event.failure, dict) else {}
+            span.set_status(Status(StatusCode.ERROR, str(failure.get("errmsg", ""))))
+            span.end()
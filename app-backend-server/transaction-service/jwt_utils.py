@@ -1,38 +1,13 @@
 # jwt_utils.py
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from utilities import get_user_from_db
-
-SECRET_KEY = "your-super-secret-key"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 120
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-
-def create_access_token(data: dict, expires_delta=None):
-    from datetime import datetime, timedelta, timezone
-    to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+from fastapi import Depends
+from shared.auth import (
+    oauth2_scheme,
+    create_access_token,
+    get_current_principal,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+)
 
 async def get_current_user(token: str = Depends(oauth2_scheme), users_collection=None):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Token không hợp lệ",
-        headers={"WWW-Authenticate": "Bearer"}
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = get_user_from_db(username, users_collection)
-    if not user:
-        raise credentials_exception
-
-    return user
+    # Trusts the signed claims (id, role, status) -> no users lookup per request.
+    # users_collection is only used for legacy tokens that carry `sub` alone.
+    return await get_current_principal(token, users_collection)
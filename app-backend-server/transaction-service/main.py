@@ -1,13 +1,20 @@
 from typing import List, Optional, Literal
-from fastapi import FastAPI, HTTPException, Security, status, Query, Body, status
+from fastapi import FastAPI, HTTPException, Security, status, Query, Body, Response, Header
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
 from datetime import datetime, timezone, timedelta
 
 from shared.database import users_collection, posts_collection, transactions_collection, applications_collection
+from shared.indexes import ensure_indexes
+from shared.metrics import setup_metrics
+from shared.tracing import setup_tracing
+from shared.query_profiler import setup_query_profiler
+from shared.locks import mongo_lock
+from shared.idempotency import IdempotencyMiddleware
+from shared.pagination import fetch_page, set_next_cursor
 from models import TransactionModel, AddTransactionModel, AddApplicationPaymentModel
-import requests
-from shared.config import EMAIL_SERVICE_URL
+from shared.outbox import PARENT_NOTIFY_EMAIL
+from payments import execute_payment, init_payments, resume_pending_payments, PaymentError, POST_PAYMENT, APPLICATION_PAYMENT
 from jwt_utils import get_current_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -25,6 +32,48 @@ app = FastAPI(
     root_path="/api/transaction"
 )
 
+# Retried writes with the same Idempotency-Key replay the first response
+app.add_middleware(IdempotencyMiddleware, paths={"/add-transaction", "/pay-application"})
+
+# METRICS (shared/metrics.py)
+setup_metrics(app)
+
+# TRACING (shared/tracing.py)
+setup_tracing(app, "transaction-service")
+
+# SLOW QUERIES (shared/query_profiler.py)
+setup_query_profiler(app, "transaction-service")
+
+# INDEXES (idempotent, versioned registry in shared/indexes.py)
+@app.on_event("startup")
+async def startup_ensure_indexes():
+    await ensure_indexes()
+
+# PAYMENTS: transactions vs saga, then finish payments interrupted by a restart
+@app.on_event("startup")
+async def startup_payments():
+    await init_payments()
+    # one worker / replica resumes, the next ones find nothing left to do
+    async with mongo_lock("payments-resume"):
+        await resume_pending_payments()
+
+IDEMPOTENCY_KEY_HEADER = Header(
+    None,
+    alias="Idempotency-Key",
+    max_length=128,
+    description="Gửi lại cùng key khi retry: trả về giao dịch đã tạo thay vì trừ tiền lần nữa",
+)
+
+def to_transaction_model(t: dict) -> TransactionModel:
+    return TransactionModel(
+        id=str(t["_id"]),
+        post_id=str(t["post_id"]),
+        payer_id=str(t["payer_id"]),
+        amount_money=t["amount_money"],
+        transaction_status=t.get("transaction_status"),
+        created_at=t.get("created_at")
+    )
+
 # ==========================
 # ROUTE
 # ==========================
@@ -37,9 +86,11 @@ app = FastAPI(
     tags=["Transaction"]
 )
 async def get_transactions(
+    response: Response,
     token: str = Security(oauth2_scheme),
     skip: int = Query(0, ge=0, description="Số bản ghi bỏ qua"),
     limit: int = Query(10, ge=1, description="Số bản ghi trả về"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page (thay cho skip)."),
     transaction_status: Optional[str] = Query(None, description="Trạng thái giao dịch, bỏ trống để lấy tất cả")
 ):
     current_user = await get_current_user(token, users_collection)
@@ -51,8 +102,8 @@ async def get_transactions(
         query["transaction_status"] = transaction_status
 
     # Lấy dữ liệu
-    cursor = transactions_collection.find(query).skip(skip).limit(limit)
-    transaction_list = list(cursor)
+    transaction_list, next_cursor = await fetch_page(transactions_collection, query, limit, cursor=cursor, skip=skip)
+    set_next_cursor(response, next_cursor)
 
     if not transaction_list:
         raise HTTPException(status_code=404, detail="No transactions found")
@@ -88,13 +139,14 @@ async def get_transactions(
 )
 async def add_transaction(
     token: str = Security(oauth2_scheme),
-    input_data: AddTransactionModel = Body(...)
+    input_data: AddTransactionModel = Body(...),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER
 ):
     current_user = await get_current_user(token, users_collection)
     user_id = str(current_user.id)
 
     # Validate post_id
-    post = posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
+    post = await posts_collection.find_one({"_id": ObjectId(input_data.post_id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
@@ -108,59 +160,27 @@ async def add_transaction(
             detail="Only the creator of this post can create a transaction"
         )
     
-    # Không cho thanh toán nhiều lần
+    # Không cho thanh toán nhiều lần (kiểm tra lại atomically trong payments.py)
     if post.get("post_status") == "active":
         raise HTTPException(
             status_code=400,
             detail="This post is already active"
         )
 
-    # ---- CHECK BALANCE ----
-    user_data = users_collection.find_one({"_id": ObjectId(user_id)})
-
-    # nếu không có balance thì mặc định 0
-    balance = user_data.get("balance", 0)
-
-    if balance < input_data.amount_money:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Insufficient balance. Your balance: {balance}, required: {input_data.amount_money}"
+    # ---- PAYMENT: atomic debit + post update ----
+    try:
+        transaction = await execute_payment(
+            POST_PAYMENT,
+            payer_id=ObjectId(user_id),
+            post_id=post["_id"],
+            amount=input_data.amount_money,
+            idempotency_key=idempotency_key,
         )
-
-    # Trừ tiền user
-    new_balance = balance - input_data.amount_money
-
-    users_collection.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"balance": new_balance}}
-    )
-
-    new_transaction = {
-        "post_id": ObjectId(input_data.post_id),
-        "payer_id": ObjectId(user_id),
-        "amount_money": input_data.amount_money,
-        "transaction_status": "paid",
-        # Store timestamp in UTC (naive) so DB uses a consistent baseline
-        "created_at": datetime.utcnow()
-    }
-
-    result = transactions_collection.insert_one(new_transaction)
-
-    # Update post_status sau khi thanh toán
-    posts_collection.update_one(
-        {"_id": ObjectId(input_data.post_id)},
-        {"$set": {"post_status": "inactive"}}
-    )
+    except PaymentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
     # ---- RESPONSE ----
-    return TransactionModel(
-        id=str(result.inserted_id),
-        post_id=str(input_data.post_id),
-        payer_id=str(user_id),
-        amount_money=input_data.amount_money,
-        transaction_status="paid",
-        created_at=new_transaction["created_at"]
-    )
+    return to_transaction_model(transaction)
 
 
 @app.post(
@@ -171,13 +191,14 @@ async def add_transaction(
 )
 async def pay_application(
     token: str = Security(oauth2_scheme),
-    input_data: AddApplicationPaymentModel = Body(...)
+    input_data: AddApplicationPaymentModel = Body(...),
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER
 ):
     current_user = await get_current_user(token, users_collection)
     tutor_id = str(current_user.id)
 
     # Find application
-    application = applications_collection.find_one({"_id": ObjectId(input_data.application_id)})
+    application = await applications_collection.find_one({"_id": ObjectId(input_data.application_id)})
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
 
@@ -186,61 +207,39 @@ async def pay_application(
         raise HTTPException(status_code=403, detail="Not allowed to pay for this application")
 
     post_id = str(application.get("post_id"))
-    post = posts_collection.find_one({"_id": ObjectId(post_id)})
+    post = await posts_collection.find_one({"_id": ObjectId(post_id)})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    # ---- CHECK BALANCE ----
-    user_data = users_collection.find_one({"_id": ObjectId(tutor_id)})
-    balance = user_data.get("balance", 0)
-    if balance < input_data.amount_money:
-        raise HTTPException(status_code=400, detail=f"Insufficient balance. Your balance: {balance}, required: {input_data.amount_money}")
-
-    # Deduct balance
-    users_collection.update_one({"_id": ObjectId(tutor_id)}, {"$set": {"balance": balance - input_data.amount_money}})
-
-    # Create transaction
-    new_transaction = {
-        "post_id": ObjectId(post_id),
-        "payer_id": ObjectId(tutor_id),
-        "amount_money": input_data.amount_money,
-        "transaction_status": "paid",
-        "created_at": datetime.utcnow()
-    }
-    tx_result = transactions_collection.insert_one(new_transaction)
-
-    # Update application status to accepted_and_paid
-    applications_collection.update_one({"_id": ObjectId(input_data.application_id)}, {"$set": {"application_status": "accepted_and_paid", "updated_at": datetime.now(VN_TZ)}})
-
-    # Assign tutor to post
-    posts_collection.update_one({"_id": ObjectId(post_id)}, {"$set": {"assigned_tutor": ObjectId(tutor_id), "post_status": "active"}})
-
-    # Notify parent via email-service
+    # Notify parent: queued in the outbox by the payment itself, delivered by email-service
+    email = None
+    parent = await users_collection.find_one({"_id": ObjectId(str(post.get("creator_id")))}, {"email": 1, "display_name": 1})
+    if parent and parent.get("email"):
+        email = {
+            "kind": PARENT_NOTIFY_EMAIL,
+            "payload": {
+                "parent_email": parent["email"],
+                "parent_name": parent.get("display_name"),
+                "post_title": post.get("title"),
+            },
+            "dedupe_key": f"application-paid:{application['_id']}",
+        }
+
+    # ---- PAYMENT: atomic debit + application / post update + parent email ----
     try:
-        parent = users_collection.find_one({"_id": ObjectId(str(post.get("creator_id")))})
-        parent_email = parent.get("email") if parent else None
-        if parent_email:
-            try:
-                resp = requests.post(f"{EMAIL_SERVICE_URL}/send-parent-notify", json={
-                    "parent_email": parent_email,
-                    "parent_name": parent.get("display_name"),
-                    "post_title": post.get("title"),
-                }, timeout=5)
-                if resp.status_code != 200:
-                    print("Email service returned non-200 when notifying parent:", resp.status_code, resp.text)
-            except Exception as e:
-                print("Failed to send parent notification email", str(e))
-    except Exception:
-        print("Failed to send parent notification email")
+        transaction = await execute_payment(
+            APPLICATION_PAYMENT,
+            payer_id=ObjectId(tutor_id),
+            post_id=post["_id"],
+            amount=input_data.amount_money,
+            application_id=application["_id"],
+            idempotency_key=idempotency_key,
+            email=email,
+        )
+    except PaymentError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    return TransactionModel(
-        id=str(tx_result.inserted_id),
-        post_id=post_id,
-        payer_id=tutor_id,
-        amount_money=input_data.amount_money,
-        transaction_status="paid",
-        created_at=new_transaction["created_at"]
-    )
+    return to_transaction_model(transaction)
 
 # /api/transaction/health
 @app.get(
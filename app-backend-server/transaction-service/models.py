@@ -33,8 +33,20 @@ class AddTransactionModel(BaseModel):
     post_id: str
     amount_money: float
 
+    @validator("amount_money")
+    def positive_amount(cls, v):
+        if v <= 0:
+            raise ValueError("amount_money must be positive")
+        return v
+
 
 class AddApplicationPaymentModel(BaseModel):
     application_id: str
     amount_money: float
-    post_id: Optional[str] = None
\ No newline at end of file
+    post_id: Optional[str] = None
+
+    @validator("amount_money")
+    def positive_amount(cls, v):
+        if v <= 0:
+            raise ValueError("amount_money must be positive")
+        return v
\ No newline at end of file
@@ -0,0 +1,337 @@
+# payments.py
+"""
+Payment engine: debit a user's balance and apply what the payment buys
+(post published / application accepted) without read-then-write races.
+
+A payment is a saga of idempotent steps, logged in its `transactions` document:
+
+    1. insert the transaction (status "pending", optional idempotency key)
+    2. claim the target: the post / application gets `payment_tx_id`, so only
+       one payment per target is in flight
+    3. debit: conditional $inc on {balance >= amount}; the transaction id is
+       pushed to users.payment_refs so a re-run never debits twice
+    4. effects on posts / applications ($set only), and the notification
+       email stored on the transaction (`email`) queued in the outbox
+       (dedupe key, so a re-run queues it once)
+    5. status "paid"
+
+A failure up to the debit compensates (refund, release the claim, delete the
+pending transaction); a failure after it leaves the payment pending and it is
+finished by `resume_pending_payments()` (startup hook, or
+`python -m payments resume`).
+
+When MongoDB supports transactions (replica set / mongos, see
+PAYMENTS_USE_TRANSACTIONS) the same steps run in one multi-document
+transaction and a failure simply aborts it.
+"""
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from shared.config import PAYMENTS_USE_TRANSACTIONS, PAYMENT_RESUME_AFTER_SECONDS
+from shared.database import client, users_collection, posts_collection, applications_collection, transactions_collection
+from shared.logger import get_logger
+from shared.outbox import enqueue_email
+from shared.response_cache import invalidate_tags, post_tags
+from shared.tracing import start_span, traced
+
+logger = get_logger("payments")
+
+VN_TZ = timezone(timedelta(hours=7))
+
+PENDING = "pending"
+PAID = "paid"
+
+# What is being paid for
+POST_PAYMENT = "post"
+APPLICATION_PAYMENT = "application"
+
+# Debited transaction ids remembered per user (only needed until a payment is
+# resumed, i.e. minutes)
+PAYMENT_REFS_KEPT = 50
+
+_use_transactions = False
+
+
+class PaymentError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class Effect:
+    collection: object
+    filter: dict
+    update: dict
+
+
+@dataclass
+class PaymentPlan:
+    target: object          # collection of the claimed document
+    target_filter: dict     # the target can be paid for only while it matches
+    conflict_detail: str
+    effects: List[Effect]
+
+
+def _plan(tx: dict) -> PaymentPlan:
+    tx_id = tx["_id"]
+    if tx["kind"] == POST_PAYMENT:
+        return PaymentPlan(
+            target=posts_collection,
+            target_filter={"_id": tx["post_id"], "post_status": {"$ne": "active"}},
+            conflict_detail="This post is already active",
+            effects=[
+                # release the claim: the post may be paid for again later
+                Effect(posts_collection, {"_id": tx["post_id"], "payment_tx_id": tx_id},
+                       {"$set": {"post_status": "inactive"}, "$unset": {"payment_tx_id": ""}}),
+            ],
+        )
+
+    # APPLICATION_PAYMENT: the claim stays, an application is paid once
+    return PaymentPlan(
+        target=applications_collection,
+        target_filter={"_id": tx["application_id"], "application_status": {"$ne": "accepted_and_paid"}},
+        conflict_detail="This application is already paid",
+        effects=[
+            Effect(posts_collection, {"_id": tx["post_id"]},
+                   {"$set": {"assigned_tutor": tx["payer_id"], "post_status": "active"}}),
+            Effect(applications_collection, {"_id": tx["application_id"], "payment_tx_id": tx_id},
+                   {"$set": {"application_status": "accepted_and_paid", "updated_at": datetime.now(VN_TZ)}}),
+        ],
+    )
+
+
+# ============================================
+# STEPS (each one safe to re-run)
+# ============================================
+@traced("payment.claim")
+async def _claim(tx: dict, plan: PaymentPlan, session=None) -> None:
+    result = await plan.target.update_one(
+        {
+            **plan.target_filter,
+            "$or": [{"payment_tx_id": {"$exists": False}}, {"payment_tx_id": tx["_id"]}],
+        },
+        {"$set": {"payment_tx_id": tx["_id"]}},
+        session=session,
+    )
+    if result.matched_count:
+        return
+
+    target = await plan.target.find_one({"_id": plan.target_filter["_id"]}, {"payment_tx_id": 1}, session=session)
+    if target and target.get("payment_tx_id"):
+        holder = await transactions_collection.find_one(
+            {"_id": target["payment_tx_id"], "transaction_status": PENDING}, {"_id": 1}, session=session
+        )
+        if holder:
+            raise PaymentError(409, "Another payment for this item is in progress")
+    raise PaymentError(400, plan.conflict_detail)
+
+
+@traced("payment.debit")
+async def _debit(tx: dict, session=None) -> None:
+    amount = tx["amount_money"]
+    result = await users_collection.update_one(
+        {"_id": tx["payer_id"], "balance": {"$gte": amount}, "payment_refs": {"$ne": tx["_id"]}},
+        {
+            "$inc": {"balance": -amount},
+            "$push": {"payment_refs": {"$each": [tx["_id"]], "$slice": -PAYMENT_REFS_KEPT}},
+        },
+        session=session,
+    )
+    if result.modified_count or await _is_debited(tx, session):
+        return
+
+    user = await users_collection.find_one({"_id": tx["payer_id"]}, {"balance": 1}, session=session)
+    balance = (user or {}).get("balance", 0)
+    raise PaymentError(400, f"Insufficient balance. Your balance: {balance}, required: {amount}")
+
+
+async def _is_debited(tx: dict, session=None) -> bool:
+    user = await users_collection.find_one(
+        {"_id": tx["payer_id"], "payment_refs": tx["_id"]}, {"_id": 1}, session=session
+    )
+    return user is not None
+
+
+@traced("payment.apply")
+async def _apply(tx: dict, plan: PaymentPlan, session=None) -> None:
+    for effect in plan.effects:
+        await effect.collection.update_one(effect.filter, effect.update, session=session)
+    email = tx.get("email")
+    if email:
+        await enqueue_email(email["kind"], email["payload"], dedupe_key=email["dedupe_key"], session=session)
+    await transactions_collection.update_one(
+        {"_id": tx["_id"]}, {"$set": {"transaction_status": PAID}, "$unset": {"email": ""}}, session=session
+    )
+
+
+@traced("payment.compensate")
+async def _compensate(tx: dict, plan: PaymentPlan) -> None:
+    # refund only what was debited (the ref is the proof), then release and forget
+    await users_collection.update_one(
+        {"_id": tx["payer_id"], "payment_refs": tx["_id"]},
+        {"$inc": {"balance": tx["amount_money"]}, "$pull": {"payment_refs": tx["_id"]}},
+    )
+    await plan.target.update_one(
+        {"_id": plan.target_filter["_id"], "payment_tx_id": tx["_id"]},
+        {"$unset": {"payment_tx_id": ""}},
+    )
+    await transactions_collection.delete_one({"_id": tx["_id"], "transaction_status": PENDING})
+
+
+# ============================================
+# RUNNERS
+# ============================================
+async def _run_saga(tx: dict, plan: PaymentPlan) -> None:
+    await transactions_collection.insert_one(tx)
+    try:
+        await _claim(tx, plan)
+        await _debit(tx)
+    except BaseException:
+        await asyncio.shield(_compensate(tx, plan))
+        raise
+    # from here on the payment only moves forward (resume_pending_payments)
+    await _apply(tx, plan)
+
+
+async def _run_transaction(tx: dict, plan: PaymentPlan) -> None:
+    async def steps(session):
+        await transactions_collection.insert_one(tx, session=session)
+        await _claim(tx, plan, session)
+        await _debit(tx, session)
+        await _apply(tx, plan, session)
+
+    async with await client.start_session() as session:
+        # retries TransientTransactionError (e.g. write conflicts between concurrent payments)
+        await session.with_transaction(steps)
+
+
+async def _replay(tx: dict) -> dict:
+    """Outcome of an earlier request with the same idempotency key."""
+    existing = await transactions_collection.find_one(
+        {"payer_id": tx["payer_id"], "idempotency_key": tx["idempotency_key"]}
+    )
+    if existing is None:
+        # the earlier attempt failed and was rolled back in between: just retry
+        raise PaymentError(409, "Payment with this Idempotency-Key is being retried, try again")
+    same_request = all(existing.get(k) == tx.get(k) for k in ("kind", "post_id", "application_id", "amount_money"))
+    if not same_request:
+        raise PaymentError(422, "Idempotency-Key was already used for a different payment")
+    if existing.get("transaction_status") != PAID:
+        raise PaymentError(409, "Payment with this Idempotency-Key is in progress")
+    return existing
+
+
+async def execute_payment(
+    kind: str,
+    payer_id: ObjectId,
+    post_id: ObjectId,
+    amount: float,
+    application_id: Optional[ObjectId] = None,
+    idempotency_key: Optional[str] = None,
+    email: Optional[dict] = None,
+) -> dict:
+    """Run one payment; returns its (paid) transaction document.
+
+    Raises PaymentError. Repeating a request with the same `idempotency_key`
+    returns the original transaction instead of paying again. `email`
+    ({"kind", "payload", "dedupe_key"}, see shared.outbox) is queued with the
+    effects: in the same transaction, or by the saga / its resume.
+    """
+    tx = {
+        "_id": ObjectId(),
+        "kind": kind,
+        "post_id": post_id,
+        "payer_id": payer_id,
+        "amount_money": amount,
+        "transaction_status": PENDING,
+        # Store timestamp in UTC (naive) so DB uses a consistent baseline
+        "created_at": datetime.utcnow(),
+    }
+    if application_id is not None:
+        tx["application_id"] = application_id
+    if idempotency_key:
+        tx["idempotency_key"] = idempotency_key
+    if email:
+        tx["email"] = email
+
+    plan = _plan(tx)
+    mode = "transaction" if _use_transactions else "saga"
+    try:
+        with start_span("payment.run", {"payment.kind": kind, "payment.mode": mode}):
+            if _use_transactions:
+                await _run_transaction(tx, plan)
+            else:
+                await _run_saga(tx, plan)
+    except DuplicateKeyError:
+        # the idempotency key is the only unique index on transactions
+        if not idempotency_key:
+            raise
+        return await _replay(tx)
+
+    tx["transaction_status"] = PAID
+    tx.pop("email", None)
+    # post status / assigned tutor changed: drop cached post responses
+    await invalidate_tags(*post_tags(post_id))
+    return tx
+
+
+# ============================================
+# STARTUP / RECOVERY
+# ============================================
+async def init_payments() -> None:
+    """Pick transactions or saga (PAYMENTS_USE_TRANSACTIONS=auto asks the server)."""
+    global _use_transactions
+    if PAYMENTS_USE_TRANSACTIONS in ("true", "1", "yes"):
+        _use_transactions = True
+    elif PAYMENTS_USE_TRANSACTIONS in ("false", "0", "no"):
+        _use_transactions = False
+    else:
+        try:
+            hello = await client.admin.command("hello")
+            _use_transactions = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception as e:
+            logger.warning("Could not detect MongoDB topology (%s), using the saga", e)
+            _use_transactions = False
+    logger.info("Payments use %s", "multi-document transactions" if _use_transactions else "the compensating saga")
+
+
+async def resume_pending_payments(older_than_seconds: int = PAYMENT_RESUME_AFTER_SECONDS) -> Tuple[int, int]:
+    """Finish debited payments left pending, roll back the others.
+    Returns (completed, rolled_back)."""
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    completed = rolled_back = 0
+    async for tx in transactions_collection.find({"transaction_status": PENDING, "created_at": {"$lte": cutoff}}):
+        if tx.get("kind") not in (POST_PAYMENT, APPLICATION_PAYMENT):
+            continue
+        plan = _plan(tx)
+        if await _is_debited(tx):
+            await _apply(tx, plan)
+            await invalidate_tags(*post_tags(tx["post_id"]))
+            completed += 1
+        else:
+            await _compensate(tx, plan)
+            rolled_back += 1
+    if completed or rolled_back:
+        logger.warning("Resumed pending payments: %s completed, %s rolled back", completed, rolled_back)
+    return completed, rolled_back
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payment engine maintenance")
+    parser.add_argument("command", choices=["resume"])
+    parser.add_argument("--older-than", type=int, default=PAYMENT_RESUME_AFTER_SECONDS, help="seconds")
+    args = parser.parse_args()
+    completed, rolled_back = asyncio.run(resume_pending_payments(args.older_than))
+    print(f"{completed} payments completed, {rolled_back} rolled back")
+
+
+if __name__ == "__main__":
+    main()
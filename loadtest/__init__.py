@@ -0,0 +1 @@
+# loadtest: journey-based load test, see __main__.py
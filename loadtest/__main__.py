@@ -0,0 +1,270 @@
+# loadtest/__main__.py
+"""
+Load test of the whole stack through the gateway, driven by user journeys
+(loadtest/journeys.py), with results saved as JSON to compare runs.
+
+Usage (stack running: docker-compose up -d, seeded by auth-seed):
+    pip install -r loadtest/requirements.txt
+    python -m loadtest run --users 50 --duration 120 [--label baseline]
+    python -m loadtest compare loadtest/results/A.json loadtest/results/B.json
+    python -m loadtest cleanup     # [loadtest] posts left by failed hire journeys
+
+or inside cloud-net, next to the services:
+    docker compose --profile loadtest run --rm loadtest run --users 50 --duration 120
+
+`run` prints per-endpoint / per-journey req/s, p50/p95/p99 and errors and
+writes loadtest/results/<timestamp>.json; `compare` (or `run --baseline`)
+prints the deltas and exits 1 when p95/p99 grew, throughput dropped by more
+than --threshold percent, or the error rate went up. After a run the
+inactive [loadtest] posts of the accounts are deleted (--no-cleanup keeps them).
+
+Keep users / duration / think time the same between runs you compare, and
+note the SVC_REPLICAS / SVC_WORKERS of the stack with --label. On a dataset
+from `python -m init_db generate`, log in as generated users:
+--accounts synth0000000,synth0000001,... (password 123456 by default).
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from loadtest import stats
+from loadtest.journeys import DEFAULT_WEIGHTS, JOURNEYS, Account, Context, JourneyError, Session, delete_loadtest_posts
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_ACCOUNTS = "herta,bronya,jingyuan"
+DEFAULT_PASSWORD = "123456"
+
+
+def parse_weights(value: str) -> Dict[str, int]:
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, value.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f"unknown journey {name!r} (one of {', '.join(JOURNEYS)})")
+        weights[name] = int(weight)
+    return {name: w for name, w in weights.items() if w > 0}
+
+
+def parse_accounts(value: str, password: str) -> List[Account]:
+    accounts = []
+    for item in filter(None, value.split(",")):
+        username, _, own_password = item.partition(":")
+        accounts.append(Account(username, own_password or password))
+    return accounts
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+# ============================================
+# RUN
+# ============================================
+async def virtual_user(index: int, session: Session, ctx: Context, args, names, weights, deadline: float) -> None:
+    # users start spread over the ramp-up, not all at once
+    await asyncio.sleep(args.ramp * index / args.users)
+    try:
+        await session.login()
+    except JourneyError as e:
+        print(f"user {index} ({session.account.username}): login failed, {e}", file=sys.stderr)
+        return
+
+    recorder = session.recorder
+    while time.perf_counter() < deadline:
+        name = ctx.rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            await JOURNEYS[name](session, ctx)
+            recorder.journey(name, time.perf_counter() - start)
+        except JourneyError as e:
+            recorder.journey(name, time.perf_counter() - start, str(e).split(":")[0])
+            if args.verbose:
+                print(f"user {index}: {name} failed, {e}", file=sys.stderr)
+        except Exception as e:  # unexpected response body: keep the run going
+            recorder.journey(name, time.perf_counter() - start, type(e).__name__)
+            if args.verbose:
+                print(f"user {index}: {name} failed, {type(e).__name__}: {e}", file=sys.stderr)
+        if args.think > 0:
+            await asyncio.sleep(ctx.rng.uniform(0, 2 * args.think))
+
+
+async def run(args) -> dict:
+    weights = args.journeys
+    names = list(weights)
+    accounts = parse_accounts(args.accounts, args.password)
+    if not accounts:
+        raise SystemExit("no accounts")
+    if "hire" in weights and len({a.username for a in accounts}) < 2:
+        raise SystemExit("the hire journey needs at least two accounts (parent + tutor)")
+
+    recorder = stats.Recorder()
+    ctx = Context(random.Random(args.seed), args.payment_amount)
+    timeout = httpx.Timeout(args.timeout)
+    clients = [httpx.AsyncClient(base_url=args.base_url, timeout=timeout) for _ in range(args.users)]
+    ctx.sessions = [Session(client, recorder, accounts[i % len(accounts)]) for i, client in enumerate(clients)]
+
+    started_at = datetime.now(timezone.utc)
+    deadline = time.perf_counter() + args.ramp + args.duration
+    print(
+        f"{args.users} users, {args.duration}s (+{args.ramp}s ramp-up) against {args.base_url}, "
+        f"journeys {weights}",
+        flush=True,
+    )
+    try:
+        await asyncio.gather(*(
+            virtual_user(i, session, ctx, args, names, list(weights.values()), deadline)
+            for i, session in enumerate(ctx.sessions)
+        ))
+    finally:
+        recorder.stop()
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+    return recorder.result({
+        "label": args.label,
+        "started_at": started_at.isoformat(),
+        "git_revision": git_revision(),
+        "base_url": args.base_url,
+        "users": args.users,
+        "duration_seconds": args.duration,
+        "ramp_seconds": args.ramp,
+        "think_seconds": args.think,
+        "journey_weights": weights,
+        "accounts": sorted({a.username for a in accounts}),
+        "seed": args.seed,
+    })
+
+
+# ============================================
+# CLEANUP
+# ============================================
+async def cleanup(args) -> int:
+    """Delete the [loadtest] posts failed hires left behind; returns how many."""
+    recorder = stats.Recorder()  # not part of any result
+    deleted = 0
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=httpx.Timeout(args.timeout)) as client:
+        accounts = {a.username: a for a in parse_accounts(args.accounts, args.password)}
+        for account in accounts.values():
+            session = Session(client, recorder, account)
+            try:
+                await session.login()
+                deleted += await delete_loadtest_posts(session)
+            except JourneyError as e:
+                print(f"cleanup ({account.username}): {e}", file=sys.stderr)
+    return deleted
+
+
+def print_result(result: dict) -> None:
+    print()
+    print(stats.format_table(result["endpoints"], "endpoint"))
+    print()
+    print(stats.format_table(result["journeys"], "journey"))
+    total = result["total"]
+    print(
+        f"\ntotal: {total['count']} requests, {total['rps']} req/s, "
+        f"p50 {total['p50_ms']} / p95 {total['p95_ms']} / p99 {total['p99_ms']} ms, {total['errors']} errors"
+    )
+    errors = stats.format_errors(result["endpoints"])
+    if errors:
+        print("errors:\n" + errors)
+
+
+def report_comparison(baseline: dict, current: dict, threshold: float) -> int:
+    comparison = stats.compare(baseline, current, threshold)
+    print(f"\nvs {baseline['meta'].get('label') or baseline['meta']['started_at']} (threshold {threshold}%):")
+    print(stats.format_comparison(comparison))
+    if comparison["regressions"]:
+        print("\nregressions:")
+        for line in comparison["regressions"]:
+            print(f"  {line}")
+        return 1
+    print("\nno regressions")
+    return 0
+
+
+def cmd_run(args) -> int:
+    result = asyncio.run(run(args))
+    print_result(result)
+    if not args.no_cleanup:
+        print(f"\ncleanup: {asyncio.run(cleanup(args))} leftover [loadtest] post(s) deleted")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    stats.save(result, output)
+    print(f"\nresults: {output}")
+
+    if args.baseline:
+        return report_comparison(stats.load(args.baseline), result, args.threshold)
+    return 0
+
+
+def cmd_compare(args) -> int:
+    return report_comparison(stats.load(args.baseline), stats.load(args.current), args.threshold)
+
+
+def cmd_cleanup(args) -> int:
+    print(f"{asyncio.run(cleanup(args))} leftover [loadtest] post(s) deleted")
+    return 0
+
+
+def add_connection_args(parser) -> None:
+    parser.add_argument("--base-url", default=os.getenv("LOADTEST_BASE_URL", "http://localhost"),
+                        help="gateway URL (env LOADTEST_BASE_URL, http://api-gateway-server inside cloud-net)")
+    parser.add_argument("--accounts", default=DEFAULT_ACCOUNTS, help="username[:password],... (seeded users by default)")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD, help="password of accounts listed without one")
+    parser.add_argument("--timeout", type=float, default=30, help="per-request timeout (seconds)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Journey-based load test of the API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the journeys and save the results")
+    add_connection_args(p_run)
+    p_run.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    p_run.add_argument("--duration", type=float, default=60, help="seconds, after the ramp-up")
+    p_run.add_argument("--ramp", type=float, default=10, help="seconds to start all the users")
+    p_run.add_argument("--think", type=float, default=0.5, help="mean pause between journeys (seconds)")
+    p_run.add_argument("--journeys", type=parse_weights, default=dict(DEFAULT_WEIGHTS),
+                       help="weights, e.g. browse=6,hire=1 (others keep their default, 0 disables)")
+    p_run.add_argument("--payment-amount", type=float, default=1000, help="application fee paid by the hire journey")
+    p_run.add_argument("--seed", type=int, default=None, help="random seed (filters, journey mix)")
+    p_run.add_argument("--label", default="", help="stored in the results, e.g. 'replicas=3 workers=2'")
+    p_run.add_argument("--output", help="result file (default loadtest/results/<timestamp>.json)")
+    p_run.add_argument("--baseline", help="result file to compare this run with")
+    p_run.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    p_run.add_argument("--no-cleanup", action="store_true", help="keep the [loadtest] posts failed hires left behind")
+    p_run.add_argument("-v", "--verbose", action="store_true", help="print every failed journey")
+    p_run.set_defaults(func=cmd_run)
+
+    p_compare = sub.add_parser("compare", help="compare two result files")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("current")
+    p_compare.add_argument("--threshold", type=float, default=10, help="regression threshold in percent")
+    p_compare.set_defaults(func=cmd_compare)
+
+    p_cleanup = sub.add_parser("cleanup", help="delete the [loadtest] posts failed hire journeys left behind")
+    add_connection_args(p_cleanup)
+    p_cleanup.set_defaults(func=cmd_cleanup)
+
+    args = parser.parse_args(argv)
+    if args.command == "run" and args.users < 1:
+        parser.error("--users must be >= 1")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
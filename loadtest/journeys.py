@@ -0,0 +1,287 @@
+# loadtest/journeys.py
+"""
+User journeys: the request sequences the React components send, through the
+gateway, with the same query parameters and headers (Bearer token, one
+Idempotency-Key per write like src/api.js).
+
+    session  Login.jsx -> Header / Dashboard: login, get-profile, dashboard
+    browse   Center.jsx: get-post?scope=all with the filter bar, next pages,
+             applied posts, a post detail, search with facets
+    hire     CreatePost -> Center (apply) -> Applications (accept) -> pay
+             -> booking -> RatingModal, between a parent and a tutor account
+    history  Transactions / Bookings / TutorDetailModal lists
+
+Every journey takes the `Session` of the virtual user running it; a failed
+step aborts the journey (recorded as a journey error), like a user giving up.
+Posts created by `hire` are titled LOADTEST_TITLE_PREFIX. They are "inactive"
+until pay-application activates them, so meanwhile they are listed by
+scope=all like any new post (and measured by `browse`). A hire that fails
+midway leaves its post inactive: `delete_loadtest_posts` (run after every
+`python -m loadtest run`, or `python -m loadtest cleanup`) removes them.
+"""
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+import httpx
+
+from loadtest.stats import Recorder
+
+LOADTEST_TITLE_PREFIX = "[loadtest]"
+
+# values of the seeded posts (auth-service/init_db.py) + a few that match nothing
+SUBJECTS = ["Toán", "Vật Lý", "Tiếng Anh", "Hóa", "Ngữ Văn"]
+LEVELS = ["9", "10", "11", "12", "Giao tiếp"]
+ADDRESSES = ["Hà Nội", "TP. Hồ Chí Minh", "Đà Nẵng"]
+MODES = ["online", "offline"]
+
+
+class JourneyError(Exception):
+    """A step returned an unexpected status: the rest of the journey is skipped."""
+
+
+@dataclass
+class Account:
+    username: str
+    password: str
+
+
+class Session:
+    """One virtual user: an HTTP client (own connection pool) + its login."""
+
+    def __init__(self, http: httpx.AsyncClient, recorder: Recorder, account: Account):
+        self.http = http
+        self.recorder = recorder
+        self.account = account
+        self.token: Optional[str] = None
+        self.user_id: Optional[str] = None
+
+    async def call(
+        self,
+        method: str,
+        route: str,
+        path: Optional[str] = None,
+        expect: Iterable[int] = (200,),
+        idempotent: bool = False,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request, recorded under "METHOD route" (route template, not the raw path)."""
+        headers = kwargs.pop("headers", {})
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if idempotent:
+            headers["Idempotency-Key"] = str(uuid.uuid4())
+        name = f"{method} {route}"
+
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, path or route, headers=headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.recorder.request(name, time.perf_counter() - start, type(e).__name__)
+            raise JourneyError(f"{name}: {type(e).__name__}") from e
+        latency = time.perf_counter() - start
+
+        if response.status_code not in expect:
+            self.recorder.request(name, latency, f"HTTP {response.status_code}")
+            raise JourneyError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+        self.recorder.request(name, latency)
+        return response
+
+    async def login(self) -> None:
+        response = await self.call(
+            "POST", "/api/auth/login",
+            json={"username": self.account.username, "password": self.account.password},
+        )
+        self.token = response.json()["access_token"]
+        profile = await self.call("GET", "/api/auth/me/get-profile")
+        self.user_id = profile.json()["id"]
+
+
+# ============================================
+# JOURNEYS
+# ============================================
+async def session_journey(session: Session, ctx: "Context") -> None:
+    await session.login()
+    await session.call("GET", "/api/auth/me/dashboard", params={"applications_limit": 100, "variant": "thumb"})
+
+
+def _browse_params(rng: random.Random, skip: int = 0, limit: int = 10) -> list:
+    params = [("scope", "all"), ("skip", skip), ("limit", limit)]
+    # the filter bar: each filter set on about a third of the visits
+    if rng.random() < 0.35:
+        params.append(("subject", rng.choice(SUBJECTS)))
+    if rng.random() < 0.3:
+        params.append(("level", rng.choice(LEVELS)))
+    if rng.random() < 0.3:
+        params.append(("address", rng.choice(ADDRESSES)))
+    if rng.random() < 0.3:
+        params.append(("mode", rng.choice(MODES)))
+    return params
+
+
+async def browse_journey(session: Session, ctx: "Context") -> None:
+    rng = ctx.rng
+    limit = 10
+    params = _browse_params(rng, limit=limit)
+    response = await session.call("GET", "/api/post/get-post", params=params, expect=(200, 404))
+    posts = response.json() if response.status_code == 200 else []
+    await session.call("GET", "/api/application/me/get-application", params={"skip": 0, "limit": 100}, expect=(200, 404))
+
+    # "next page" a couple of times while the page is full
+    skip = 0
+    for _ in range(rng.randint(0, 2)):
+        if len(posts) < limit:
+            break
+        skip += limit
+        page = [(k, skip if k == "skip" else v) for k, v in params]
+        response = await session.call("GET", "/api/post/get-post", params=page, expect=(200, 404))
+        posts = response.json() if response.status_code == 200 else []
+
+    if posts:
+        post = rng.choice(posts)
+        await session.call("GET", "/api/post/{post_id}", f"/api/post/{post['id']}")
+
+    if rng.random() < 0.5:
+        search = [("scope", "all"), ("limit", 20), ("q", rng.choice(SUBJECTS))]
+        await session.call("GET", "/api/post/search", params=search)
+
+
+async def history_journey(session: Session, ctx: "Context") -> None:
+    await session.call("GET", "/api/transaction/me/get-transaction", params={"skip": 0, "limit": 20}, expect=(200, 404))
+    scope = ctx.rng.choice(["tutor", "parent"])
+    await session.call("GET", "/api/booking/me/get-booking", params={"scope": scope, "skip": 0, "limit": 100}, expect=(200, 404))
+    if ctx.tutor_ids:
+        tutor_id = ctx.rng.choice(ctx.tutor_ids)
+        await session.call("GET", "/api/rating/tutor/{tutor_id}/ratings", f"/api/rating/tutor/{tutor_id}/ratings")
+
+
+async def hire_journey(session: Session, ctx: "Context") -> None:
+    """The session's user is the parent; the tutor is another virtual user's account."""
+    tutor = ctx.tutor_for(session)
+    if tutor is None:
+        raise JourneyError("hire: needs a second logged-in account")
+    rng = ctx.rng
+
+    # parent: CreatePost
+    post = (await session.call(
+        "POST", "/api/post/add-post", expect=(201,), idempotent=True,
+        json={
+            "title": f"{LOADTEST_TITLE_PREFIX} {uuid.uuid4().hex[:8]}",
+            "subject": rng.choice(SUBJECTS),
+            "level": rng.choice(LEVELS),
+            "address": rng.choice(ADDRESSES),
+            "salary_amount": rng.choice([150000, 200000, 250000]),
+            "sessions_per_week": rng.randint(1, 4),
+            "minutes_per_session": 90,
+            "mode": rng.choice(MODES),
+            "post_status": "inactive",
+        },
+    )).json()
+
+    # tutor: apply from Center
+    application = (await tutor.call(
+        "POST", "/api/application/add-application", expect=(201,), idempotent=True,
+        json={"post_id": post["id"]},
+    )).json()
+
+    # parent: Applications -> accept
+    await session.call(
+        "POST", "/api/application/get-application-by-post", expect=(200, 404),
+        params={"skip": 0, "limit": 100, "application_status": "pending"},
+        json={"post_id": post["id"]},
+    )
+    await session.call(
+        "POST", "/api/application/update-status",
+        json={"id": application["id"], "application_status": "accepted"},
+    )
+
+    # tutor: pay the application fee
+    await tutor.call(
+        "POST", "/api/transaction/pay-application", expect=(201,), idempotent=True,
+        json={"application_id": application["id"], "amount_money": ctx.payment_amount},
+    )
+
+    # parent: booking, then the lesson is done and rated
+    booking = (await session.call(
+        "POST", "/api/booking/add-booking", expect=(201,),
+        json={"post_id": post["id"], "tutor_id": tutor.user_id},
+    )).json()
+    await tutor.call(
+        "POST", "/api/booking/update-status",
+        json={"id": booking["id"], "contract_status": "completed"},
+    )
+    await session.call(
+        "POST", "/api/rating/add-rating", expect=(201,), idempotent=True,
+        json={
+            "tutor_id": tutor.user_id,
+            "booking_id": booking["id"],
+            "rating": rng.randint(3, 5),
+            "comment": f"{LOADTEST_TITLE_PREFIX} ok",
+        },
+    )
+    await session.call("GET", "/api/rating/tutor/{tutor_id}/ratings", f"/api/rating/tutor/{tutor.user_id}/ratings")
+
+
+# ============================================
+# CLEANUP
+# ============================================
+async def delete_loadtest_posts(session: Session) -> int:
+    """Delete the session user's inactive LOADTEST_TITLE_PREFIX posts (left by failed hires).
+
+    Active ones have a paid application and a booking: they stay, and scope=all
+    does not list them anyway.
+    """
+    leftover, cursor = [], None
+    while True:
+        params = {"scope": "me", "limit": 100}
+        if cursor:
+            params["cursor"] = cursor
+        response = await session.call("GET", "/api/post/get-post", params=params, expect=(200, 404))
+        if response.status_code == 404:
+            break
+        leftover.extend(
+            post["id"] for post in response.json()
+            if post["title"].startswith(LOADTEST_TITLE_PREFIX) and post["post_status"] == "inactive"
+        )
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    for post_id in leftover:
+        await session.call("POST", "/api/post/delete-post", expect=(200, 404), json={"id": post_id})
+    return len(leftover)
+
+
+JOURNEYS = {
+    "session": session_journey,
+    "browse": browse_journey,
+    "hire": hire_journey,
+    "history": history_journey,
+}
+
+# share of journeys picked by the virtual users: mostly reads, like real traffic
+DEFAULT_WEIGHTS = {"session": 1, "browse": 6, "hire": 1, "history": 2}
+
+
+# ============================================
+# CONTEXT (shared by the virtual users of a run)
+# ============================================
+class Context:
+    def __init__(self, rng: random.Random, payment_amount: float):
+        self.rng = rng
+        self.payment_amount = payment_amount
+        self.sessions: List[Session] = []
+
+    @property
+    def tutor_ids(self) -> List[str]:
+        return sorted({s.user_id for s in self.sessions if s.user_id})
+
+    def tutor_for(self, parent: Session) -> Optional[Session]:
+        """A logged-in session of another account (balances are per account)."""
+        candidates = [
+            s for s in self.sessions
+            if s.token and s.user_id and s.account.username != parent.account.username
+        ]
+        return self.rng.choice(candidates) if candidates else None
@@ -0,0 +1,181 @@
+# loadtest/stats.py
+"""
+Latency recorder + the JSON result format written by `python -m loadtest run`.
+
+Samples are kept per endpoint, named by route template
+("GET /api/post/{post_id}", same as the `route` label of the services'
+Prometheus metrics), and per journey. Percentiles are nearest-rank on the raw
+samples: a run is at most a few hundred thousand requests, no need for
+histograms here.
+"""
+import json
+import math
+import time
+from typing import Dict, List, Optional
+
+RESULT_FORMAT_VERSION = 1
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Series:
+    """Latencies (seconds) of one endpoint / journey, plus its failures by reason."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def add(self, latency: float, error: Optional[str] = None) -> None:
+        self.latencies.append(latency)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        values = sorted(self.latencies)
+        count = len(values)
+        error_count = sum(self.errors.values())
+        result = {
+            "count": count,
+            "errors": error_count,
+            "error_rate": round(error_count / count, 4) if count else 0.0,
+            "rps": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "mean_ms": round(sum(values) / count * 1000, 2) if count else 0.0,
+            "max_ms": round(values[-1] * 1000, 2) if count else 0.0,
+        }
+        for p in PERCENTILES:
+            result[f"p{p}_ms"] = round(percentile(values, p) * 1000, 2)
+        if self.errors:
+            result["error_reasons"] = dict(sorted(self.errors.items(), key=lambda item: -item[1]))
+        return result
+
+
+class Recorder:
+    def __init__(self):
+        self.endpoints: Dict[str, Series] = {}
+        self.journeys: Dict[str, Series] = {}
+        self.started = time.perf_counter()
+        self.stopped: Optional[float] = None
+
+    def request(self, name: str, latency: float, error: Optional[str] = None) -> None:
+        self.endpoints.setdefault(name, Series()).add(latency, error)
+
+    def journey(self, name: str, latency: float, error: Optional[str] = None) -> None:
+        self.journeys.setdefault(name, Series()).add(latency, error)
+
+    def stop(self) -> None:
+        self.stopped = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def result(self, meta: dict) -> dict:
+        elapsed = self.elapsed
+        total = Series()
+        for series in self.endpoints.values():
+            total.latencies.extend(series.latencies)
+            for reason, n in series.errors.items():
+                total.errors[reason] = total.errors.get(reason, 0) + n
+        return {
+            "format": RESULT_FORMAT_VERSION,
+            "meta": {**meta, "elapsed_seconds": round(elapsed, 2)},
+            "total": total.summary(elapsed),
+            "endpoints": {name: s.summary(elapsed) for name, s in sorted(self.endpoints.items())},
+            "journeys": {name: s.summary(elapsed) for name, s in sorted(self.journeys.items())},
+        }
+
+
+# ============================================
+# OUTPUT
+# ============================================
+def save(result: dict, path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def load(path) -> dict:
+    with open(path, encoding="utf-8") as f:
+        result = json.load(f)
+    if result.get("format") != RESULT_FORMAT_VERSION:
+        raise ValueError(f"{path}: unknown result format {result.get('format')!r}")
+    return result
+
+
+def format_table(section: Dict[str, dict], title: str) -> str:
+    header = f"{title:<48} {'count':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    lines = [header, "-" * len(header)]
+    for name, s in section.items():
+        lines.append(
+            f"{name:<48} {s['count']:>8} {s['rps']:>9} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9} {s['errors']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def format_errors(section: Dict[str, dict]) -> str:
+    lines = []
+    for name, s in section.items():
+        for reason, n in s.get("error_reasons", {}).items():
+            lines.append(f"  {name}: {reason} x{n}")
+    return "\n".join(lines)
+
+
+# ============================================
+# COMPARE
+# ============================================
+COMPARED_FIELDS = ("rps", "p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+
+def _change(old: float, new: float) -> Optional[float]:
+    if not old:
+        return None
+    return round((new - old) / old * 100, 1)
+
+
+def compare(baseline: dict, current: dict, threshold_pct: float) -> dict:
+    """Per endpoint / journey deltas, and the regressions beyond `threshold_pct`.
+
+    A regression is a p95 or p99 latency up, or a throughput down, by more
+    than the threshold, or an error rate that went up at all.
+    """
+    rows, regressions = [], []
+    for section in ("endpoints", "journeys"):
+        for name, new in current[section].items():
+            old = baseline[section].get(name)
+            if old is None:
+                rows.append({"section": section, "name": name, "new": True})
+                continue
+            deltas = {field: _change(old[field], new[field]) for field in COMPARED_FIELDS}
+            rows.append({"section": section, "name": name, "old": old, "current": new, "deltas": deltas})
+            for field in ("p95_ms", "p99_ms"):
+                if deltas[field] is not None and deltas[field] > threshold_pct:
+                    regressions.append(f"{name}: {field} {old[field]} -> {new[field]} (+{deltas[field]}%)")
+            if deltas["rps"] is not None and deltas["rps"] < -threshold_pct:
+                regressions.append(f"{name}: rps {old['rps']} -> {new['rps']} ({deltas['rps']}%)")
+            if new["error_rate"] > old["error_rate"]:
+                regressions.append(f"{name}: error_rate {old['error_rate']} -> {new['error_rate']}")
+    return {"rows": rows, "regressions": regressions}
+
+
+def format_comparison(comparison: dict) -> str:
+    def fmt(delta):
+        return "      -" if delta is None else f"{delta:+6.1f}%"
+
+    header = f"{'':<48} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}"
+    lines = [header, "-" * len(header)]
+    for row in comparison["rows"]:
+        if row.get("new"):
+            lines.append(f"{row['name']:<48} (not in baseline)")
+            continue
+        cells = [
+            f"{row['current'][field]:>8} {fmt(row['deltas'][field])}"
+            for field in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        ]
+        lines.append(f"{row['name']:<48} " + " ".join(cells))
+    return "\n".join(lines)
@@ -1,8 +1,34 @@
 // Minimal fetch helpers that attach Authorization header when available
+//
+// options.idempotent: send an Idempotency-Key (one per call) and retry network
+// errors / 502-504 with the same key, so the backend runs the write only once.
+const RETRY_STATUSES = [502, 503, 504];
+const MAX_RETRIES = 2;
+
+function newIdempotencyKey() {
+  if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
 export async function fetchWithAuth(path, options = {}, token = null) {
-  const headers = options.headers ? { ...options.headers } : {};
+  const { idempotent, ...fetchOptions } = options;
+  const headers = fetchOptions.headers ? { ...fetchOptions.headers } : {};
   if (token) headers["Authorization"] = `Bearer ${token}`;
-  const res = await fetch(path, { ...options, headers });
+  if (idempotent) headers["Idempotency-Key"] = newIdempotencyKey();
+
+  let res;
+  for (let attempt = 0; ; attempt++) {
+    try {
+      res = await fetch(path, { ...fetchOptions, headers });
+    } catch (e) {
+      if (!idempotent || attempt >= MAX_RETRIES) throw e;
+      await new Promise((r) => setTimeout(r, 500 * (attempt + 1)));
+      continue;
+    }
+    if (!idempotent || attempt >= MAX_RETRIES || !RETRY_STATUSES.includes(res.status)) break;
+    await new Promise((r) => setTimeout(r, 500 * (attempt + 1)));
+  }
+
   const text = await res.text();
   try {
     return { ok: res.ok, status: res.status, data: text ? JSON.parse(text) : null };
@@ -30,10 +30,8 @@ export default function ApplicationList({ postId, token, onApplicationUpdated })
 
       if (resp.ok && Array.isArray(resp.data)) {
         setApplications(resp.data);
-        // Load tutor info for each application
-        resp.data.forEach(app => {
-          loadTutorInfo(app.tutor_id);
-        });
+        // Load tutor info for all applications in one request
+        loadTutorInfo(resp.data.map(app => app.tutor_id));
       }
     } catch (error) {
       console.error("Error loading applications:", error);
@@ -42,15 +40,17 @@ export default function ApplicationList({ postId, token, onApplicationUpdated })
     }
   }
 
-  async function loadTutorInfo(tutorId) {
+  async function loadTutorInfo(tutorIds) {
+    const ids = [...new Set(tutorIds.filter(Boolean))];
+    if (ids.length === 0) return;
     try {
-      const resp = await fetchWithAuth("/api/auth/get-profile-by-user-id", {
+      const resp = await fetchWithAuth("/api/auth/get-profiles-by-user-ids", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ user_id: tutorId }),
+        body: JSON.stringify({ user_ids: ids }),
       }, token);
-      if (resp.ok) {
-        setTutors(prev => ({ ...prev, [tutorId]: resp.data }));
+      if (resp.ok && resp.data) {
+        setTutors(prev => ({ ...prev, ...resp.data }));
       }
     } catch (error) {
       console.error("Error loading tutor info:", error);
@@ -93,7 +93,7 @@ export default function Applications() {
                 if (!confirm(`Pay ${amount} VND to confirm?`)) return;
                 try {
                   const resp = await fetchWithAuth('/api/transaction/pay-application', {
-                    method: 'POST', headers: { 'Content-Type': 'application/json' },
+                    method: 'POST', idempotent: true, headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify({ application_id: a.id, amount_money: amount })
                   }, token);
                   if (resp.ok) {
@@ -44,11 +44,8 @@ export default function Bookings() {
       if (resp.ok && Array.isArray(resp.data)) {
         setBookings(resp.data);
         // Load related details
-        resp.data.forEach(booking => {
-          loadPostDetails(booking.post_id);
-          loadTutorDetails(booking.tutor_id);
-          if (booking.parent_id) loadParentDetails(booking.parent_id);
-        });
+        resp.data.forEach(booking => loadPostDetails(booking.post_id));
+        loadProfiles(resp.data);
       }
     } catch (error) {
       console.error("Error loading bookings:", error);
@@ -68,20 +65,29 @@ export default function Bookings() {
     }
   }
 
-  async function loadTutorDetails(tutorId) {
+  // Tutor + parent profiles of the whole table in one request
+  async function loadProfiles(bookingList) {
+    const tutorIds = [...new Set(bookingList.map(b => b.tutor_id).filter(Boolean))];
+    const parentIds = [...new Set(bookingList.map(b => b.parent_id).filter(Boolean))];
+    const ids = [...new Set([...tutorIds, ...parentIds])];
+    if (ids.length === 0) return;
     try {
-      const resp = await fetchWithAuth("/api/auth/get-profile-by-user-id", {
+      const resp = await fetchWithAuth("/api/auth/get-profiles-by-user-ids", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ user_id: tutorId }),
+        body: JSON.stringify({ user_ids: ids }),
       }, token);
-      if (resp.ok) {
-        setTutorDetails(prev => ({ ...prev, [tutorId]: resp.data }));
-        // also load ratings for this tutor (if not already loaded)
-        if (!ratingsByTutor[tutorId]) await loadRatingsForTutor(tutorId);
+      if (resp.ok && resp.data) {
+        const pick = (idList) => Object.fromEntries(idList.filter(id => resp.data[id]).map(id => [id, resp.data[id]]));
+        setTutorDetails(prev => ({ ...prev, ...pick(tutorIds) }));
+        setParentDetails(prev => ({ ...prev, ...pick(parentIds) }));
+        // also load ratings for these tutors (if not already loaded)
+        tutorIds.forEach(tutorId => {
+          if (resp.data[tutorId] && !ratingsByTutor[tutorId]) loadRatingsForTutor(tutorId);
+        });
       }
     } catch (error) {
-      console.error("Error loading tutor details:", error);
+      console.error("Error loading profiles:", error);
     }
   }
 
@@ -100,21 +106,6 @@ export default function Bookings() {
     }
   }
 
-  async function loadParentDetails(parentId) {
-    try {
-      const resp = await fetchWithAuth("/api/auth/get-profile-by-user-id", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ user_id: parentId }),
-      }, token);
-      if (resp.ok) {
-        setParentDetails(prev => ({ ...prev, [parentId]: resp.data }));
-      }
-    } catch (error) {
-      console.error("Error loading parent details:", error);
-    }
-  }
-
   const getStatusColor = (status) => {
     switch (status) {
       case "active":
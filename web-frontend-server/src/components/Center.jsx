@@ -59,7 +59,7 @@ export default function Center() {
     setLoadingApply(prev => ({ ...prev, [postId]: true }));
     try {
       const resp = await fetchWithAuth("/api/application/add-application", {
-        method: "POST",
+        method: "POST", idempotent: true,
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ post_id: postId }),
       }, token);
@@ -51,7 +51,7 @@ const CreatePost = () => {
             };
 
             const postResp = await fetchWithAuth('/api/post/add-post', {
-                method: 'POST',
+                method: 'POST', idempotent: true,
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(dataToSend),
             }, token);
@@ -67,7 +67,7 @@ const CreatePost = () => {
             const activationFee = 10000;
 
             const transactionResp = await fetchWithAuth('/api/transaction/add-transaction', {
-                method: 'POST',
+                method: 'POST', idempotent: true,
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ post_id: postId, amount_money: activationFee }),
             }, token);
@@ -25,52 +25,30 @@ export default function ProfileDetail() {
       setLoading(true);
       setError(null);
       try {
-        const [pResp, aResp, cResp] = await Promise.all([
-          fetchWithAuth('/api/auth/me/get-profile', { method: 'GET' }, token),
-          fetchWithAuth('/api/application/me/get-application?skip=0&limit=100', { method: 'GET' }, token),
-          fetchWithAuth('/api/auth/me/get-certificate', { method: 'GET' }, token)
-        ]);
-
-        if (!pResp.ok) throw new Error('Failed to load profile');
-        if (!aResp.ok) throw new Error('Failed to load applications');
-        if (!cResp.ok) {
-          // no certificates yet -> empty
-          if (cResp.status === 404) {
-            if (mounted) setCertificates([]);
-          } else throw new Error('Failed to load certificates');
-        }
+        // profile, certificates + proof images and applications in one round trip
+        const dResp = await fetchWithAuth('/api/auth/me/dashboard?applications_limit=100&variant=thumb', { method: 'GET' }, token);
+        if (!dResp.ok) throw new Error('Failed to load profile');
 
         if (mounted) {
-          setProfile(pResp.data);
-          // load profile proofs
-          try{
-            const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'profile', type_id: pResp.data.id }) }, token);
-            if (imgResp.ok) setProfileProofs(imgResp.data || []);
-          }catch(e){ setProfileProofs([]); }
+          const { profile: p, profile_proof_images, certificates: certs, applications: apps } = dResp.data;
+          setProfile(p);
+          setProfileProofs(profile_proof_images || []);
           // set verif target for profile
-          setVerifTarget({ type: 'profile', type_id: pResp.data.id });
+          setVerifTarget({ type: 'profile', type_id: p.id });
           setEditProfile({
-            phone: pResp.data.phone || '',
-            display_name: pResp.data.display_name || '',
-            subjects: (pResp.data.subjects || []).join(', '),
-            levels: (pResp.data.levels || []).join(', '),
-            gender: pResp.data.gender || '',
-            address: pResp.data.address || '',
-            bio: pResp.data.bio || ''
+            phone: p.phone || '',
+            display_name: p.display_name || '',
+            subjects: (p.subjects || []).join(', '),
+            levels: (p.levels || []).join(', '),
+            gender: p.gender || '',
+            address: p.address || '',
+            bio: p.bio || ''
           });
-          setApplications(aResp.data || []);
-          setCertificates(cResp.ok ? cResp.data : []);
-          // load proofs for certificates
-          if (cResp.ok && Array.isArray(cResp.data)){
-            const map = {};
-            for (const c of cResp.data){
-              try{
-                const r = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'certificate', type_id: c.id }) }, token);
-                map[c.id] = r.ok ? r.data || [] : [];
-              }catch(e){ map[c.id] = []; }
-            }
-            setCertProofs(map);
-          }
+          setApplications(apps || []);
+          setCertificates(certs || []);
+          const map = {};
+          for (const c of certs || []) map[c.id] = c.proof_images || [];
+          setCertProofs(map);
         }
       } catch (err) {
         if (mounted) setError(err.message || String(err));
@@ -174,10 +152,10 @@ export default function ProfileDetail() {
     const resp = await fetchWithAuth('/api/auth/me/delete-proof-image', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ id }) }, token);
     if (!resp.ok) return alert('Delete failed: ' + JSON.stringify(resp.data));
     if (type === 'profile'){
-      const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'profile', type_id: parentId }) }, token);
+      const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'profile', type_id: parentId, variant: 'thumb' }) }, token);
       if (imgResp.ok) setProfileProofs(imgResp.data || []);
     } else {
-      const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'certificate', type_id: parentId }) }, token);
+      const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: 'certificate', type_id: parentId, variant: 'thumb' }) }, token);
       if (imgResp.ok) setCertProofs(prev=>({ ...prev, [parentId]: imgResp.data || [] }));
     }
   }
@@ -197,15 +175,9 @@ export default function ProfileDetail() {
 
   function onSelectFiles(e) {
     const files = Array.from(e.target.files || []);
-    const readers = files.map(f => {
-      return new Promise((res, rej) => {
-        const r = new FileReader();
-        r.onload = () => res({ name: f.name, data: r.result });
-        r.onerror = rej;
-        r.readAsDataURL(f);
-      })
-    });
-    Promise.all(readers).then(arr => setVerifFiles(arr)).catch(err => console.error(err));
+    // keep the File for a streamed multipart upload, object URL for the preview
+    verifFiles.forEach(f => URL.revokeObjectURL(f.data));
+    setVerifFiles(files.map(f => ({ name: f.name, file: f, data: URL.createObjectURL(f) })));
   }
 
   async function sendVerificationRequest() {
@@ -213,8 +185,11 @@ export default function ProfileDetail() {
     try {
       // upload proof images
       for (const f of verifFiles) {
-        const body = { type: verifTarget.type, type_id: verifTarget.type_id, image: f.data };
-        const resp = await fetchWithAuth('/api/auth/me/add-proof-image', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body) }, token);
+        const body = new FormData();
+        body.append('type', verifTarget.type);
+        body.append('type_id', verifTarget.type_id);
+        body.append('file', f.file, f.name);
+        const resp = await fetchWithAuth('/api/auth/me/upload-proof-image', { method: 'POST', body }, token);
         if (!resp.ok) throw new Error('Failed to upload proof image: ' + JSON.stringify(resp.data));
       }
 
@@ -266,7 +241,7 @@ export default function ProfileDetail() {
           <div style={{display:'flex', gap:8, marginTop:8}}>
             {profileProofs.map(pi => (
               <div key={pi.id} style={{width:96,height:72,overflow:'hidden',borderRadius:6,position:'relative'}}>
-                <img src={pi.image} alt="proof" style={{width:'100%',height:'100%',objectFit:'cover'}} />
+                <img src={pi.url} alt="proof" loading="lazy" style={{width:'100%',height:'100%',objectFit:'cover'}} />
                 <button className="btn" style={{position:'absolute',right:6,top:6,padding:'2px 6px'}} onClick={()=>deleteProof(pi.id,'profile', profile.id)}>Del</button>
               </div>
             ))}
@@ -343,7 +318,7 @@ export default function ProfileDetail() {
                   if (!confirm(`Pay ${amount} VND to confirm?`)) return;
                   try {
                     const resp = await fetchWithAuth('/api/transaction/pay-application', {
-                      method: 'POST', headers: { 'Content-Type': 'application/json' },
+                      method: 'POST', idempotent: true, headers: { 'Content-Type': 'application/json' },
                       body: JSON.stringify({ application_id: a.id, amount_money: amount })
                     }, token);
                     if (resp.ok) {
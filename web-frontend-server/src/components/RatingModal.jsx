@@ -11,7 +11,7 @@ export default function RatingModal({ tutorId, bookingId, token, onClose, onSubm
     setSubmitting(true);
     try {
       const resp = await fetchWithAuth('/api/rating/add-rating', {
-        method: 'POST',
+        method: 'POST', idempotent: true,
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ tutor_id: tutorId, booking_id: bookingId || null, rating, comment })
       }, token);
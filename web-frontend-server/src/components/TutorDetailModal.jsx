@@ -136,7 +136,7 @@ export default function TutorDetailModal({ tutor, application, postId, token, on
     setIsCreatingBooking(true);
     try {
       const resp = await fetchWithAuth("/api/booking/add-booking", {
-        method: "POST",
+        method: "POST", idempotent: true,
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           post_id: postId,
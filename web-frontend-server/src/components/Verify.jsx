@@ -48,7 +48,7 @@ export default function Verify() {
       const map = {};
       for (const it of (resp.data || [])){
         try{
-          const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: tab, type_id: it.id }) }, token);
+          const imgResp = await fetchWithAuth('/api/auth/get-proof-images-by-type', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ type: tab, type_id: it.id, variant: 'thumb' }) }, token);
           if (imgResp.ok) map[it.id] = imgResp.data || [];
           else map[it.id] = [];
         }catch(e){ map[it.id] = []; }
@@ -136,8 +136,8 @@ export default function Verify() {
                   {/* thumbnails */}
                   <div style={{display:'flex', gap:8, marginLeft:8}}>
                     {(imagesMap[item.id] || []).map(img=> (
-                      <div key={img.id} style={{width:48,height:36,overflow:'hidden',borderRadius:6,cursor:'pointer'}} onClick={()=>setPreview(img.image)}>
-                        <img src={img.image} alt="proof" style={{width:'100%',height:'100%',objectFit:'cover'}} />
+                      <div key={img.id} style={{width:48,height:36,overflow:'hidden',borderRadius:6,cursor:'pointer'}} onClick={()=>setPreview(img.variant_urls?.preview || img.url)}>
+                        <img src={img.url} alt="proof" loading="lazy" style={{width:'100%',height:'100%',objectFit:'cover'}} />
                       </div>
                     ))}
                   </div>
@@ -161,8 +161,8 @@ export default function Verify() {
                   {/* thumbnails */}
                   <div style={{display:'flex', gap:8, marginLeft:8}}>
                     {(imagesMap[item.id] || []).map(img=> (
-                      <div key={img.id} style={{width:48,height:36,overflow:'hidden',borderRadius:6,cursor:'pointer'}} onClick={()=>setPreview(img.image)}>
-                        <img src={img.image} alt="proof" style={{width:'100%',height:'100%',objectFit:'cover'}} />
+                      <div key={img.id} style={{width:48,height:36,overflow:'hidden',borderRadius:6,cursor:'pointer'}} onClick={()=>setPreview(img.variant_urls?.preview || img.url)}>
+                        <img src={img.url} alt="proof" loading="lazy" style={{width:'100%',height:'100%',objectFit:'cover'}} />
                       </div>
                     ))}
                   </div>